@@ -13,4 +13,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ALS_FTD_Research_Dashboard.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from Dashboard.http_client import lifespan, use_long_lived_loops  # noqa: E402 (needs the app registry)
+
+use_long_lived_loops()
+
+
+async def application(scope, receive, send):
+    # Served by uvicorn (see dev/start.sh), which runs the lifespan protocol
+    if scope['type'] == 'lifespan':
+        await lifespan(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
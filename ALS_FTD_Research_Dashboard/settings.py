@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'Dashboard',
     'ninja',
     'rest_framework',
@@ -52,11 +53,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', # Must be at the top
+    'Dashboard.middleware.MetricsMiddleware', # Latency/query metrics for /metrics
+    'Dashboard.middleware.QueryCountMiddleware', # Opt-in, see QUERY_INSPECTOR_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Dashboard.middleware.ProfilingMiddleware', # Needs request.user
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -160,6 +164,34 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Upstream sources of the trial and gene sync (overridable, e.g. by the offline ingest benchmark's stub server)
+CTGOV_STUDIES_URL = os.environ.get('CTGOV_STUDIES_URL', 'https://clinicaltrials.gov/api/v2/studies')
+ALSOD_URL = os.environ.get('ALSOD_URL', 'https://alsod.ac.uk/')
+
+# Outbound HTTP record/replay (Dashboard/cassettes.py): 'record' captures every response into
+# the HTTP_CASSETTE file, 'replay' serves them from it with no network access; empty is live traffic
+HTTP_CASSETTE_MODE = os.environ.get('HTTP_CASSETTE_MODE', '')
+HTTP_CASSETTE = os.environ.get('HTTP_CASSETTE', os.path.join(BASE_DIR, 'cassettes', 'outbound.jsonl.gz'))
+
+# Optional bearer token required by the /metrics endpoint
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Per-request SQL counts, Server-Timing header and N+1 warnings (Dashboard/middleware.py)
+QUERY_INSPECTOR_ENABLED = os.environ.get('QUERY_INSPECTOR_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+
+# On-demand request profiling for staff or holders of PROFILING_TOKEN (Dashboard/middleware.py)
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', '50'))
+
+# Versioned Parquet snapshots of the trial/news tables, queried with DuckDB (Dashboard/replica.py)
+ANALYTICS_REPLICA_DIR = os.environ.get('ANALYTICS_REPLICA_DIR', os.path.join(BASE_DIR, 'analytics_replica'))
+
+# Results file written by `manage.py benchmark_analytics` / `benchmark_ingest` (Dashboard/benchmarks.py)
+BENCHMARK_BASELINE = os.environ.get('BENCHMARK_BASELINE', os.path.join(BASE_DIR, 'benchmarks', 'baseline.json'))
+# Thresholds enforced by `manage.py check_performance_budget`
+BENCHMARK_BUDGET = os.environ.get('BENCHMARK_BUDGET', os.path.join(BASE_DIR, 'benchmarks', 'budget.json'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -8,6 +8,7 @@ from .api import api
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/dashboard/token', views.get_dashboard_token, name='dashboard_token'),
+    path('metrics', views.metrics, name='metrics'),
     path("api/", api.urls),
 ]
 
@@ -7,12 +7,22 @@ from django.core.serializers.json import DjangoJSONEncoder
 import json
 from ninja.errors import ValidationError
 from django.shortcuts import get_object_or_404
+from django.db import connection, transaction
+from django.db.models import Count
+from django.contrib.postgres.search import TrigramWordSimilarity
 from .models import Trial, Gene, HealeyTrial, ContactSubmission, IssueReport, NewsArticle
 from .schemas import get_serialized_trials, GeneSchema, TrialSchema, ProcessedCriteriaSchema, HealeyTrialSchema, HealeyContactInfoSchema, ContactSubmissionSchema, IssueReportSchema, NewsArticleSchema
-from .utils import update_data, parse_criteria_from_response, extract_list_items, scrape_healey_platform_trial, send_criteria_to_ai_server
-from .api_analytics import router as analytics_router
+from .utils import update_data, parse_criteria_from_response, extract_list_items, save_healey_platform_sites, send_criteria_to_ai_server, HEALEY_PLATFORM_SITES_URL, HEALEY_SCRAPE_HEADERS
+from .http_client import get_async_client
+from .metrics import async_sync_stage
+from .structures import ALPHAFOLD_MISS_CACHE_KEY, ALPHAFOLD_MISS_TTL, resolve_alphafold_structure
+from .api_analytics import router as analytics_router, refresh_analytics_caches
+from .pagination import TOTAL_MODES, InvalidCursor, count_rows, paginate_keyset
 import os 
+import httpx
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
 from django.http import JsonResponse, HttpResponse
 import csv
 from io import StringIO
@@ -26,10 +36,19 @@ trials_router = Router()
 
 @news_router.get("/", response=List[NewsArticleSchema], tags=["News Aggregator"])
 def get_news(request, 
+             response: HttpResponse,
              genes: List[str] = Query(None), 
              start_date: date = None, 
              end_date: date = None,
-             limit: int = 100):
+             limit: int = 100,
+             cursor: str = None,
+             total: str = 'none'):
+    """
+    Latest news first. Continue with the X-Next-Cursor header of the previous page as
+    `cursor`; `total` ('exact' or 'estimate') adds an X-Total-Count header.
+    """
+    if total not in TOTAL_MODES:
+        return JsonResponse({"error": f"total must be one of: {', '.join(TOTAL_MODES)}"}, status=400)
     
     queryset = NewsArticle.objects.all()
 
@@ -43,7 +62,19 @@ def get_news(request,
     if end_date:
         queryset = queryset.filter(publication_date__date__lte=end_date)
 
-    return queryset.order_by('-publication_date')[:limit]
+    # (publication_date, id) is unique and matches news_published_keyset_idx
+    queryset = queryset.order_by('-publication_date', '-id')
+    try:
+        articles, next_cursor = paginate_keyset(queryset, cursor, limit)
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    
+    if next_cursor:
+        response['X-Next-Cursor'] = next_cursor
+    total_count = count_rows(queryset, total)
+    if total_count is not None:
+        response['X-Total-Count'] = str(total_count)
+    return articles
 
 @contact_router.post("/", tags=["User Feedback"])
 def submit_contact_form(request, data: ContactSubmissionSchema):
@@ -71,6 +102,7 @@ def get_trials(request):
 def sync_trials(request):
     try:
         update_data()
+        refresh_analytics_caches()
         return JsonResponse({"message": "Data synchronization complete."})
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -98,10 +130,13 @@ def ai_eligibility_description(request):
     return processed_trials
 
 @trials_router.get("/update-healey-trial", tags=["Update Healey Trial Web Scrape"])
-def update_healey_trial(request):
+async def update_healey_trial(request):
     try:
-        # Directly scrape and save the data
-        scrape_healey_platform_trial()
+        # Fetch on the pooled async client; parsing and the DB upserts run in a worker thread
+        async with async_sync_stage('healey', 'fetch') as stage:
+            response = await get_async_client().get(HEALEY_PLATFORM_SITES_URL, headers=HEALEY_SCRAPE_HEADERS)
+            stage.rows = 1
+        await sync_to_async(save_healey_platform_sites)(response.content)
         return JsonResponse({"message": "Healey trial data updated successfully."})
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -133,6 +168,46 @@ def get_healey_trials(request, format: str = "json") -> Any:
     else:
         return JsonResponse({'error': 'Unsupported format specified. Please use either "json" or "csv".'}, status=400)
 
+# Columns available to the typo-tolerant lookup; each has a pg_trgm GIN index
+FUZZY_LOOKUP_FIELDS = {
+    'title': (Trial, 'brief_title'),
+    'sponsor': (Trial, 'lead_sponsor_name'),
+    'facility': (HealeyTrial, 'facility'),
+    'news': (NewsArticle, 'title'),
+}
+FUZZY_LOOKUP_MAX_RESULTS = 50
+
+@trials_router.get("/fuzzy-lookup", tags=["Typo-Tolerant Lookup of Titles, Sponsors, Facilities and News"])
+def fuzzy_lookup(request, q: str, field: str = "sponsor", threshold: float = 0.3, limit: int = 10):
+    """
+    Returns distinct values of `field` whose words best match `q` (pg_trgm word similarity),
+    with their similarity score and number of matching rows.
+    """
+    if field not in FUZZY_LOOKUP_FIELDS:
+        return JsonResponse({'error': f'Unsupported field. Please use one of: {", ".join(FUZZY_LOOKUP_FIELDS)}.'}, status=400)
+    if not 0 < threshold <= 1:
+        return JsonResponse({'error': 'threshold must be greater than 0 and at most 1.'}, status=400)
+
+    model, column = FUZZY_LOOKUP_FIELDS[field]
+    q = q.strip()
+    limit = max(1, min(limit, FUZZY_LOOKUP_MAX_RESULTS))
+
+    with transaction.atomic():
+        # The indexed `%>` operator compares against this setting, so scope it to the transaction
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(threshold)])
+        matches = list(
+            model.objects.filter(**{f'{column}__trigram_word_similar': q})
+            .values(column)
+            .annotate(similarity=TrigramWordSimilarity(q, column), matches=Count('pk'))
+            .order_by('-similarity', column)[:limit]
+        )
+
+    return [
+        {"value": m[column], "similarity": round(m['similarity'], 3), "count": m['matches']}
+        for m in matches
+    ]
+
 @genes_router.get("/", response=Any)
 def get_genes(request, format: str = "json"):
     genes = Gene.objects.all().values_list('gene_symbol', 'gene_name', 'gene_risk_category')
@@ -180,31 +255,45 @@ def get_gene_detail(request, symbol: str):
 
 
 @genes_router.get("/{symbol}/structure", tags=["Gene Data"])
-def get_gene_structure(request, symbol: str):
-    """Get the primary 3D structure for a gene."""
-    from .models import GeneStructure
+async def get_gene_structure(request, symbol: str):
+    """
+    Get the primary 3D structure for a gene.
+    AlphaFold structures not yet resolved to a model URL are resolved (and stored) on the fly.
+    """
     try:
-        gene = Gene.objects.get(gene_symbol__iexact=symbol)
-        # Get primary structure, or first available
-        structure = gene.structures.filter(is_primary=True).first()
-        if not structure:
-            structure = gene.structures.first()
-        
-        if not structure:
-            return JsonResponse({"error": f"No structure available for {symbol}"}, status=404)
-        
-        return {
-            "gene": {
-                "symbol": gene.gene_symbol,
-                "name": gene.gene_name,
-            },
-            "structure": {
-                "id": structure.id,
-                "source_type": structure.source_type,
-                "external_id": structure.external_id,
-                "title": structure.title,
-                "componentProps": structure.get_component_props(),
-            }
-        }
+        gene = await Gene.objects.aget(gene_symbol__iexact=symbol)
     except Gene.DoesNotExist:
-        return JsonResponse({"error": f"Gene {symbol} not found"}, status=404)
\ No newline at end of file
+        return JsonResponse({"error": f"Gene {symbol} not found"}, status=404)
+
+    # Get primary structure, or first available
+    structure = await gene.structures.filter(is_primary=True).afirst()
+    if not structure:
+        structure = await gene.structures.afirst()
+    
+    if not structure:
+        return JsonResponse({"error": f"No structure available for {symbol}"}, status=404)
+
+    if structure.source_type == structure.SOURCE_ALPHAFOLD and not structure.custom_data_url:
+        miss_key = ALPHAFOLD_MISS_CACHE_KEY.format(accession=structure.external_id)
+        if not await cache.aget(miss_key):
+            try:
+                resolved = await resolve_alphafold_structure(structure)
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"Error resolving AlphaFold for {structure.external_id}: {e}")
+                resolved = None
+            if not resolved:
+                await cache.aset(miss_key, True, timeout=ALPHAFOLD_MISS_TTL)
+    
+    return {
+        "gene": {
+            "symbol": gene.gene_symbol,
+            "name": gene.gene_name,
+        },
+        "structure": {
+            "id": structure.id,
+            "source_type": structure.source_type,
+            "external_id": structure.external_id,
+            "title": structure.title,
+            "componentProps": structure.get_component_props(),
+        }
+    }
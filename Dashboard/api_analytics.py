@@ -1,45 +1,53 @@
 from ninja import Router, Schema, Query
-from django.db.models import Count, Q, Sum, Avg
-from django.db.models.functions import ExtractYear
-from django.core.cache import cache
-from .models import Trial, HealeyTrial, Gene, NewsArticle
+from django.db.models import Q, F, Sum, Avg, Prefetch, FloatField
+from django.db.models.functions import Cast
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchHeadline
+from django.http import JsonResponse
+from .models import Trial, HealeyTrial, Gene, NewsArticle, TrialStatus, TrialSite, TrialSummary, CountrySummary
+from asgiref.sync import sync_to_async
+from .caching import aget_or_build, get_or_build
+from .summaries import refresh_summary_views, summary_counts
+from .parallel import run_sections
+from .replica import ReplicaUnavailable, replica_cursor, snapshot_replica
+from .pagination import TOTAL_MODES, InvalidCursor, count_rows, paginate_keyset, paginate_offset
+from .trial_index import get_trial_index, expand_status_filter, FacetIndex, GeneMarkerIndex, FUNDING_CATEGORIES, STATUS_GROUPS, MAP_MAX_GRID_ZOOM
 from typing import List, Dict, Any, Optional
 import datetime
 import json
 import re
+import logging
+import numpy as np
 
-router = Router()
+logger = logging.getLogger(__name__)
 
+router = Router()
 
 
+def gene_filter(gene: str):
+    """
+    Exact, case-insensitive gene symbol match (GIN-indexed array containment).
+    gene_symbols holds both the `genes` JSON and the related_genes symbols, like the
+    TrialIndex gene markers.
+    """
+    return Q(gene_symbols__contains=[gene.strip().lower()])
 
+def country_filter(country: str):
+    """Exact, case-insensitive match on any study site's country (GIN-indexed array containment)."""
+    return Q(location_countries__contains=[country.strip().lower()])
 
 def apply_analytics_filters(queryset, status: List[str] = None, phase: List[str] = None, gene: str = None, familial: bool = False):
-    """Reusable filter logic for analytics endpoints."""
+    """
+    Reusable filter logic for analytics querysets.
+    The chart endpoints evaluate the same filters against the in-memory TrialIndex (see TrialIndex.filter_mask).
+    """
     if status:
-        status_map = {
-            'recruiting': ['RECRUITING', 'ENROLLING_BY_INVITATION'],
-            'active': ['ACTIVE_NOT_RECRUITING'],
-            'completed': ['COMPLETED'],
-            # Actionable/Active trials for patients
-            'active_all': ['RECRUITING', 'ENROLLING_BY_INVITATION', 'NOT_YET_RECRUITING', 'AVAILABLE'],
-            'inactive': ['COMPLETED', 'TERMINATED', 'WITHDRAWN', 'SUSPENDED', 'UNKNOWN', 'NO_LONGER_AVAILABLE']
-        }
-        
-        combined_statuses = []
-        for s in status:
-            combined_statuses.extend(status_map.get(s.lower(), [s.upper()]))
-            
-        queryset = queryset.filter(overall_status__in=combined_statuses)
+        queryset = queryset.filter(overall_status__in=expand_status_filter(status))
         
     if phase:
         queryset = queryset.filter(study_phase__in=phase)
         
     if gene:
-         queryset = queryset.filter(
-            Q(related_genes__gene_symbol__iexact=gene) | 
-            Q(genes__icontains=gene)
-        ).distinct()
+        queryset = queryset.filter(gene_filter(gene))
     
     if familial:
         queryset = queryset.filter(
@@ -52,28 +60,13 @@ def apply_analytics_filters(queryset, status: List[str] = None, phase: List[str]
 @router.get("/countries")
 def get_countries(request):
     """Returns a list of unique countries found in study locations."""
-    # Fetch all study locations
-    # We use iterator to avoid loading everything into memory at once if possible, 
-    # though for 1.2k records it's negligible.
-    trials = Trial.objects.exclude(study_location__isnull=True).values_list('study_location', flat=True)
-    
-    countries = set()
-    for locations in trials:
-        if not locations:
-            continue
-            
-        # Handle if it's a list (standard) or single dict
-        loc_list = locations if isinstance(locations, list) else [locations]
-        
-        for loc in loc_list:
-            if isinstance(loc, dict):
-                # Check common keys for country
-                c = loc.get('country') or loc.get('LocationCountry')
-                if c:
-                    countries.add(c.strip())
-                    
-    # Sort alphabetically
-    return sorted(list(countries))
+    # Sorted in Python (code point order), not by the database collation
+    return sorted(
+        TrialSite.objects.exclude(country='')
+        .order_by()
+        .values_list('country', flat=True)
+        .distinct()
+    )
 
 @router.get("/summary")
 def get_analytics_summary(request):
@@ -92,17 +85,38 @@ def get_analytics_summary(request):
         "total_enrollment": total_enrollment
     }
 
-def get_full_trials_dataset():
+FULL_TRIALS_CACHE_KEY = 'api_trials_list_full'
+
+# Trial columns not used by the serialized dataset
+FULL_TRIALS_DEFERRED_FIELDS = [
+    'condition', 'keyword', 'collaborators',
+    'primary_outcomes', 'secondary_outcomes', 'other_outcomes',
+    'eligibility_criteria_generic_description', 'eligibility_criteria_exclusion_description',
+    'search_vector', 'gene_symbols', 'location_countries',
+]
+
+def get_full_trials_dataset(force_refresh: bool = False):
     """
-    Fetches, serializes, and caches the complete trials dataset.
+    Returns the complete serialized trials dataset from cache, rebuilding it on a miss.
+    Rebuilds are single-flight, so a cold cache only triggers one rebuild across workers.
     Used by:
-    1. get_trials_list (lazy load)
-    2. Management command (proactive refresh)
+    1. get_trials_list, the Trial Finder, filter options and genetic markers (lazy load)
+    2. Management command (proactive refresh via force_refresh=True)
     """
-    print("Generating full dataset cache...")
-    raw_trials = Trial.objects.all()
-    # Pre-fetch related genes and status to avoid N+1
-    raw_trials = raw_trials.prefetch_related('related_genes', 'status')
+    return get_or_build(FULL_TRIALS_CACHE_KEY, _build_full_trials_dataset, force_refresh=force_refresh)
+
+def _build_full_trials_dataset():
+    """Fetches and serializes the complete trials dataset."""
+    logger.info("Generating full dataset cache...")
+    # Skip large columns the serialized dataset never reads
+    raw_trials = Trial.objects.defer(*FULL_TRIALS_DEFERRED_FIELDS)
+    # Pre-fetch related genes and status to avoid N+1.
+    # Statuses are pre-ordered by pk so the first one matches what .first() used to return;
+    # only the prefetch cache may be read below (.first()/.filter() would issue a query per trial).
+    raw_trials = raw_trials.prefetch_related(
+        Prefetch('related_genes', queryset=Gene.objects.only('gene_symbol')),
+        Prefetch('status', queryset=TrialStatus.objects.only('name').order_by('pk')),
+    )
     
     result = []
     for t in raw_trials:
@@ -110,7 +124,7 @@ def get_full_trials_dataset():
         mapped_status = 'Unknown'
         
         # Prefer normalized M2M status if available
-        normalized_status = t.status.first()
+        normalized_status = next(iter(t.status.all()), None)
         if normalized_status:
             # Apply Title Case to the mapped name to ensure "Proper Capitalization"
             mapped_status = normalized_status.name.replace('_', ' ').title()
@@ -194,7 +208,7 @@ def get_full_trials_dataset():
             "investigator": t.responsible_party_investigator_full_name,
         })
         
-    response_data = {
+    return {
         "trials": result,
         "pagination": {
             "page": 1,
@@ -203,51 +217,52 @@ def get_full_trials_dataset():
             "total_pages": 1,
         }
     }
-    
-    # Cache indefinitely (until next manual refresh)
-    cache.set('api_trials_list_full', response_data, timeout=None)
-    return response_data
+
+def refresh_analytics_caches():
+    """
+    Rebuilds every derived analytics cache after a data sync:
+    the summary views, the serialized trials dataset, the in-memory trial index,
+    the Trial Finder facets, the gene marker index and the dashboard package cube,
+    then snapshots the tables to the Parquet analytics replica.
+    """
+    refresh_summary_views()
+    get_full_trials_dataset(force_refresh=True)
+    get_trial_index(force_refresh=True)
+    get_trial_facets(force_refresh=True)
+    get_gene_marker_index(force_refresh=True)
+    get_dashboard_cube(force_refresh=True)
+    try:
+        snapshot_replica()
+    except Exception:
+        # The replica is optional: its readers fall back to Postgres
+        logger.exception("Analytics replica snapshot failed")
 
 @router.get("/dashboard-stats")
 def get_dashboard_stats(request, status: List[str] = Query(None), phase: List[str] = Query(None), gene: str = None, familial: bool = False):
     """Combined stats for dashboard stat cards."""
-    queryset = Trial.objects.all()
-    queryset = apply_analytics_filters(queryset, status, phase, gene, familial)
-    
-    # Total participants (sum of enrollment)
+    index = get_trial_index()
+    return _dashboard_stats(index, index.filter_mask(status, phase, gene, familial))
+
+def _dashboard_stats(index, mask):
     # Refined: We restrict ALL stats to INTERVENTIONAL trials for consistency.
-    interventional_queryset = queryset.filter(study_type__iexact='INTERVENTIONAL')
+    mask = mask & index.interventional
     
-    total_trials = interventional_queryset.count()
+    total_trials = int(mask.sum())
     
-    enrollment_agg = interventional_queryset.aggregate(total_enrollment=Sum('enrollment_count'))
-    total_participants = enrollment_agg['total_enrollment'] or 0
+    # Total participants (sum of enrollment)
+    total_participants = int(index.enrollment[mask].sum())
     
-    # Clinical sites - count unique locations from study_location JSON
-    # Count unique locations for interventional trials only
-    trials_with_locations = interventional_queryset.exclude(study_location__isnull=True)
-    site_count = 0
-    for trial in trials_with_locations:
-        if trial.study_location:
-            try:
-                locations = trial.study_location if isinstance(trial.study_location, list) else []
-                site_count += len(locations)
-            except:
-                pass
+    # Clinical sites - count of study_location entries for interventional trials only
+    site_count = int(index.site_counts[mask].sum())
     
     # Median enrollment rate (robust against outliers)
-    # Filtered to interventional only
-    trials_with_enrollment = interventional_queryset.exclude(enrollment_count__isnull=True).exclude(enrollment_count=0)
-    enrollment_values = list(trials_with_enrollment.values_list('enrollment_count', flat=True))
-    
-    avg_enrollment = 0
-    if enrollment_values:
-        import statistics
-        avg_enrollment = statistics.median(enrollment_values)
+    # Filtered to interventional only, ignoring missing and zero enrollment
+    enrollment_values = np.sort(index.enrollment[mask & index.has_enrollment & (index.enrollment != 0)])
+    avg_enrollment = _median(enrollment_values)
     
     # Calculate recruiting percentage relative to the *filtered* set
     active_statuses = ['RECRUITING', 'ENROLLING_BY_INVITATION']
-    recruiting_count = interventional_queryset.filter(overall_status__in=active_statuses).count()
+    recruiting_count = int((mask & index.status_mask(active_statuses)).sum())
     total_interventional = total_trials # Already calculated above
     recruiting_pct = round((recruiting_count / total_interventional * 100), 1) if total_interventional > 0 else 0
     
@@ -259,29 +274,56 @@ def get_dashboard_stats(request, status: List[str] = Query(None), phase: List[st
         "recruiting_percentage": recruiting_pct
     }
 
+def _median(sorted_values):
+    """statistics.median over a sorted NumPy array, returning plain Python numbers."""
+    n = len(sorted_values)
+    if n == 0:
+        return 0
+    if n % 2:
+        return int(sorted_values[n // 2])
+    return (int(sorted_values[n // 2 - 1]) + int(sorted_values[n // 2])) / 2
+
+def _value_counts(codes, vocabulary, mask):
+    """Per-value counts of a dictionary-encoded column under `mask`, largest first (ties by value, descending)."""
+    counts = np.bincount(codes[mask], minlength=len(vocabulary)).tolist()
+    order = sorted(range(len(vocabulary)), key=lambda i: (counts[i], vocabulary[i]), reverse=True)
+    return [(vocabulary[i], counts[i]) for i in order if counts[i] > 0]
+
 @router.get("/trials-by-phase")
 def get_trials_by_phase(request, status: List[str] = None, phase: List[str] = None, gene: str = None, familial: bool = False):
-    queryset = Trial.objects.all()
-    queryset = apply_analytics_filters(queryset, status, phase, gene, familial)
+    if gene:
+        index = get_trial_index()
+        data = _value_counts(index.phase_codes, index.phases, index.filter_mask(status, phase, gene, familial))
+    else:
+        data = summary_counts(TrialSummary.objects.all(), 'study_phase', status, phase, familial)
     
-    data = queryset.values('study_phase').annotate(count=Count('unique_protocol_id')).order_by('-count')
-    formatted = [{"name": item['study_phase'] or "Unknown", "value": item['count']} for item in data]
+    formatted = [{"name": name or "Unknown", "value": count} for name, count in data]
     return formatted
 
 @router.get("/trials-by-status")
 def get_trials_by_status(request, status: List[str] = None, phase: List[str] = None, gene: str = None, familial: bool = False):
     """Returns trial counts by status, formatted for donut chart."""
-    queryset = Trial.objects.all()
-    queryset = apply_analytics_filters(queryset, status, phase, gene, familial)
-    
-    # improved query performance: aggregate by normalized status name
-    data = queryset.values('overall_status').annotate(count=Count('unique_protocol_id')).order_by('-count')
+    if gene:
+        index = get_trial_index()
+        data = _value_counts(index.status_codes, index.statuses, index.filter_mask(status, phase, gene, familial))
+    else:
+        data = summary_counts(TrialSummary.objects.all(), 'overall_status', status, phase, familial)
+    return _status_data(data)
+
+def _status_data(data):
     # Filter out empty status if any
-    data = [d for d in data if d['overall_status']]
-    
-    formatted = [{"name": item['overall_status'], "value": item['count']} for item in data]
+    formatted = [{"name": name, "value": count} for name, count in data if name]
     return formatted
 
+# Serialized (display) statuses excluded from the "active" trial views
+INACTIVE_DISPLAY_STATUSES = [
+    'Completed', 'Terminated', 'Withdrawn', 'Suspended', 
+    'Active, Not Recruiting', 'Active Not Recruiting', 'Active_Not_Recruiting', 
+    'Unknown',
+    'No Longer Available',
+    'Temporarily Not Available'
+]
+
 def _get_active_trials_list():
     """
     Helper to return the list of active trials.
@@ -289,112 +331,147 @@ def _get_active_trials_list():
     """
     full_data = get_full_trials_dataset()
     
-    # Exclusion List logic
-    excluded_statuses = [
-        'Completed', 'Terminated', 'Withdrawn', 'Suspended', 
-        'Active, Not Recruiting', 'Active Not Recruiting', 'Active_Not_Recruiting', 
-        'Unknown',
-        'No Longer Available',
-        'Temporarily Not Available'
-    ]
-    
     # Filter active trials based on the serialized 'status' field (which is already normalized/mapped)
     active_trials = [
         t for t in full_data['trials'] 
-        if t['status'] not in excluded_statuses
+        if t['status'] not in INACTIVE_DISPLAY_STATUSES
     ]
     return active_trials
 
+TRIAL_FACETS_CACHE_KEY = 'trial_finder_facets'
+
+def _trial_genes(t):
+    # Redundant cleaning just in case
+    for g in t.get('genes') or []:
+        clean_g = re.sub(r'\s*mutation\s*', '', g, flags=re.IGNORECASE).strip()
+        if clean_g:
+            yield clean_g
+
+def _trial_intervention_types(t):
+    if not t.get('interventionTypes'):
+        # Explicit "Not Specified" if missing or empty
+        return ["Not Specified"]
+    # Clean up: replace underscores with spaces and Title Case
+    return [it.replace('_', ' ').title() for it in t['interventionTypes']]
+
+def _trial_countries(t):
+    for loc in t.get('locations') or []:
+        if isinstance(loc, dict):
+            country = (loc.get('country') or '').strip()
+            if country:
+                yield country.title()
+
+# Facet name -> values of a serialized (Trial Finder) trial
+TRIAL_FINDER_FACETS = {
+    'status': lambda t: [t['status']] if t.get('status') else [],
+    'phase': lambda t: [t['phase']] if t.get('phase') else [],
+    'study_type': lambda t: [t['studyType']] if t.get('studyType') else [],
+    'gene': _trial_genes,
+    'intervention_type': _trial_intervention_types,
+    'country': _trial_countries,
+}
+
+def _build_trial_facets():
+    return FacetIndex(_get_active_trials_list(), TRIAL_FINDER_FACETS)
+
+def get_trial_facets(force_refresh: bool = False):
+    """Returns the cached FacetIndex over the active (Trial Finder) trials."""
+    return get_or_build(TRIAL_FACETS_CACHE_KEY, _build_trial_facets, force_refresh=force_refresh)
+
+GENE_MARKERS_CACHE_KEY = 'gene_marker_index'
+
+def _build_gene_marker_index():
+    return GeneMarkerIndex(get_full_trials_dataset()['trials'], INACTIVE_DISPLAY_STATUSES)
+
+def get_gene_marker_index(force_refresh: bool = False):
+    """Returns the cached GeneMarkerIndex over the full serialized dataset."""
+    return get_or_build(GENE_MARKERS_CACHE_KEY, _build_gene_marker_index, force_refresh=force_refresh)
+
 @router.get("/filter-options")
-def get_filter_options(request):
+def get_filter_options(request,
+                       status: List[str] = Query(None),
+                       phase: List[str] = Query(None),
+                       study_type: List[str] = Query(None),
+                       gene: List[str] = Query(None),
+                       intervention_type: List[str] = Query(None),
+                       country: List[str] = Query(None)):
     """
     Returns distinct values for dynamic filters:
     - Phases
     - Study Types
     - Statuses
     - Genes
-    derived DYNAMICALLY from the active dataset.
+    - Intervention Types
+    derived DYNAMICALLY from the active dataset, plus live per-value counts
+    for the current selection (see get_trial_facets).
     """
-    active_trials = _get_active_trials_list()
-    
-    # Extract unique values using Python sets
-    phases = set()
-    study_types = set()
-    statuses = set()
-    genes = set()
-    intervention_types = set()
-    
-    for t in active_trials:
-        if t.get('phase'):
-            phases.add(t['phase'])
-        if t.get('studyType'):
-            study_types.add(t['studyType'])
-        if t.get('status'):
-            statuses.add(t['status'])
-        
-        # Genes can be in 'genes' list
-        # Redundant cleaning just in case
-        if t.get('genes'):
-            for g in t['genes']:
-                clean_g = re.sub(r'\s*mutation\s*', '', g, flags=re.IGNORECASE).strip()
-                genes.add(clean_g)
-
-        # Intervention Types
-        if t.get('interventionTypes'):
-            for it in t['interventionTypes']:
-                # Clean up: replace underscores with spaces and Title Case
-                clean_type = it.replace('_', ' ').title()
-                intervention_types.add(clean_type)
-        else:
-            # Add explicit "Not Specified" if missing or empty
-            intervention_types.add("Not Specified")
+    _, counts = get_trial_facets().search({
+        'status': status,
+        'phase': phase,
+        'study_type': study_type,
+        'gene': gene,
+        'intervention_type': intervention_type,
+        'country': country,
+    })
+
+    return {
+        "phases": sorted(counts['phase']),
+        "study_types": sorted(counts['study_type']),
+        "statuses": sorted(counts['status']),
+        "genes": sorted(counts['gene']),
+        "intervention_types": sorted(counts['intervention_type']),
+        "counts": counts,
+    }
 
+@router.get("/trial-facets")
+def get_trial_facet_search(request,
+                           status: List[str] = Query(None),
+                           phase: List[str] = Query(None),
+                           study_type: List[str] = Query(None),
+                           gene: List[str] = Query(None),
+                           intervention_type: List[str] = Query(None),
+                           country: List[str] = Query(None)):
+    """
+    Faceted search over the active trials.
+    Values are OR-ed within a facet and AND-ed across facets. Returns the matching
+    trial ids and, for every facet, the count each value would have given the other selections.
+    """
+    ids, counts = get_trial_facets().search({
+        'status': status,
+        'phase': phase,
+        'study_type': study_type,
+        'gene': gene,
+        'intervention_type': intervention_type,
+        'country': country,
+    })
     return {
-        "phases": sorted(list(phases)),
-        "study_types": sorted(list(study_types)),
-        "statuses": sorted(list(statuses)),
-        "genes": sorted(list(genes)),
-        "intervention_types": sorted(list(intervention_types))
+        "ids": ids,
+        "total_count": len(ids),
+        "facets": counts,
     }
 
 
 @router.get("/funding-sources")
 def get_funding_sources(request, status: List[str] = None, phase: List[str] = None, gene: str = None, familial: bool = False):
     """Returns trial counts by lead sponsor, grouped into categories."""
-    queryset = Trial.objects.all()
-    queryset = apply_analytics_filters(queryset, status, phase, gene, familial)
-    
-    data = queryset.values('lead_sponsor_name').annotate(count=Count('unique_protocol_id')).order_by('-count')
-    
-    # Categorize sponsors
-    categories = {
-        'NIH/Federal': 0,
-        'Industry': 0,
-        'Academic': 0,
-        'Other': 0
-    }
-    
-    federal_keywords = ['nih', 'national institutes', 'national institute', 'federal', 'government', 'va ', 'veterans']
-    industry_keywords = ['pharma', 'therapeutics', 'inc', 'corp', 'ltd', 'llc', 'biogen', 'novartis', 'roche', 'pfizer', 'sanofi', 'lilly', 'gsk', 'astrazeneca']
-    academic_keywords = ['university', 'college', 'hospital', 'medical center', 'school of medicine', 'institute', 'foundation']
-    
-    for item in data:
-        sponsor = (item['lead_sponsor_name'] or '').lower()
-        count = item['count']
-        
-        if any(kw in sponsor for kw in federal_keywords):
-            categories['NIH/Federal'] += count
-        elif any(kw in sponsor for kw in industry_keywords):
-            categories['Industry'] += count
-        elif any(kw in sponsor for kw in academic_keywords):
-            categories['Academic'] += count
-        else:
-            categories['Other'] += count
-    
+    # Sponsors are categorized once per sync (in the summary view and the trial index)
+    if gene:
+        index = get_trial_index()
+        counts = _funding_counts(index, index.filter_mask(status, phase, gene, familial))
+    else:
+        category_counts = dict(summary_counts(TrialSummary.objects.all(), 'sponsor_category', status, phase, familial))
+        counts = [category_counts.get(name, 0) for name in FUNDING_CATEGORIES]
+    return _funding_data(counts)
+
+def _funding_counts(index, mask):
+    """Trial counts per FUNDING_CATEGORIES entry under `mask`."""
+    return np.bincount(index.sponsor_codes[mask], minlength=len(FUNDING_CATEGORIES)).tolist()
+
+def _funding_data(counts):
     # Calculate percentages
-    total = sum(categories.values())
+    total = sum(counts)
     result = []
-    for name, count in categories.items():
+    for name, count in zip(FUNDING_CATEGORIES, counts):
         pct = round((count / total * 100), 0) if total > 0 else 0
         result.append({"name": name, "value": count, "percentage": pct})
     
@@ -404,50 +481,21 @@ def get_funding_sources(request, status: List[str] = None, phase: List[str] = No
 
 @router.get("/geographic-distribution")
 def get_geographic_distribution(request, status: List[str] = None, phase: List[str] = None, gene: str = None, familial: bool = False):
-    """Returns trial counts by country."""
-    queryset = Trial.objects.all()
-    queryset = apply_analytics_filters(queryset, status, phase, gene, familial)
-    
-    # Limit to filtered trials
-    trials = queryset.exclude(study_location__isnull=True).values('study_location')
-    country_counts = {}
-    
-    # Pre-compiled mapping for normalization (optional, but good for data cleanliness)
-    # Basic normalization to Title Case
-    
-    for t in trials:
-        locs = t['study_location']
-        if not locs: continue
-        
-        # Handle if it's a string (serialization artifact)
-        if isinstance(locs, str):
-            try:
-                locs = json.loads(locs)
-            except:
-                continue
-                
-        visited_countries_for_this_trial = set()
-        if isinstance(locs, list):
-            for loc in locs:
-                if isinstance(loc, dict):
-                    c = (loc.get('country') or loc.get('LocationCountry') or '').strip()
-                    if c:
-                        # Normalize typical variations if needed, or just Title Case
-                        c_norm = c.title() 
-                        # Specific fixes for common variations could go here e.g. "Korea, Republic of" -> "South Korea"
-                        # But for now, raw accurate country names are better than arbitrary regions.
-                        
-                        if c_norm not in visited_countries_for_this_trial:
-                            country_counts[c_norm] = country_counts.get(c_norm, 0) + 1
-                            visited_countries_for_this_trial.add(c_norm)
-
-    # Return top 20 or all? User wants accurate data. Let's return all, sorted.
-    # Frontend map likely handles "Rest of world" or specific list.
-    # Note: Frontend currently might expect "North America" etc. if the map is hardcoded to regions.
-    # I should check the frontend map component quickly to see if it breaks. 
-    # BUT FIRST: Fix the backend data.
-    
-    result = [{"name": name, "value": count} for name, count in country_counts.items()]
+    """Returns trial counts by country (Title Case country names, each trial counted once per country)."""
+    if gene:
+        index = get_trial_index()
+        data = _country_counts(index, index.filter_mask(status, phase, gene, familial))
+    else:
+        data = summary_counts(CountrySummary.objects.all(), 'country', status, phase, familial)
+    return _geo_data(data)
+
+def _country_counts(index, mask):
+    """[(country, trials)] under `mask`, ordered like summary_counts."""
+    counts = index.countries.counts(mask).tolist()
+    return sorted(((name, count) for name, count in zip(index.countries.values, counts) if count > 0), key=lambda x: (x[1], x[0]), reverse=True)
+
+def _geo_data(data):
+    result = [{"name": name, "value": count} for name, count in data]
     result.sort(key=lambda x: x['value'], reverse=True)
     return result
 
@@ -455,134 +503,32 @@ def get_geographic_distribution(request, status: List[str] = None, phase: List[s
 def get_genetic_markers(request, status: List[str] = None, phase: List[str] = None, gene: str = None, familial: bool = False):
     """
     Returns trial counts and drug counts by genetic marker/gene.
-    Refactored to use the shared _get_active_trials_list() to ensure consistency with
-    the Trial Finder/Gene Page counts (which merge M2M and JSON gene fields).
+    Counts come from the serialized trials dataset (via the GeneMarkerIndex) to ensure
+    consistency with the Trial Finder/Gene Page counts (which merge M2M and JSON gene fields).
+    Without a status filter only active trials are counted; an empty list counts all trials.
     """
-    
-    # 1. Get Base Data (Cached)
-    # If custom filters are provided that MATCH the "Active" definition, use the active list.
-    # If wildly different filters are used, this optimization might limit us, but for the Dashboard
-    # (which calls this without params or with default filters), this is perfect.
-    
-    # For now, we pull from the comprehensive dataset and apply Python-side filtering 
-    # to match the flexibility of the previous endpoint if needed.
-    
-    full_dataset = get_full_trials_dataset()['trials']
-    
-    # Apply Standard Filters (Ported from apply_analytics_filters to Python list comprehension)
-    # Note: For the "Active" view (default), we want to match _get_active_trials_list logic
-    
-    target_status_mode = 'active_all' if status is None else 'custom'
-    
-    if status:
-        # Simplified string matching for Python side
-        # This is a lightweight approximation of the DB logic for consistency
-        # Assuming the 'status' in dataset is already normalized/title-cased
-        pass 
-        # Implementing robust python-side filtering for complex queries is defined below
-        
-    filtered_trials = []
-    
-    # Pre-calculated exclusion list for default active view
-    excluded_statuses = [
-        'Completed', 'Terminated', 'Withdrawn', 'Suspended', 
-        'Active, Not Recruiting', 'Active Not Recruiting', 'Active_Not_Recruiting', 
-        'Unknown', 'No Longer Available', 'Temporarily Not Available'
-    ]
-
-    for t in full_dataset:
-        # 1. Status Filter
-        if target_status_mode == 'active_all':
-            if t['status'] in excluded_statuses:
-                continue
-        elif status:
-            # Basic support for custom status list if provided
-            # Map frontend params to likely values in the dataset
-            t_stat = t['status'].lower()
-            allowed = [s.lower() for s in status]
-            # Simple direct match override for now
-            if t_stat not in allowed: 
-                # Check for "active" mapping
-                if 'active' in allowed and t_stat == 'active': pass # matches
-                elif 'recruiting' in allowed and t_stat == 'recruiting': pass
-                elif 'completed' in allowed and t_stat == 'completed': pass
-                else: continue
-
-        # 2. Phase Filter
-        if phase:
-            if t['phase'] not in phase:
-                continue
-
-        # 3. Gene Filter (Search)
-        if gene:
-            gene_lower = gene.lower()
-            if not any(g.lower() == gene_lower for g in t['genes']):
-                continue
+    markers = get_gene_marker_index()
+    return _gene_marker_data(markers, markers.filter_mask(status, phase, gene, familial), _gene_metadata())
 
-        # 4. Familial Filter (Not typically used on this specific endpoint but kept for sig)
-        if familial:
-            if not t['genes']:
-                continue
+def _gene_metadata():
+    """Gene rows by lowercase symbol, for rich marker info (Name, Risk Category)."""
+    return {g.gene_symbol.lower(): g for g in Gene.objects.exclude(gene_risk_category__iexact='Tenuous')}
 
-        filtered_trials.append(t)
-
-    # 2. Aggregation
-    gene_stats = {}
-    
-    # Get Gene Metadata for rich info (Name, Risk Category)
-    # Cache this small table to avoid 20 queries
-    gene_meta = {g.gene_symbol.lower(): g for g in Gene.objects.exclude(gene_risk_category__iexact='Tenuous')}
-
-    for t in filtered_trials:
-        # Determine if trial is Interventional or Drug-based
-        is_interventional = (t['studyType'] or '').lower() == 'interventional'
-        is_observational = (t['studyType'] or '').lower() == 'observational'
-        
-        has_drug = False
-        if t['interventionTypes']:
-            #Check for "Drug" or "Biological" or "Genetic"
-            has_drug = any(it.lower() in ['drug', 'biological', 'genetic'] for it in t['interventionTypes'])
-
-        for g_symbol in t['genes']:
-            g_key = g_symbol.lower()
-            
-            # Skip if not a recognized ALS gene (unless we want to show all?)
-            # The previous implementation only showed "RelatedGenes" (SQL), so we should probably 
-            # only count genes that exist in our Gene table to avoid pollution from random extracted text.
-            if g_key not in gene_meta:
-                continue
-                
-            if g_key not in gene_stats:
-                gene_stats[g_key] = {
-                    "trials": 0,
-                    "drugs": 0,
-                    "interventional": 0,
-                    "observational": 0,
-                    "symbol": gene_meta[g_key].gene_symbol, # Use canonical case
-                    "full_name": gene_meta[g_key].gene_name,
-                    "category": gene_meta[g_key].gene_risk_category
-                }
-            
-            stats = gene_stats[g_key]
-            stats['trials'] += 1
-            if has_drug:
-                stats['drugs'] += 1
-            if is_interventional:
-                stats['interventional'] += 1
-            if is_observational:
-                stats['observational'] += 1
-
-    # 3. Format Result
+def _gene_marker_data(markers, mask, gene_meta):
     result = []
-    for key, stats in gene_stats.items():
+    for g_key, trials, drugs, interventional, observational in markers.counts(mask):
+        # Only count genes that exist in our Gene table to avoid pollution from random extracted text.
+        meta = gene_meta.get(g_key)
+        if meta is None:
+            continue
         result.append({
-            "name": stats['symbol'],
-            "full_name": stats['full_name'],
-            "category": stats['category'],
-            "trials": stats['trials'],
-            "drugs": stats['drugs'],
-            "interventional": stats['interventional'],
-            "observational": stats['observational']
+            "name": meta.gene_symbol, # Use canonical case
+            "full_name": meta.gene_name,
+            "category": meta.gene_risk_category,
+            "trials": trials,
+            "drugs": drugs,
+            "interventional": interventional,
+            "observational": observational
         })
 
     # Sort by trial count desc
@@ -592,19 +538,20 @@ def get_genetic_markers(request, status: List[str] = None, phase: List[str] = No
 
 @router.get("/enrollment-stats")
 def get_enrollment_stats(request, status: List[str] = None, phase: List[str] = None, gene: str = None, familial: bool = False):
-    queryset = Trial.objects.all()
-    queryset = apply_analytics_filters(queryset, status, phase, gene, familial)
+    index = get_trial_index()
+    mask = index.filter_mask(status, phase, gene, familial) & index.has_enrollment
     
     # Top 10 trials by enrollment
-    top_trials = queryset.exclude(enrollment_count__isnull=True).order_by('-enrollment_count')[:10]
-    formatted = [
-        {
-            "name": t.brief_title[:50] + "..." if t.brief_title and len(t.brief_title) > 50 else (t.brief_title or t.unique_protocol_id),
-            "value": t.enrollment_count,
-            "id": t.unique_protocol_id
-        }
-        for t in top_trials
-    ]
+    candidates = np.flatnonzero(mask)
+    top = candidates[np.argsort(-index.enrollment[candidates], kind='stable')[:10]]
+    formatted = []
+    for i in top:
+        title = index.titles[i]
+        formatted.append({
+            "name": title[:50] + "..." if title and len(title) > 50 else (title or index.ids[i]),
+            "value": int(index.enrollment[i]),
+            "id": index.ids[i]
+        })
     return formatted
 
 
@@ -622,31 +569,148 @@ def get_latest_news(request):
         for a in articles
     ]
 
+DASHBOARD_CUBE_CACHE_KEY = 'dashboard_package_cube'
+# Gene filters precomputed in the cube (by number of trials); other genes are computed live
+DASHBOARD_CUBE_TOP_GENES = 20
+
 @router.get("/dashboard-package")
-def get_dashboard_package(request, familial: bool = False):
-    """Returns all data needed for the dashboard in a single request."""
-    cache_key = f'dashboard_package_familial_v2_{familial}'
-    cached_data = cache.get(cache_key)
+async def get_dashboard_package(request, familial: bool = False, status: str = None, phase: str = None, gene: str = None):
+    """
+    Returns all data needed for the dashboard in a single request.
+    `status` (a status group), `phase` and `gene` narrow every section except
+    active_stats and the gene charts, which keep their own status scope.
+    The cube is read with async cache calls; only a live build runs in a worker thread.
+    """
+    cube = await aget_or_build(DASHBOARD_CUBE_CACHE_KEY, _build_dashboard_cube)
+    package = _lookup_dashboard_package(cube, status, phase, gene, familial)
+    if package is not None:
+        return package
     
-    if cached_data:
-        return cached_data
-
-    data = {
-        "stats": get_dashboard_stats(request, status=None, phase=None, gene=None, familial=familial),
-        "active_stats": get_dashboard_stats(request, status=['active_all'], phase=None, gene=None, familial=familial),
-        "status_data": get_trials_by_status(request, status=None, phase=None, gene=None, familial=familial),
-        "funding_data": get_funding_sources(request, status=None, phase=None, gene=None, familial=familial),
-        "geo_data": get_geographic_distribution(request, status=None, phase=None, gene=None, familial=familial),
-        "gene_data": get_genetic_markers(request, status=None, phase=None, gene=None, familial=familial), # Active (default)
-        "historical_gene_data": get_genetic_markers(request, status=[], phase=None, gene=None, familial=familial), # All Time (explicit empty status)
-        "year_data": get_trials_by_year(request, status=None, phase=None, gene=None, country=None, familial=familial),
-        "map_data": get_global_map_data(request, status=None, phase=None, gene=None, familial=familial),
-        "news_data": get_latest_news(request)
+    # Combination outside the cube (e.g. a less common gene)
+    return await sync_to_async(_build_dashboard_package)(request, status, phase, gene, familial)
+
+def _build_dashboard_package(request, status, phase, gene, familial):
+    status_filter = [status] if status else None
+    phase_filter = [phase] if phase else None
+    cutoff_year = datetime.datetime.now().year - 1
+    
+    # Shared by every section: loaded (or built) once, before fanning out
+    index = get_trial_index()
+    markers = get_gene_marker_index()
+    gene_meta = _gene_metadata()
+    base = index.filter_mask(status_filter, phase_filter, gene, familial)
+    
+    def chart(endpoint, from_mask):
+        # Gene filters are answered from the shared index mask, everything else from the summary views
+        if gene:
+            return lambda: from_mask(base)
+        return lambda: endpoint(request, status=status_filter, phase=phase_filter, gene=None, familial=familial)
+    
+    # Map defaults to current trials
+    map_mask = base if status else index.filter_mask(['active_all', 'active'], phase_filter, gene, familial)
+    
+    return run_sections({
+        "stats": lambda: _dashboard_stats(index, base),
+        "active_stats": lambda: _dashboard_stats(index, index.filter_mask(['active_all'], phase_filter, gene, familial)),
+        "status_data": chart(get_trials_by_status, lambda m: _status_data(_value_counts(index.status_codes, index.statuses, m))),
+        "funding_data": chart(get_funding_sources, lambda m: _funding_data(_funding_counts(index, m))),
+        "geo_data": chart(get_geographic_distribution, lambda m: _geo_data(_country_counts(index, m))),
+        "gene_data": lambda: _gene_marker_data(markers, markers.filter_mask(None, phase_filter, gene, familial), gene_meta), # Active (default)
+        "historical_gene_data": lambda: _gene_marker_data(markers, markers.filter_mask([], phase_filter, gene, familial), gene_meta), # All Time
+        "year_data": chart(get_trials_by_year, lambda m: _year_data(_year_counts(index, m, cutoff_year))),
+        "map_data": lambda: _map_data(index, map_mask),
+        "news_data": lambda: get_latest_news(request),
+    }, label='dashboard package')
+
+# Package sections, in the order cube cells store them
+DASHBOARD_PACKAGE_SECTIONS = (
+    'stats', 'active_stats', 'status_data', 'funding_data', 'geo_data',
+    'gene_data', 'historical_gene_data', 'year_data', 'map_data', 'news_data',
+)
+
+def _cube_key(status, phase, gene, familial):
+    return (status.lower() if status else None, phase or None, gene.strip().lower() if gene else None, bool(familial))
+
+def _lookup_dashboard_package(cube, status, phase, gene, familial):
+    section_ids = cube['cells'].get(_cube_key(status, phase, gene, familial))
+    if section_ids is None:
+        return None
+    sections = cube['sections']
+    return {name: sections[i] for name, i in zip(DASHBOARD_PACKAGE_SECTIONS, section_ids)}
+
+def _build_dashboard_cube():
+    """
+    Precomputes the dashboard package for every status group x phase x top gene x familial
+    combination (None meaning unfiltered), from the trial and gene marker indexes.
+
+    Every section is a function of a trial mask, so sections are computed once per
+    distinct mask and shared: a cell only stores the ids of its ten sections.
+    """
+    index = get_trial_index()
+    markers = get_gene_marker_index()
+    gene_meta = _gene_metadata()
+    cutoff_year = datetime.datetime.now().year - 1
+    
+    gene_counts = index.genes.counts(np.ones(index.size, dtype=bool)).tolist()
+    top_genes = sorted(zip(index.genes.values, gene_counts), key=lambda x: x[1], reverse=True)[:DASHBOARD_CUBE_TOP_GENES]
+    dimensions = {
+        'status': [None, *STATUS_GROUPS],
+        'phase': [None, *(p for p in index.phases if p)],
+        'gene': [None, *(g for g, _ in top_genes)],
+        'familial': [False, True],
     }
     
-    # Cache indefinitely (until next manual refresh)
-    cache.set(cache_key, data, timeout=None)
-    return data
+    sections = []
+    section_ids = {}
+    map_entries = {}
+    
+    def section(name, mask, build):
+        key = (name, np.packbits(mask).tobytes())
+        if key not in section_ids:
+            section_ids[key] = len(sections)
+            sections.append(build())
+        return section_ids[key]
+    
+    def trial_mask(status, phase, gene, familial):
+        return index.filter_mask([status] if status else None, [phase] if phase else None, gene, familial)
+    
+    def marker_mask(status, phase, gene, familial):
+        return markers.filter_mask(status, [phase] if phase else None, gene, familial)
+    
+    news_id = len(sections)
+    sections.append(get_latest_news(None))
+    
+    cells = {}
+    for status in dimensions['status']:
+        # The map defaults to current trials
+        map_status = [status] if status else ['active_all', 'active']
+        for phase in dimensions['phase']:
+            for gene in dimensions['gene']:
+                for familial in dimensions['familial']:
+                    mask = trial_mask(status, phase, gene, familial)
+                    active_mask = trial_mask('active_all', phase, gene, familial)
+                    map_mask = index.filter_mask(map_status, [phase] if phase else None, gene, familial)
+                    active_markers = marker_mask(None, phase, gene, familial)
+                    all_markers = marker_mask([], phase, gene, familial)
+                    cells[(status, phase, gene, familial)] = (
+                        section('stats', mask, lambda: _dashboard_stats(index, mask)),
+                        section('stats', active_mask, lambda: _dashboard_stats(index, active_mask)),
+                        section('status', mask, lambda: _status_data(_value_counts(index.status_codes, index.statuses, mask))),
+                        section('funding', mask, lambda: _funding_data(_funding_counts(index, mask))),
+                        section('geo', mask, lambda: _geo_data(_country_counts(index, mask))),
+                        section('markers', active_markers, lambda: _gene_marker_data(markers, active_markers, gene_meta)),
+                        section('markers', all_markers, lambda: _gene_marker_data(markers, all_markers, gene_meta)),
+                        section('years', mask, lambda: _year_data(_year_counts(index, mask, cutoff_year))),
+                        section('map', map_mask, lambda: _map_data(index, map_mask, map_entries)),
+                        news_id,
+                    )
+    
+    logger.info("Built dashboard cube: %d combinations, %d distinct sections", len(cells), len(sections))
+    return {'dimensions': dimensions, 'cells': cells, 'sections': sections}
+
+def get_dashboard_cube(force_refresh: bool = False):
+    """Returns the cached dashboard package cube, building it (single-flight) on a miss."""
+    return get_or_build(DASHBOARD_CUBE_CACHE_KEY, _build_dashboard_cube, force_refresh=force_refresh)
 
 @router.get("/trial-finder-data")
 def get_trial_finder_data(request):
@@ -663,6 +727,11 @@ def get_trial_finder_data(request):
         "note": "Excludes Completed/Terminated/Withdrawn/Suspended/Active, Not Recruiting/No Longer Available"
     }
 
+# Text search configuration, must match the search_vector trigger (migration 0032)
+SEARCH_CONFIG = 'english'
+# ts_rank weights for the D, C, B, A labels (summary, interventions/sponsor, conditions/keywords, title)
+SEARCH_RANK_WEIGHTS = [0.1, 0.2, 0.4, 1.0]
+
 @router.get("/trials-list")
 def get_trials_list(request, 
                    page: int = 1, 
@@ -671,37 +740,44 @@ def get_trials_list(request,
                    phase: List[str] = Query(None), 
                    study_type: List[str] = Query(None), 
                    gene: str = None,
-                   sort_by: str = '-status_verified_date'):
+                   search: str = None,
+                   country: str = None,
+                   sort_by: str = '-status_verified_date',
+                   sort_order: str = 'desc',
+                   cursor: str = None,
+                   total: str = 'exact'):
+
+    """
+    Paginated list of trials for the Trial Finder page.
+    Pages are numbered (`page`) or, for stable and constant-cost deep paging, continue from
+    the `next_cursor` of the previous page (`cursor`). `total` is 'exact', 'estimate' or 'none'.
+    """
+    if total not in TOTAL_MODES:
+        return JsonResponse({'error': f"total must be one of: {', '.join(TOTAL_MODES)}"}, status=400)
+    if per_page < 1 and per_page != -1:
+        return JsonResponse({'error': 'per_page must be at least 1 (or -1 for all trials)'}, status=400)
 
-    """Paginated list of trials for the Trial Finder page."""
     # Check cache for "all trials" request (no filters, per_page=-1)
     is_full_fetch = (
         per_page == -1 and 
         not any([status, phase, gene, study_type, search, country])
     )
     
-    cache_key = 'api_trials_list_full'
     if is_full_fetch:
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
-        # If not in cache, generate it now
         return get_full_trials_dataset()
 
     queryset = Trial.objects.all()
     
     # Apply filters
     if status:
-        status_map = {
-            'recruiting': ['RECRUITING', 'ENROLLING_BY_INVITATION'],
-            'active': ['ACTIVE_NOT_RECRUITING'],
-            'completed': ['COMPLETED'],
-        }
-        statuses = status_map.get(status.lower(), [status.upper()])
-        queryset = queryset.filter(overall_status__in=statuses)
+        queryset = queryset.filter(overall_status__in=expand_status_filter(status))
 
     if study_type:
-        queryset = queryset.filter(study_type__iexact=study_type)
+        # Accept both stored ("EXPANDED_ACCESS") and display ("Expanded Access") values
+        study_type_filter = Q()
+        for st in study_type:
+            study_type_filter |= Q(study_type__iexact=st.replace(' ', '_'))
+        queryset = queryset.filter(study_type_filter)
     
     if phase:
         # Handle multiple phases
@@ -709,45 +785,54 @@ def get_trials_list(request,
         queryset = queryset.filter(study_phase__in=phase)
     
     if gene:
-        # Filter by gene (related_genes M2M or genes JSON field)
-        queryset = queryset.filter(
-            Q(related_genes__gene_symbol__iexact=gene) | 
-            Q(genes__icontains=gene)
-        ).distinct()
+        queryset = queryset.filter(gene_filter(gene))
     
     if search:
-        queryset = queryset.filter(
-            Q(brief_title__icontains=search) |
-            Q(nct_id__icontains=search) |
-            Q(lead_sponsor_name__icontains=search)
+        # Ranked full-text search over the GIN-indexed search_vector
+        search_query = SearchQuery(search, search_type='websearch', config=SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=search_query).annotate(
+            # ts_rank is real; as double precision the value round-trips exactly through a cursor
+            rank=Cast(SearchRank(F('search_vector'), search_query, weights=SEARCH_RANK_WEIGHTS), FloatField()),
+            # Headlines are only computed for the rows of the requested page
+            title_highlight=SearchHeadline(
+                'brief_title', search_query, config=SEARCH_CONFIG,
+                start_sel='<mark>', stop_sel='</mark>', highlight_all=True,
+            ),
+            summary_highlight=SearchHeadline(
+                'brief_description', search_query, config=SEARCH_CONFIG,
+                start_sel='<mark>', stop_sel='</mark>', max_fragments=2, max_words=35, min_words=15,
+            ),
         )
     
     if country:
-        queryset = queryset.filter(study_location__icontains=country)
+        queryset = queryset.filter(country_filter(country))
     
     # Sorting
-    if sort_by:
-        field_map = {
-            'title': 'brief_title',
-            'status': 'overall_status',
-            'phase': 'study_phase',
-            'studyType': 'study_type',
-            'sponsor': 'lead_sponsor_name',
-            'nctId': 'nct_id',
-            'lastUpdated': 'last_updated',
-            'enrollment': 'enrollment_count'
-        }
-        db_field = field_map.get(sort_by)
-        if db_field:
-            if sort_order == 'desc':
-                db_field = f'-{db_field}'
-            queryset = queryset.order_by(db_field)
+    field_map = {
+        'title': 'brief_title',
+        'status': 'overall_status',
+        'phase': 'study_phase',
+        'studyType': 'study_type',
+        'sponsor': 'lead_sponsor_name',
+        'nctId': 'nct_id',
+        'lastUpdated': 'status_verified_date',
+        'enrollment': 'enrollment_count'
+    }
+    db_field = field_map.get(sort_by)
+    if db_field:
+        # The tiebreak follows the sort direction so (field, unique_protocol_id) indexes serve both
+        direction = '-' if sort_order == 'desc' else ''
+        queryset = queryset.order_by(f'{direction}{db_field}', f'{direction}unique_protocol_id')
+    elif search:
+        # Most relevant first
+        queryset = queryset.order_by('-rank', 'unique_protocol_id')
     else:
         # Default order
-        queryset = queryset.order_by('-status_verified_date', '-study_start_date')
+        queryset = queryset.order_by('-status_verified_date', '-study_start_date', 'unique_protocol_id')
     
     # Get total count for pagination
-    total_count = queryset.count()
+    total_count = count_rows(queryset, total)
+    next_cursor = None
     
     if per_page == -1:
         # Return all records
@@ -755,9 +840,15 @@ def get_trials_list(request,
         total_pages = 1
     else:
         # Apply pagination
-        total_pages = (total_count + per_page - 1) // per_page
-        offset = (page - 1) * per_page
-        trials = queryset[offset:offset + per_page]
+        total_pages = (total_count + per_page - 1) // per_page if total_count is not None else None
+        try:
+            if cursor:
+                # Keyset pagination: resumes after the cursor's row instead of skipping rows
+                trials, next_cursor = paginate_keyset(queryset, cursor, per_page)
+            else:
+                trials, next_cursor = paginate_offset(queryset, page, per_page)
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
     
     # Format response
     result = []
@@ -823,14 +914,21 @@ def get_trials_list(request,
             "enrollment": t.enrollment_count,
             "url": t.clinical_trial_url,
         })
+        if search:
+            result[-1]["rank"] = t.rank
+            result[-1]["highlights"] = {
+                "title": t.title_highlight,
+                "summary": t.summary_highlight,
+            }
     
     return {
         "trials": result,
         "pagination": {
-            "page": page,
+            "page": None if cursor else page,
             "per_page": per_page,
             "total_count": total_count,
             "total_pages": total_pages,
+            "next_cursor": next_cursor,
         }
     }
 
@@ -855,12 +953,19 @@ ALLOWED_QUERY_FIELDS = {
 # Allowed operators
 ALLOWED_OPERATORS = ['equals', 'contains', 'starts_with', 'gt', 'lt', 'gte', 'lte']
 
+# Columns returned per matching trial
+QUERY_RESULT_COLUMNS = ['nct_id', 'brief_title', 'overall_status', 'study_phase', 'lead_sponsor_name', 'enrollment_count', 'study_start_date']
+NUMERIC_QUERY_FIELDS = {'enrollment_count'}
+JSON_QUERY_FIELDS = {'genes', 'study_location'}
+REPLICA_COMPARISONS = {'gt': '>', 'lt': '<', 'gte': '>=', 'lte': '<='}
+
 
 @router.post("/query")
 def execute_query(request):
     """
     Execute a safe query built by the Query Builder.
-    Uses Django ORM only - no raw SQL.
+    Runs on the DuckDB analytics replica when a snapshot exists (whitelisted columns,
+    bound parameters), otherwise through the Django ORM.
     """
     try:
         import json as json_module
@@ -875,6 +980,7 @@ def execute_query(request):
     # Validate and build query
     queryset = Trial.objects.all()
     q_objects = []
+    conditions = []
     
     for f in filters:
         field = f.get('field')
@@ -890,6 +996,7 @@ def execute_query(request):
             return {"error": f"Invalid operator: {operator}"}
         
         db_field = ALLOWED_QUERY_FIELDS[field]
+        conditions.append(_replica_condition(db_field, operator, value))
         
         # Build Q object based on operator
         if operator == 'equals':
@@ -919,6 +1026,11 @@ def execute_query(request):
             except ValueError:
                 q_objects.append(Q(**{f'{db_field}__lte': value}))
     
+    try:
+        return _execute_query_on_replica(conditions, logic, limit)
+    except ReplicaUnavailable:
+        pass
+    
     # Combine Q objects with AND or OR
     if q_objects:
         if logic == 'OR':
@@ -935,20 +1047,21 @@ def execute_query(request):
     # Get total count
     total_count = queryset.count()
     
-    # Apply limit
-    trials = queryset[:limit]
-    
-    # Build response
+    # Apply limit (in the replica's order)
+    rows = queryset.order_by('unique_protocol_id').values_list(*QUERY_RESULT_COLUMNS)[:limit]
+    return _query_response(rows, total_count)
+
+def _query_response(rows, total_count):
     results = []
-    for t in trials:
+    for nct_id, title, status, phase, sponsor, enrollment, start_date in rows:
         results.append({
-            'nct_id': t.nct_id,
-            'title': t.brief_title,
-            'status': t.overall_status,
-            'phase': t.study_phase,
-            'sponsor': t.lead_sponsor_name,
-            'enrollment': t.enrollment_count,
-            'start_date': str(t.study_start_date) if t.study_start_date else None,
+            'nct_id': nct_id,
+            'title': title,
+            'status': status,
+            'phase': phase,
+            'sponsor': sponsor,
+            'enrollment': enrollment,
+            'start_date': str(start_date) if start_date else None,
         })
     
     return {
@@ -957,6 +1070,37 @@ def execute_query(request):
         "returned_count": len(results),
     }
 
+def _like_pattern(value):
+    return str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _replica_condition(column, operator, value):
+    """(SQL, parameter) for one Query Builder filter, with the ORM lookup's semantics."""
+    if operator == 'equals':
+        # A JSONField equals a JSON document; the replica stores the document's text, keys sorted
+        return f'"{column}" = ?', json.dumps(value, sort_keys=True) if column in JSON_QUERY_FIELDS else value
+    if operator in ('contains', 'starts_with'):
+        # icontains / istartswith compare the column's text (jsonb::text for JSON)
+        pattern = _like_pattern(value) + '%'
+        sql = f'CAST("{column}" AS VARCHAR) ILIKE ? ' + "ESCAPE '\\'"
+        return sql, pattern if operator == 'starts_with' else '%' + pattern
+    if column in NUMERIC_QUERY_FIELDS:
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+    return f'"{column}" {REPLICA_COMPARISONS[operator]} ?', value
+
+def _execute_query_on_replica(conditions, logic, limit):
+    where = f" {'OR' if logic == 'OR' else 'AND'} ".join(f'({sql})' for sql, _ in conditions) or 'TRUE'
+    params = [param for _, param in conditions]
+    columns = ', '.join(f'"{column}"' for column in QUERY_RESULT_COLUMNS)
+    with replica_cursor() as cursor:
+        total_count = cursor.execute(f"SELECT COUNT(*) FROM trials WHERE {where}", params).fetchone()[0]
+        rows = cursor.execute(
+            f"SELECT {columns} FROM trials WHERE {where} ORDER BY unique_protocol_id LIMIT ?", params + [limit]
+        ).fetchall()
+    return _query_response(rows, total_count)
+
 @router.get("/global-map")
 def get_global_map_data(request, status: List[str] = None, phase: List[str] = None, gene: str = None, familial: bool = False):
     """
@@ -967,53 +1111,160 @@ def get_global_map_data(request, status: List[str] = None, phase: List[str] = No
     if status is None:
         status = ['active_all', 'active']
         
-    queryset = Trial.objects.all()
-    queryset = apply_analytics_filters(queryset, status, phase, gene, familial)
-    
-    trials = queryset.exclude(study_location__isnull=True).exclude(study_location={})
+    index = get_trial_index()
+    return _map_data(index, index.filter_mask(status, phase, gene, familial))
+
+def _map_data(index, mask, entries=None):
+    """
+    Map clusters for the trials in `mask`. Passing an `entries` dict shares identical
+    cluster entries between calls (the dashboard cube stores many overlapping maps).
+    """
+    pairs = _site_pairs(index, mask)
+    if len(pairs) == 0:
+        return []
     
-    # Dictionary to aggregate sites: "lat,lon" -> {data}
-    sites = {}
+    cluster_ids, starts = np.unique(pairs[:, 0], return_index=True)
+    ends = np.append(starts[1:], len(pairs))
     
-    for trial in trials:
-        if not trial.study_location or not isinstance(trial.study_location, list):
-            continue
-            
-        for loc in trial.study_location:
-            geo = loc.get('geoPoint')
-            if not geo or 'lat' not in geo or 'lon' not in geo:
-                continue
-                
-            try:
-                lat = float(geo['lat'])
-                lon = float(geo['lon'])
-                
-                # Create a key for grouping (rounding to 3 decimal places ~100m)
-                key = f"{round(lat, 3)},{round(lon, 3)}"
-                
-                if key not in sites:
-                    sites[key] = {
-                        "name": loc.get('facility', 'Unknown Facility'),
-                        "city": loc.get('city', ''),
-                        "country": loc.get('country', ''),
-                        "position": [lat, lon],
-                        "trial_count": 0,
-                        "trials": []
-                    }
-                
-                # Update count and list (avoid duplicates if trial matches multiple locations in same cluster - rare but possible)
-                if trial.unique_protocol_id not in [t['id'] for t in sites[key]['trials']]:
-                    sites[key]['trial_count'] += 1
-                    sites[key]['trials'].append({
-                        "id": trial.unique_protocol_id,
-                        "title": trial.brief_title
-                    })
-                    
-            except (ValueError, TypeError):
-                continue
+    result = []
+    for cluster_id, start, end in zip(cluster_ids, starts, ends):
+        cluster = index.clusters[cluster_id]
+        trial_idx = pairs[start:end, 1]
+        if entries is not None:
+            key = (int(cluster_id), tuple(trial_idx.tolist()))
+            if key not in entries:
+                entries[key] = _map_entry(index, cluster, trial_idx)
+            result.append(entries[key])
+        else:
+            result.append(_map_entry(index, cluster, trial_idx))
+    return result
+
+def _site_pairs(index, mask):
+    """Unique (cluster, trial) pairs among the sites of the trials in `mask`, sorted."""
+    site_mask = mask[index.site_trial]
+    return _unique_pairs(index.site_cluster[site_mask], index.site_trial[site_mask])
+
+def _unique_pairs(first, second):
+    """Sorted unique (first, second) rows of two non-negative integer arrays (packed into int64 keys)."""
+    width = int(second.max()) + 1 if len(second) else 1
+    keys = np.unique(first.astype(np.int64) * width + second)
+    return np.stack([keys // width, keys % width], axis=1)
+
+def _map_entry(index, cluster, trial_idx):
+    return {
+        "name": cluster['name'],
+        "city": cluster['city'],
+        "country": cluster['country'],
+        "position": cluster['position'],
+        "trial_count": len(trial_idx),
+        "trials": [{"id": index.ids[i], "title": index.titles[i]} for i in trial_idx]
+    }
+
+
+def _map_filter_mask(index, status, phase, gene, familial):
+    # Default to active/current trials if no status filter is provided, like the global map
+    if status is None:
+        status = ['active_all', 'active']
+    return index.filter_mask(status, phase, gene, familial)
+
+def _parse_bbox(bbox):
+    """'west,south,east,north' in degrees (Leaflet's toBBoxString); west > east crosses the antimeridian."""
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(','))
+    except ValueError:
+        return None
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        return None
+    return west, south, east, north
+
+def _in_bbox(lat, lon, bbox):
+    west, south, east, north = bbox
+    in_lon = (lon >= west) & (lon <= east) if west <= east else (lon >= west) | (lon <= east)
+    return in_lon & (lat >= south) & (lat <= north)
+
+def _cell_of(index, zoom, clusters):
+    """Grid cell codes of `clusters` at `zoom`; beyond the grid pyramid every cluster is its own cell."""
+    if zoom > MAP_MAX_GRID_ZOOM:
+        return clusters.astype(np.int64)
+    return index.cluster_cells[zoom][clusters]
+
+def _cell_key(index, zoom, cell):
+    if zoom > MAP_MAX_GRID_ZOOM:
+        return f"site/{index.cluster_keys[cell]}"
+    return f"{zoom}/{cell}"
+
+@router.get("/global-map/clusters")
+def get_global_map_clusters(request, zoom: int = 2, bbox: str = None, status: List[str] = Query(None), phase: List[str] = Query(None), gene: str = None, familial: bool = False):
+    """
+    Map clusters for one zoom level, optionally limited to a bounding box.
+    Sites are bucketed into the index's precomputed grid pyramid (cells of 360 / 2**zoom degrees;
+    past MAP_MAX_GRID_ZOOM, the ~100m site clusters). Clusters only carry counts and a centroid;
+    their trials are loaded on demand from /global-map/cluster-trials using the cluster key.
+    """
+    if zoom < 0:
+        return JsonResponse({'error': 'zoom must be non-negative'}, status=400)
+    view = None
+    if bbox:
+        view = _parse_bbox(bbox)
+        if view is None:
+            return JsonResponse({'error': "bbox must be 'west,south,east,north' in degrees"}, status=400)
+    
+    index = get_trial_index()
+    pairs = _site_pairs(index, _map_filter_mask(index, status, phase, gene, familial))
+    if view is not None:
+        pairs = pairs[_in_bbox(index.cluster_lat[pairs[:, 0]], index.cluster_lon[pairs[:, 0]], view)]
+    if len(pairs) == 0:
+        return {"zoom": zoom, "clusters": []}
+    
+    cells = _cell_of(index, zoom, pairs[:, 0])
+    # Trials per cell (a trial with several sites in a cell counts once)
+    cell_trials = _unique_pairs(cells, pairs[:, 1])
+    cell_ids, trial_counts = np.unique(cell_trials[:, 0], return_counts=True)
+    # Distinct site clusters per cell, averaged for the marker position
+    cell_clusters = _unique_pairs(cells, pairs[:, 0])
+    _, slot, site_counts = np.unique(cell_clusters[:, 0], return_inverse=True, return_counts=True)
+    lat = np.bincount(slot, weights=index.cluster_lat[cell_clusters[:, 1]]) / site_counts
+    lon = np.bincount(slot, weights=index.cluster_lon[cell_clusters[:, 1]]) / site_counts
+    first_cluster = cell_clusters[np.searchsorted(cell_clusters[:, 0], cell_ids), 1]
     
-    # Convert to list
-    return list(sites.values())
+    result = []
+    for i, cell in enumerate(cell_ids.tolist()):
+        entry = {
+            "key": _cell_key(index, zoom, cell),
+            "position": [round(float(lat[i]), 5), round(float(lon[i]), 5)],
+            "trial_count": int(trial_counts[i]),
+            "site_count": int(site_counts[i]),
+        }
+        if site_counts[i] == 1:
+            # A single site cluster keeps its label
+            cluster = index.clusters[first_cluster[i]]
+            entry.update({"name": cluster['name'], "city": cluster['city'], "country": cluster['country']})
+        result.append(entry)
+    return {"zoom": zoom, "clusters": result}
+
+@router.get("/global-map/cluster-trials")
+def get_global_map_cluster_trials(request, key: str, status: List[str] = Query(None), phase: List[str] = Query(None), gene: str = None, familial: bool = False):
+    """Trials with a site in one /global-map/clusters cluster (same filters), loaded when it is opened."""
+    index = get_trial_index()
+    level, _, code = key.partition('/')
+    if level == 'site':
+        in_cell = np.array([cluster_key == code for cluster_key in index.cluster_keys], dtype=bool)
+    else:
+        try:
+            zoom, cell = int(level), int(code)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid cluster key'}, status=400)
+        if not 0 <= zoom <= MAP_MAX_GRID_ZOOM:
+            return JsonResponse({'error': 'Invalid cluster key'}, status=400)
+        in_cell = index.cluster_cells[zoom] == cell
+    
+    pairs = _site_pairs(index, _map_filter_mask(index, status, phase, gene, familial))
+    trial_idx = np.unique(pairs[in_cell[pairs[:, 0]], 1])
+    return {
+        "key": key,
+        "trial_count": len(trial_idx),
+        "trials": [{"id": index.ids[i], "title": index.titles[i]} for i in trial_idx],
+    }
 
 
 @router.get("/trials-by-year")
@@ -1024,31 +1275,31 @@ def get_trials_by_year(request, status: List[str] = None, phase: List[str] = Non
     """
     current_year = datetime.datetime.now().year
     cutoff_year = current_year - 1
-    cutoff_date = datetime.date(cutoff_year, 12, 31)
-    
-    queryset = Trial.objects.all()
-    queryset = apply_analytics_filters(queryset, status, phase, gene, familial)
     
-    if country:
-        queryset = queryset.filter(study_location__icontains=country)
-    
-    # Filter trials started on or before the cutoff date
-    # Also exclude trials with no start date
-    data = (
-        queryset
-        .filter(study_start_date__lte=cutoff_date)
-        .exclude(study_start_date__isnull=True)
-        .annotate(year=ExtractYear('study_start_date'))
-        .values('year')
-        .annotate(count=Count('unique_protocol_id'))
-        .order_by('year')
-    )
+    if gene:
+        index = get_trial_index()
+        data = _year_counts(index, index.filter_mask(status, phase, gene, familial, country=country), cutoff_year)
+    else:
+        if country:
+            summaries = CountrySummary.objects.filter(country__iexact=country.strip())
+        else:
+            summaries = TrialSummary.objects.all()
+        summaries = summaries.filter(start_year__gt=0, start_year__lte=cutoff_year)
+        data = sorted(summary_counts(summaries, 'start_year', status, phase, familial))
     
+    return _year_data(data)
+
+def _year_counts(index, mask, cutoff_year):
+    # Trials started on or before the cutoff year; a start year of 0 means no start date
+    mask = mask & (index.start_year > 0) & (index.start_year <= cutoff_year)
+    years, counts = np.unique(index.start_year[mask], return_counts=True)
+    return zip(years.tolist(), counts.tolist())
+
+def _year_data(data):
     # Format for frontend
     result = [
-        {"year": item['year'], "count": item['count']}
-        for item in data
-        if item['year'] is not None  # Extra safety check
+        {"year": year, "count": count}
+        for year, count in data
     ]
     
     return result
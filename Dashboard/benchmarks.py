@@ -0,0 +1,414 @@
+import copy
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from unittest.mock import patch
+
+import django
+import pandas as pd
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from .api_analytics import get_dashboard_cube, get_full_trials_dataset, get_gene_marker_index, get_trial_facets
+from .caching import local_cache
+from .metrics import sync_stage_results
+from .models import Intervention, NewsArticle, Trial, TrialSite
+from .query_inspector import QueryInspector
+from .replica import snapshot_replica
+from .summaries import refresh_summary_views
+from .synthetic import SyntheticSourcesServer, seed_synthetic_news, seed_synthetic_trials
+from .trial_index import get_trial_index
+from .utils import enhanced_fetch_trial_data, fetch_trial_data, update_data
+
+# Benchmarks never touch the shared Redis; warm reads are served by the local tier either way
+BENCHMARK_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Requests timed by the benchmark: (method, path, query params or JSON body).
+# Every analytics route appears at least once (see the coverage test); the filtered
+# variants exercise the in-memory index paths as well as the summary views.
+BENCHMARK_ENDPOINTS = [
+    ('GET', '/api/trials/', None),
+    ('GET', '/api/analytics/countries', None),
+    ('GET', '/api/analytics/summary', None),
+    ('GET', '/api/analytics/dashboard-stats', None),
+    ('GET', '/api/analytics/dashboard-stats', {'gene': 'SOD1', 'status': 'recruiting'}),
+    ('GET', '/api/analytics/trials-by-phase', None),
+    ('GET', '/api/analytics/trials-by-phase', {'gene': 'SOD1'}),
+    ('GET', '/api/analytics/trials-by-status', None),
+    ('GET', '/api/analytics/filter-options', None),
+    ('GET', '/api/analytics/trial-facets', {'phase': 'Phase 2', 'gene': 'SOD1'}),
+    ('GET', '/api/analytics/funding-sources', None),
+    ('GET', '/api/analytics/geographic-distribution', None),
+    ('GET', '/api/analytics/genetic-markers', None),
+    ('GET', '/api/analytics/enrollment-stats', None),
+    ('GET', '/api/analytics/latest-news', None),
+    ('GET', '/api/analytics/dashboard-package', None),
+    ('GET', '/api/analytics/dashboard-package', {'status': 'recruiting', 'gene': 'sod1'}),
+    ('GET', '/api/analytics/trial-finder-data', None),
+    ('GET', '/api/analytics/trials-list', None),
+    ('GET', '/api/analytics/trials-list', {'search': 'SOD1', 'country': 'Germany'}),
+    ('GET', '/api/analytics/trials-list', {'per_page': -1}),
+    ('GET', '/api/analytics/global-map', None),
+    ('GET', '/api/analytics/global-map/clusters', {'zoom': 4}),
+    ('GET', '/api/analytics/global-map/cluster-trials', {'key': '0/0'}),
+    ('GET', '/api/analytics/trials-by-year', None),
+    ('GET', '/api/analytics/trials-by-year', {'country': 'United States'}),
+    ('POST', '/api/analytics/query', {'filters': [{'field': 'brief_title', 'operator': 'contains', 'value': 'SOD1'}], 'limit': 100}),
+]
+
+# Cache builders: name -> (cold call, warm call). Cold rebuilds that one entry only (its
+# inputs stay cached), warm is the steady-state read; the replica snapshot has no warm read.
+BENCHMARK_BUILDERS = {
+    'full_trials_dataset': (lambda: get_full_trials_dataset(force_refresh=True), get_full_trials_dataset),
+    'trial_index': (lambda: get_trial_index(force_refresh=True), get_trial_index),
+    'trial_facets': (lambda: get_trial_facets(force_refresh=True), get_trial_facets),
+    'gene_marker_index': (lambda: get_gene_marker_index(force_refresh=True), get_gene_marker_index),
+    'dashboard_cube': (lambda: get_dashboard_cube(force_refresh=True), get_dashboard_cube),
+    'analytics_replica': (snapshot_replica, None),
+}
+
+
+# The benchmark corpus has one synthetic news article per this many trials
+BENCHMARK_TRIALS_PER_ARTICLE = 10
+
+# Budget thresholds derived from a baseline (see derive_budget): latency may grow by half, or
+# by LATENCY_FLOOR_MS for routes too fast to time steadily; query counts by a tenth, memory
+# by half and payloads by a fifth. A doubling of any measurement fails the budget.
+LATENCY_MARGIN = 1.5
+LATENCY_FLOOR_MS = 10
+QUERY_MARGIN = 1.1
+MEMORY_MARGIN = 1.5
+PAYLOAD_MARGIN = 1.2
+
+
+@contextmanager
+def benchmark_database(stdout=None):
+    """
+    Runs the enclosed benchmark in a throwaway, migrated database (`benchmark_<NAME>`,
+    never the configured one), with local-memory caches and a temporary analytics replica.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.settings_dict['TEST'] = {**connection.settings_dict.get('TEST', {}), 'NAME': f'benchmark_{old_name}'}
+    if stdout:
+        stdout.write(f"Creating benchmark database {connection.settings_dict['TEST']['NAME']}...")
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with tempfile.TemporaryDirectory() as replica_dir, override_settings(
+                DEBUG=False, ALLOWED_HOSTS=['testserver'], CACHES=BENCHMARK_CACHES, ANALYTICS_REPLICA_DIR=replica_dir):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def benchmark_report(**fields):
+    """Header of a benchmark section: when, where, and the run options in `fields`."""
+    return {
+        'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        **fields,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'postgres': connection.pg_version,
+        },
+    }
+
+
+def write_baseline(path, section, report):
+    """Stores `report` as `section` ('analytics', 'ingest') of the JSON baseline, keeping the other sections."""
+    try:
+        with open(path) as handle:
+            baseline = json.load(handle)
+    except FileNotFoundError:
+        baseline = {}
+    baseline[section] = report
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as handle:
+        json.dump(baseline, handle, indent=2)
+
+
+def seed_benchmark_corpus(stop, start=0, seed=0):
+    """
+    Grows the synthetic corpus to `stop` trials (trial i is the same at every scale), with
+    news articles in proportion, and brings everything the endpoints read up to date:
+    summary views, planner statistics and the analytics replica the Query Builder prefers.
+    """
+    seed_synthetic_trials(stop, start=start, seed=seed)
+    seed_synthetic_news(stop // BENCHMARK_TRIALS_PER_ARTICLE, start=start // BENCHMARK_TRIALS_PER_ARTICLE, seed=seed)
+    refresh_summary_views()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    snapshot_replica()
+
+
+def corpus_counts():
+    return {
+        'trials': Trial.objects.count(),
+        'sites': TrialSite.objects.count(),
+        'interventions': Intervention.objects.count(),
+        'news_articles': NewsArticle.objects.count(),
+    }
+
+
+def endpoint_name(method, path, params):
+    if not params or method != 'GET':
+        return f'{method} {path}'
+    return f"{method} {path}?{'&'.join(f'{key}={value}' for key, value in params.items())}"
+
+
+def clear_caches():
+    cache.clear()
+    local_cache.clear()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def measure(call, repeat, setup=None):
+    """
+    Runs `call` `repeat` times (after `setup`, if given) and reports wall-clock p50/p95 in
+    milliseconds, the most queries one run issued and the peak traced Python memory. Memory
+    is traced in one extra run, since tracemalloc would skew the timings. Queries issued on
+    other threads (the parallel dashboard sections, the stub server) are not counted.
+    """
+    timings, queries = [], []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with QueryInspector() as inspector:
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(inspector.count)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'runs': repeat,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'queries': max(queries),
+        'peak_memory_mb': round(peak / 2**20, 2),
+    }
+
+
+def _request(client, method, path, params):
+    if method == 'POST':
+        response = client.post(path, json.dumps(params), content_type='application/json')
+    else:
+        response = client.get(path, params or {})
+    if response.status_code >= 400:
+        raise RuntimeError(f'{method} {path} answered {response.status_code}')
+    return response
+
+
+def _selected(name, only, names):
+    return (not only or only in name) and (names is None or name in names)
+
+
+def run_benchmarks(repeat=5, only=None, names=None):
+    """
+    Times every BENCHMARK_ENDPOINTS request (through the full middleware stack) and every
+    BENCHMARK_BUILDERS entry, cold (caches cleared first) and warm (caches primed), against
+    whatever corpus is in the database. `only` keeps the names containing that substring,
+    `names` (a collection) exactly those names.
+    Returns {'endpoints': {name: {'cold': ..., 'warm': ..., 'payload_bytes': ...}}, 'builders': {...}}.
+    """
+    client = Client()
+    results = {'endpoints': {}, 'builders': {}}
+    for method, path, params in BENCHMARK_ENDPOINTS:
+        name = endpoint_name(method, path, params)
+        if not _selected(name, only, names):
+            continue
+        call = lambda: _request(client, method, path, params)
+        cold = measure(call, repeat, setup=clear_caches)
+        payload = len(call().content)
+        results['endpoints'][name] = {'cold': cold, 'warm': measure(call, repeat), 'payload_bytes': payload}
+
+    for name, (cold_call, warm_call) in BENCHMARK_BUILDERS.items():
+        if not _selected(name, only, names):
+            continue
+        # Prime every cache first, so a cold run only rebuilds its own entry
+        for _, warm in BENCHMARK_BUILDERS.values():
+            if warm:
+                warm()
+        results['builders'][name] = {'cold': measure(cold_call, repeat)}
+        if warm_call:
+            results['builders'][name]['warm'] = measure(warm_call, repeat)
+    return results
+
+
+def _clear_ingested_trials():
+    Trial.objects.all().delete()
+
+
+def _sync_stage_timings():
+    stages = sync_stage_results()
+    return {
+        name: {'duration_ms': round(entry.get('duration', 0) * 1000, 2), 'rows': entry.get('rows'), 'errors': entry['errors']}
+        for name, entry in sorted(stages.items())
+    }
+
+
+def run_ingest_benchmark(total, repeat=3, seed=0):
+    """
+    Times the trial sync stage by stage against a SyntheticSourcesServer search of `total`
+    studies, offline: `fetch` (fetch_trial_data: paging, the exclusion filter, DataFrame
+    building), `enhance` (enhanced_fetch_trial_data on a fetched frame: criteria parsing
+    and gene matching) and `update` (update_data on an enhanced frame), both into an
+    empty trial table (`update_initial`) and as a re-sync of the same data
+    (`update_resync`). Each stage is fed the previous stage's output, so it is timed on
+    its own. `sync_stages` holds update_data's own stage timings (see sync_stage) of a re-sync.
+    """
+    with SyntheticSourcesServer(total, seed) as server, tempfile.TemporaryDirectory() as media_root, override_settings(
+            CTGOV_STUDIES_URL=server.studies_url, ALSOD_URL=server.alsod_url, MEDIA_ROOT=media_root):
+        # The sync prints per-record debugging output
+        with redirect_stdout(io.StringIO()):
+            # Untimed first pass: renders the pages
+            fetched = fetch_trial_data()
+            if not isinstance(fetched, pd.DataFrame):
+                raise RuntimeError(f'fetch_trial_data failed: {fetched}')
+            pages = server.requests
+            stages = {'fetch': measure(fetch_trial_data, repeat)}
+
+            with patch('Dashboard.utils.fetch_trial_data', side_effect=lambda: fetched.copy()):
+                enhanced = enhanced_fetch_trial_data()
+                stages['enhance'] = measure(enhanced_fetch_trial_data, repeat)
+
+            with patch('Dashboard.utils.enhanced_fetch_trial_data', side_effect=lambda: enhanced.copy()):
+                stages['update_initial'] = measure(update_data, repeat, setup=_clear_ingested_trials)
+                stages['update_resync'] = measure(update_data, repeat)
+                # measure() ended on the memory-traced run; record update_data's own stages untraced
+                update_data()
+    return {
+        'studies': total,
+        'pages': pages,
+        'ingested_trials': Trial.objects.count(),
+        'stages': stages,
+        'sync_stages': _sync_stage_timings(),
+    }
+
+
+def _thresholds(spec, path=()):
+    """Yields (path, limit) for every numeric leaf of a budget section (its 'scale' aside)."""
+    for key, value in spec.items():
+        if not path and key == 'scale':
+            continue
+        if isinstance(value, dict):
+            yield from _thresholds(value, path + (key,))
+        else:
+            yield path + (key,), value
+
+
+def _lookup(tree, path):
+    for key in path:
+        if not isinstance(tree, dict) or key not in tree:
+            return None
+        tree = tree[key]
+    return tree
+
+
+def _store(tree, path, value):
+    for key in path[:-1]:
+        tree = tree.setdefault(key, {})
+    tree[path[-1]] = value
+
+
+def _threshold(metric, value):
+    if metric in ('p95_ms', 'duration_ms'):
+        return math.ceil(max(value * LATENCY_MARGIN, value + LATENCY_FLOOR_MS))
+    if metric == 'queries':
+        return math.ceil(value * QUERY_MARGIN)
+    if metric == 'peak_memory_mb':
+        return math.ceil(value * MEMORY_MARGIN)
+    if metric == 'payload_bytes':
+        return math.ceil(value * PAYLOAD_MARGIN)
+    raise ValueError(f'No budget margin for {metric}')
+
+
+def derive_budget(spec, measured):
+    """
+    A copy of the budget section `spec` with every threshold re-derived (as an integer)
+    from the matching value of `measured`, the section's result at the budget's scale.
+    """
+    derived = {'scale': spec['scale']}
+    for path, _ in _thresholds(spec):
+        value = _lookup(measured, path)
+        if value is None:
+            raise ValueError(f"{' > '.join(path)} was not measured")
+        _store(derived, path, _threshold(path[-1], value))
+    return derived
+
+
+def slowest_result(spec, results):
+    """
+    The first of `results` (one section's result per measuring round) with every value
+    budget section `spec` has a threshold for replaced by its largest across the rounds,
+    so one fast round does not set the budget.
+    """
+    slowest = copy.deepcopy(results[0])
+    for path, _ in _thresholds(spec):
+        values = [value for value in (_lookup(result, path) for result in results) if value is not None]
+        if values:
+            _store(slowest, path, max(values))
+    return slowest
+
+
+def confirm_exceeded(section, spec, result, remeasure):
+    """
+    Re-measures the thresholds of budget section `spec` that `result` exceeds: `remeasure`
+    is called with their paths and returns a fresh result, whose values replace those in
+    `result`. One slow run on a busy machine is noise, while a regression is reproducible,
+    so a threshold only fails when it is exceeded twice. Returns the re-measured paths.
+    """
+    exceeded = [
+        row['path'] for row in check_budget({section: spec}, {section: result})
+        if not row['ok'] and row['value'] is not None
+    ]
+    if exceeded:
+        again = remeasure(exceeded)
+        for path in exceeded:
+            _store(result, path, _lookup(again, path))
+    return exceeded
+
+
+def check_budget(budget, measured, baseline=None):
+    """
+    Compares `measured` ({'analytics': run_benchmarks() result, 'ingest':
+    run_ingest_benchmark() result}) with every threshold of the `budget` sections, whose
+    shape mirrors those results (e.g. analytics > endpoints > <name> > cold > p95_ms).
+    A threshold fails when the value exceeds it or was not measured at all. `baseline`
+    values come from the section's report at the budget's scale, when there is one.
+    Returns one dict per threshold: section, path, limit, value, baseline, ok.
+    """
+    rows = []
+    for section, spec in budget.items():
+        reference = _lookup(baseline or {}, (section, 'scales', str(spec.get('scale'))))
+        for path, limit in _thresholds(spec):
+            value = _lookup(measured.get(section), path)
+            rows.append({
+                'section': section,
+                'path': path,
+                'limit': limit,
+                'value': value,
+                'baseline': _lookup(reference, path),
+                'ok': value is not None and value <= limit,
+            })
+    return rows
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Single-flight defaults for expensive cache rebuilds
+REBUILD_LOCK_TIMEOUT = 300  # seconds; upper bound on how long one rebuild may hold the lock
+REBUILD_WAIT_TIMEOUT = 15  # seconds a waiting worker polls before rebuilding on its own
+REBUILD_POLL_INTERVAL = 0.1
+
+# Per-process (L1) cache in front of Redis
+LOCAL_CACHE_MAX_ENTRIES = 16
+LOCAL_CACHE_TTL = 600  # seconds; bounds memory held by payloads nobody asks for anymore
+
+
+def lock_key(key):
+    return f'{key}:lock'
+
+
+def stale_key(key):
+    return f'{key}:stale'
+
+
+def version_key(key):
+    return f'{key}:version'
+
+
+class LocalCache:
+    """
+    Small thread-safe LRU with a TTL, holding already-decoded payloads for this process.
+    Entries are tagged with the dataset version they were loaded at, so a version bump
+    in Redis (i.e. a rebuild in any worker) invalidates them without any messaging.
+    Cached objects are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=LOCAL_CACHE_MAX_ENTRIES, ttl=LOCAL_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_version, expires_at, value = entry
+            if entry_version != version or expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalCache()
+
+
+def get_or_build(key, builder, force_refresh=False, lock_timeout=REBUILD_LOCK_TIMEOUT, wait_timeout=REBUILD_WAIT_TIMEOUT):
+    """
+    Returns the cached value for `key`, rebuilding it with `builder()` on a miss.
+
+    Lookups go through the per-process LocalCache first; the only Redis round trip
+    on an L1 hit is a GET of the small version key. On an L1 miss the versioned
+    entry is fetched (and unpickled) from Redis once, then reused by this worker.
+
+    Only one worker rebuilds at a time (single-flight): the lock is a Redis
+    SET NX with an expiry, so a crashed builder cannot wedge the key forever.
+    While a rebuild is in flight, other workers serve the previous version
+    from the stale copy, or briefly poll for the fresh value if none exists.
+    """
+    if not force_refresh:
+        version = cache.get(version_key(key))
+        if version is not None:
+            value = local_cache.get(key, version)
+            if value is not None:
+                record_cache_lookup(key, 'local_hit')
+                return value
+
+    entry = _get_or_build_entry(key, builder, force_refresh, lock_timeout, wait_timeout)
+    local_cache.set(key, entry['version'], entry['data'])
+    return entry['data']
+
+
+async def aget_or_build(key, builder, lock_timeout=REBUILD_LOCK_TIMEOUT, wait_timeout=REBUILD_WAIT_TIMEOUT):
+    """
+    get_or_build for async views. A local-tier hit is served on the event loop; the
+    Redis reads go through the async cache API, which django-redis only implements as
+    sync_to_async wrappers, so they (and a miss: rebuild or wait) each take a thread.
+    """
+    version = await cache.aget(version_key(key))
+    if version is not None:
+        value = local_cache.get(key, version)
+        if value is not None:
+            record_cache_lookup(key, 'local_hit')
+            return value
+        entry = _valid_entry(await cache.aget(key))
+        if entry is not None:
+            record_cache_lookup(key, 'redis_hit')
+            local_cache.set(key, entry['version'], entry['data'])
+            return entry['data']
+
+    return await sync_to_async(get_or_build)(key, builder, lock_timeout=lock_timeout, wait_timeout=wait_timeout)
+
+
+def _get_or_build_entry(key, builder, force_refresh, lock_timeout, wait_timeout):
+    # Every lookup is counted once: local_hit, redis_hit, stale, miss (waited for or rebuilt) or refresh
+    if not force_refresh:
+        entry = _get_entry(key)
+        if entry is not None:
+            record_cache_lookup(key, 'redis_hit')
+            return entry
+
+    token = uuid.uuid4().hex
+    if cache.add(lock_key(key), token, timeout=lock_timeout):
+        record_cache_lookup(key, 'refresh' if force_refresh else 'miss')
+        try:
+            return _rebuild(key, builder)
+        finally:
+            # Only release the lock if it is still ours (it may have expired and been re-taken)
+            if cache.get(lock_key(key)) == token:
+                cache.delete(lock_key(key))
+
+    if force_refresh:
+        # Explicit refreshes (nightly sync) must not be skipped because a request-driven rebuild is running
+        record_cache_lookup(key, 'refresh')
+        return _rebuild(key, builder)
+
+    stale = _get_entry(stale_key(key))
+    if stale is not None:
+        record_cache_lookup(key, 'stale')
+        logger.info(f"Serving stale '{key}' while another worker rebuilds it.")
+        return stale
+
+    record_cache_lookup(key, 'miss')
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        entry = _get_entry(key)
+        if entry is not None:
+            return entry
+
+    logger.warning(f"Timed out waiting for '{key}' rebuild; building it in this worker.")
+    return _rebuild(key, builder)
+
+
+def _get_entry(key):
+    return _valid_entry(cache.get(key))
+
+
+def _valid_entry(entry):
+    # Payloads cached before versioning was introduced are treated as misses
+    if isinstance(entry, dict) and 'version' in entry and 'data' in entry:
+        return entry
+    return None
+
+
+def _rebuild(key, builder):
+    entry = {'version': uuid.uuid4().hex, 'data': builder()}
+    # Cache indefinitely (until next manual refresh); the stale copy outlives explicit invalidation.
+    # The version key is written last so readers never pair a new version with an old payload.
+    cache.set(key, entry, timeout=None)
+    cache.set(stale_key(key), entry, timeout=None)
+    cache.set(version_key(key), entry['version'], timeout=None)
+    return entry
@@ -0,0 +1,146 @@
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ('record', 'replay')
+
+# Not stored: bodies are kept decoded, and cookies may carry credentials
+DROPPED_RESPONSE_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'set-cookie'}
+
+
+class CassetteMiss(httpx.TransportError):
+    """Replay found no recorded response; callers see it like any other network failure."""
+
+
+def request_key(request):
+    """
+    Identifies a request across runs: method, URL with its query parameters sorted, and a
+    digest of the body (LLM prompts, Superset logins). Request headers are left out, so
+    API keys and rotating tokens neither leak into the cassette nor break a replay.
+    """
+    url = request.url.copy_with(params=sorted(request.url.params.multi_items()))
+    body = request.read()
+    key = f'{request.method} {url}'
+    if body:
+        key += f' {hashlib.sha256(body).hexdigest()[:16]}'
+    return key
+
+
+class Cassette:
+    """
+    Recorded outbound HTTP traffic: gzip-compressed JSON lines, one interaction per line
+    ({key, method, url, status, headers, text | base64}). Recording starts a fresh file
+    and flushes after every interaction, so an interrupted sync leaves a usable cassette.
+    On replay, repeated requests get their responses in recorded order, then the last one
+    again, so a sync can be re-run any number of times.
+    """
+
+    def __init__(self, path, mode):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f'Unknown cassette mode {mode!r} (expected one of {CASSETTE_MODES})')
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._responses = defaultdict(deque)
+        self._last = {}
+        self._file = None
+        if mode == 'replay':
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def _load(self):
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as handle:
+                for line in handle:
+                    entry = json.loads(line)
+                    self._responses[entry['key']].append(entry)
+        except EOFError:
+            # Recording was interrupted; every flushed interaction is still there
+            logger.warning('Cassette %s was not closed cleanly; replaying what it holds', self.path)
+
+    def record(self, key, response):
+        headers = [(name, value) for name, value in response.headers.multi_items() if name.lower() not in DROPPED_RESPONSE_HEADERS]
+        entry = {
+            'key': key,
+            'method': response.request.method,
+            'url': str(response.request.url),
+            'status': response.status_code,
+            'headers': headers,
+        }
+        try:
+            entry['text'] = response.content.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['base64'] = base64.b64encode(response.content).decode('ascii')
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def replay(self, key, request):
+        with self._lock:
+            queue = self._responses.get(key)
+            if queue:
+                entry = self._last[key] = queue.popleft()
+            else:
+                entry = self._last.get(key)
+        if entry is None:
+            logger.warning('No recorded response for %s in cassette %s', key, self.path)
+            raise CassetteMiss(f'No recorded response for {key}', request=request)
+        content = base64.b64decode(entry['base64']) if 'base64' in entry else entry['text'].encode('utf-8')
+        return httpx.Response(entry['status'], headers=entry['headers'], content=content, request=request)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Set by use_cassette(); takes precedence over the HTTP_CASSETTE_MODE setting
+_override = None
+_configured = None
+_configured_lock = threading.Lock()
+
+
+def active_cassette():
+    """The cassette outbound requests go through, or None (straight to the network)."""
+    global _configured
+    if _override is not None:
+        return _override
+    mode = getattr(settings, 'HTTP_CASSETTE_MODE', '')
+    if not mode:
+        return None
+    path = settings.HTTP_CASSETTE
+    with _configured_lock:
+        if _configured is None or (_configured.path, _configured.mode) != (path, mode):
+            if _configured is not None:
+                _configured.close()
+            _configured = Cassette(path, mode)
+            atexit.register(_configured.close)
+            logger.info('HTTP cassette %s (%s)', path, mode)
+        return _configured
+
+
+@contextmanager
+def use_cassette(path, mode):
+    """Records or replays every outbound request of the enclosed block (all threads) with the cassette at `path`."""
+    global _override
+    previous = _override
+    _override = Cassette(path, mode)
+    try:
+        yield _override
+    finally:
+        _override.close()
+        _override = previous
@@ -0,0 +1,105 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+import duckdb
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on DuckDB cursors (queries) running at once in this process
+DUCKDB_MAX_CURSORS = 4
+# Catalog name of the attached Postgres database
+POSTGRES_CATALOG = 'db'
+
+
+def postgres_dsn():
+    """libpq connection string for the default Django database."""
+    db_settings = settings.DATABASES['default']
+    return (
+        f"dbname={db_settings['NAME']} user={db_settings['USER']} password={db_settings['PASSWORD']} "
+        f"host={db_settings['HOST']} port={db_settings['PORT']}"
+    )
+
+
+def attach_postgres(con):
+    """Loads the postgres extension and attaches the Django database (read-only) as `db`."""
+    con.execute("INSTALL postgres")
+    con.execute("LOAD postgres")
+    dsn = postgres_dsn().replace("'", "''")
+    con.execute(f"ATTACH '{dsn}' AS {POSTGRES_CATALOG} (TYPE POSTGRES, READ_ONLY)")
+    return POSTGRES_CATALOG
+
+
+class DuckDBEngine:
+    """
+    Long-lived in-memory DuckDB database shared by the threads of one process.
+
+    `setup(connection)` runs once, on first use (extension loading, ATTACH, views), and
+    returns the catalog queries run in. Every query gets its own cursor, i.e. a
+    thread-safe DuckDB connection to the same database, and at most `max_cursors` run
+    at once. The engine is rebuilt after a fork, or after reset() (e.g. a dropped attach);
+    a reset connection is only closed once the cursors still open on it are done.
+    """
+
+    def __init__(self, setup, max_cursors=DUCKDB_MAX_CURSORS):
+        self.setup = setup
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_cursors)
+        self._connection = None
+        self._catalog = None
+        self._pid = None
+        # Open cursors per connection (by id), so reset() never closes one in use
+        self._users = {}
+
+    def _acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's connection and cursors are not ours to use or close
+                self._connection, self._pid, self._users = None, os.getpid(), {}
+            if self._connection is None:
+                con = duckdb.connect(database=':memory:')
+                self._catalog = self.setup(con)
+                self._connection = con
+            self._users[id(self._connection)] = self._users.get(id(self._connection), 0) + 1
+            return self._connection, self._catalog
+
+    def _release(self, connection):
+        with self._lock:
+            self._users[id(connection)] -= 1
+            if self._users[id(connection)] == 0:
+                del self._users[id(connection)]
+                if connection is not self._connection:
+                    connection.close()
+
+    @contextmanager
+    def cursor(self):
+        with self._slots:
+            connection, catalog = self._acquire()
+            try:
+                cursor = connection.cursor()
+                try:
+                    if catalog:
+                        cursor.execute(f"USE {catalog}")
+                    yield cursor
+                finally:
+                    cursor.close()
+            finally:
+                self._release(connection)
+
+    def query(self, sql, params=None):
+        """Runs a (parameterized, `?` or `$name`) query and returns a DataFrame."""
+        with self.cursor() as cursor:
+            return cursor.execute(sql, params).df()
+
+    def reset(self):
+        with self._lock:
+            connection = self._connection
+            self._connection = self._catalog = None
+            # Otherwise the last cursor still using it closes it (see _release)
+            if connection is not None and self._pid == os.getpid() and id(connection) not in self._users:
+                connection.close()
+
+
+postgres_engine = DuckDBEngine(setup=attach_postgres)
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import weakref
+
+import httpx
+from asgiref.sync import sync_to_async
+
+from .cassettes import active_cassette, request_key
+
+HTTP_TIMEOUT = 10  # seconds
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+
+# One client per event loop: httpx connections are bound to the loop that opened them
+_clients = weakref.WeakKeyDictionary()
+
+# One synchronous client per process: httpx.Client is thread-safe
+_client = None
+_client_lock = threading.Lock()
+
+# Set by the ASGI entry point, where the event loop outlives the requests it serves. Under
+# WSGI (runserver), in management commands and in tests, every async view runs in its own
+# throwaway loop, where a per-loop client would never be reused nor closed.
+_long_lived_loops = False
+
+
+class CassetteClient(httpx.Client):
+    """
+    httpx.Client that records every final response (after redirects) into the active
+    cassette, or serves it from there without touching the network (see Dashboard/cassettes.py).
+    With no cassette active it is a plain httpx.Client.
+    """
+
+    def send(self, request, **kwargs):
+        cassette = active_cassette()
+        if cassette is None:
+            return super().send(request, **kwargs)
+        key = request_key(request)
+        if cassette.mode == 'replay':
+            return cassette.replay(key, request)
+        response = super().send(request, **kwargs)
+        response.read()
+        cassette.record(key, response)
+        return response
+
+
+class AsyncCassetteClient(httpx.AsyncClient):
+    """Async counterpart of CassetteClient."""
+
+    async def send(self, request, **kwargs):
+        cassette = active_cassette()
+        if cassette is None:
+            return await super().send(request, **kwargs)
+        key = request_key(request)
+        if cassette.mode == 'replay':
+            return cassette.replay(key, request)
+        response = await super().send(request, **kwargs)
+        await response.aread()
+        cassette.record(key, response)
+        return response
+
+
+class ThreadedAsyncClient:
+    """
+    The AsyncClient methods the async views use, served by the shared synchronous client
+    in a worker thread: its connection pool outlives the throwaway event loops.
+    """
+
+    is_closed = False
+
+    async def request(self, method, url, **kwargs):
+        return await sync_to_async(get_client().request, thread_sensitive=False)(method, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+
+def _client_options():
+    return {
+        'timeout': HTTP_TIMEOUT,
+        'limits': httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS),
+        'follow_redirects': True,
+    }
+
+
+def get_client():
+    """
+    Pooled httpx.Client for synchronous code: the syncs (ClinicalTrials.gov, ALSoD,
+    massgeneral.org, RSS feeds) and the LLM endpoints (handed to the OpenAI SDK).
+    """
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = CassetteClient(**_client_options())
+        return _client
+
+
+def use_long_lived_loops():
+    """Called by the ASGI entry point: event loops now get their own pooled AsyncClient."""
+    global _long_lived_loops
+    _long_lived_loops = True
+
+
+def get_async_client():
+    """
+    Pooled httpx.AsyncClient shared by every coroutine of the running event loop.
+    Under ASGI that is one client (and one connection pool) per worker, so async views
+    reuse keep-alive connections to Superset, massgeneral.org, AlphaFold, etc.; it is
+    closed at lifespan shutdown. Elsewhere this is a ThreadedAsyncClient.
+    """
+    if not _long_lived_loops:
+        return ThreadedAsyncClient()
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = AsyncCassetteClient(**_client_options())
+        _clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def lifespan(scope, receive, send):
+    """ASGI lifespan protocol (Django's handler has none): closes the loop's client at shutdown."""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_async_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
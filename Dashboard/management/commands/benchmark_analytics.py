@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard.benchmarks import benchmark_database, benchmark_report, corpus_counts, run_benchmarks, seed_benchmark_corpus, write_baseline
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the analytics endpoints, GET /trials/ and the cache builders on synthetic corpora '
+        'of increasing size (in a throwaway database) and writes p50/p95, query counts and peak memory to the JSON baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='10000,50000,100000,200000', help='Comma-separated corpus sizes (trials)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per endpoint and mode')
+        parser.add_argument('--seed', type=int, default=0, help='Synthetic corpus seed')
+        parser.add_argument('--only', help='Only benchmark endpoints/builders whose name contains this text')
+        parser.add_argument('--output', help='Baseline file to update (default: BENCHMARK_BASELINE)')
+
+    def handle(self, *args, **options):
+        try:
+            scales = sorted({int(scale) for scale in options['scales'].split(',')})
+        except ValueError:
+            raise CommandError('--scales must be comma-separated integers')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        output = options['output'] or settings.BENCHMARK_BASELINE
+
+        with benchmark_database(self.stdout):
+            report = benchmark_report(seed=options['seed'], repeat=options['repeat'], scales={})
+            seeded = 0
+            for scale in scales:
+                report['scales'][str(scale)] = self.benchmark_scale(seeded, scale, options)
+                seeded = scale
+
+        write_baseline(output, 'analytics', report)
+        self.stdout.write(self.style.SUCCESS(f'Wrote the analytics section of {output}'))
+
+    def benchmark_scale(self, seeded, scale, options):
+        # Corpora grow in place: trial i is the same at every scale
+        self.stdout.write(f'Seeding {scale - seeded} synthetic trials (corpus of {scale})...')
+        started = time.perf_counter()
+        seed_benchmark_corpus(scale, start=seeded, seed=options['seed'])
+        seed_seconds = round(time.perf_counter() - started, 1)
+
+        self.stdout.write(f'Benchmarking {scale} trials...')
+        results = run_benchmarks(repeat=options['repeat'], only=options['only'])
+        for group in ('endpoints', 'builders'):
+            for name, modes in results[group].items():
+                cold, warm = modes['cold'], modes.get('warm')
+                line = f"  {name:<75} cold p50 {cold['p50_ms']:>9.1f}ms p95 {cold['p95_ms']:>9.1f}ms {cold['queries']:>4}q {cold['peak_memory_mb']:>8.1f}MB"
+                if warm:
+                    line += f" | warm p50 {warm['p50_ms']:>8.1f}ms {warm['queries']:>3}q"
+                if 'payload_bytes' in modes:
+                    line += f" | {modes['payload_bytes']:>9}B"
+                self.stdout.write(line)
+        return {
+            'corpus': corpus_counts(),
+            'seed_seconds': seed_seconds,
+            **results,
+        }
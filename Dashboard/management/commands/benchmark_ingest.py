@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard.benchmarks import benchmark_database, benchmark_report, run_ingest_benchmark, write_baseline
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the trial sync offline, stage by stage (fetch, enhance, update), against a local stub '
+        'of ClinicalTrials.gov and ALSoD serving synthetic studies, and writes the results to the JSON baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--studies', default='1000,5000,10000', help='Comma-separated search sizes (studies)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage')
+        parser.add_argument('--seed', type=int, default=0, help='Synthetic study seed')
+        parser.add_argument('--output', help='Baseline file to update (default: BENCHMARK_BASELINE)')
+
+    def handle(self, *args, **options):
+        try:
+            scales = sorted({int(scale) for scale in options['studies'].split(',')})
+        except ValueError:
+            raise CommandError('--studies must be comma-separated integers')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        output = options['output'] or settings.BENCHMARK_BASELINE
+
+        with benchmark_database(self.stdout):
+            report = benchmark_report(seed=options['seed'], repeat=options['repeat'], scales={})
+            for scale in scales:
+                self.stdout.write(f'Benchmarking the ingest of {scale} studies...')
+                result = run_ingest_benchmark(scale, repeat=options['repeat'], seed=options['seed'])
+                self.stdout.write(f"  {result['pages']} pages, {result['ingested_trials']} trials ingested")
+                for name, stage in result['stages'].items():
+                    self.stdout.write(
+                        f"  {name:<16} p50 {stage['p50_ms']:>10.1f}ms p95 {stage['p95_ms']:>10.1f}ms "
+                        f"{stage['queries']:>7}q {stage['peak_memory_mb']:>8.1f}MB"
+                    )
+                for name, stage in result['sync_stages'].items():
+                    self.stdout.write(f"    update_data {name:<16} {stage['duration_ms']:>10.1f}ms rows {stage['rows']}")
+                report['scales'][str(scale)] = result
+
+        write_baseline(output, 'ingest', report)
+        self.stdout.write(self.style.SUCCESS(f'Wrote the ingest section of {output}'))
@@ -0,0 +1,142 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Dashboard.benchmarks import (
+    benchmark_database, benchmark_report, check_budget, confirm_exceeded, corpus_counts, derive_budget, run_benchmarks,
+    run_ingest_benchmark, slowest_result,
+    seed_benchmark_corpus, write_baseline,
+)
+
+BUDGET_SECTIONS = ('analytics', 'ingest')
+
+# Measuring rounds (each in a fresh database) --update keeps the slowest values of
+UPDATE_ROUNDS = 2
+
+
+def _load_json(path, what):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError) as e:
+        raise CommandError(f'Cannot read the {what} {path}: {e}')
+
+
+def _format(value):
+    return '-' if value is None else f'{value:g}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the endpoints, cache builders and sync stages listed in the performance budget '
+        '(in a throwaway database seeded at the budget\'s scale), prints every value against its '
+        'threshold and the stored baseline, and fails when any threshold is exceeded (twice: exceeded '
+        'values are measured again). With --update, measures twice, writes the slower values to the '
+        'baseline and re-derives every threshold from them instead'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', help='Budget file (default: BENCHMARK_BUDGET)')
+        parser.add_argument('--baseline', help='Baseline to diff against (default: BENCHMARK_BASELINE)')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per endpoint, builder and stage')
+        parser.add_argument('--seed', type=int, default=0, help='Synthetic corpus seed')
+        parser.add_argument('--update', action='store_true', help='Write the slower values of two rounds to the baseline and derive the budget from them')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        budget_path = options['budget'] or settings.BENCHMARK_BUDGET
+        budget = _load_json(budget_path, 'budget')
+        unknown = set(budget) - set(BUDGET_SECTIONS)
+        if unknown:
+            raise CommandError(f"Unknown budget sections: {', '.join(sorted(unknown))} (expected {', '.join(BUDGET_SECTIONS)})")
+        for section, spec in budget.items():
+            if not isinstance(spec.get('scale'), int):
+                raise CommandError(f'The {section} budget needs an integer scale')
+
+        baseline_path = options['baseline'] or settings.BENCHMARK_BASELINE
+        if options['update']:
+            rounds = []
+            for number in range(1, UPDATE_ROUNDS + 1):
+                self.stdout.write(f'Round {number} of {UPDATE_ROUNDS}')
+                with benchmark_database(self.stdout):
+                    rounds.append(self.measure(budget, options))
+                    reports = {section: benchmark_report(seed=options['seed'], repeat=options['repeat'], rounds=UPDATE_ROUNDS) for section in budget}
+            self.update(budget, rounds, reports, budget_path, baseline_path)
+            return
+        try:
+            baseline = _load_json(baseline_path, 'baseline')
+        except CommandError as e:
+            self.stdout.write(f'{e}; reporting against the budget only')
+            baseline = {}
+
+        with benchmark_database(self.stdout):
+            measured = self.measure(budget, options, confirm=True)
+        rows = check_budget(budget, measured, baseline)
+        for row in rows:
+            self.write_row(row)
+
+        failed = sum(not row['ok'] for row in rows)
+        if failed:
+            raise CommandError(f'{failed} of {len(rows)} performance budgets exceeded ({budget_path})')
+        self.stdout.write(self.style.SUCCESS(f'All {len(rows)} performance budgets met'))
+
+    def measure(self, budget, options, confirm=False):
+        """
+        Results per budget section, at the section's scale; runs inside benchmark_database().
+        With `confirm`, exceeded thresholds are measured again (see confirm_exceeded).
+        """
+        measured = {}
+        # Analytics first: the ingest benchmark empties the trial table
+        if 'analytics' in budget:
+            spec = budget['analytics']
+            self.stdout.write(f"Seeding {spec['scale']} synthetic trials...")
+            seed_benchmark_corpus(spec['scale'], seed=options['seed'])
+            names = set(spec.get('endpoints', {})) | set(spec.get('builders', {}))
+            self.stdout.write(f'Benchmarking {len(names)} endpoints and builders...')
+            measured['analytics'] = {'corpus': corpus_counts(), **run_benchmarks(repeat=options['repeat'], names=names)}
+            if confirm:
+                self.confirm('analytics', spec, measured['analytics'], lambda paths: run_benchmarks(
+                    repeat=options['repeat'], names={path[1] for path in paths},
+                ))
+        if 'ingest' in budget:
+            scale = budget['ingest']['scale']
+            self.stdout.write(f'Benchmarking the ingest of {scale} studies...')
+            measured['ingest'] = run_ingest_benchmark(scale, repeat=options['repeat'], seed=options['seed'])
+            if confirm:
+                self.confirm('ingest', budget['ingest'], measured['ingest'], lambda paths: run_ingest_benchmark(
+                    scale, repeat=options['repeat'], seed=options['seed'],
+                ))
+        return measured
+
+    def confirm(self, section, spec, result, remeasure):
+        def announce(paths):
+            self.stdout.write(f'Measuring {len(paths)} exceeded {section} thresholds again...')
+            return remeasure(paths)
+
+        confirm_exceeded(section, spec, result, announce)
+
+    def update(self, budget, rounds, reports, budget_path, baseline_path):
+        """Stores the slowest values of the rounds as each section's baseline, and their thresholds as the budget."""
+        measured = {section: slowest_result(spec, [result[section] for result in rounds]) for section, spec in budget.items()}
+        try:
+            derived = {section: derive_budget(spec, measured[section]) for section, spec in budget.items()}
+        except ValueError as e:
+            raise CommandError(f'Cannot derive the budget: {e}')
+        for section, spec in budget.items():
+            write_baseline(baseline_path, section, {**reports[section], 'scales': {str(spec['scale']): measured[section]}})
+        with open(budget_path, 'w') as handle:
+            json.dump(derived, handle, indent=2)
+            handle.write('\n')
+        thresholds = sum(len(check_budget({section: spec}, measured)) for section, spec in derived.items())
+        self.stdout.write(self.style.SUCCESS(f'Wrote {baseline_path} and {thresholds} thresholds to {budget_path}'))
+
+    def write_row(self, row):
+        line = f"{'ok  ' if row['ok'] else 'FAIL'} {row['section']}: {' > '.join(row['path'])}  {_format(row['value'])} / {_format(row['limit'])}"
+        baseline, value = row['baseline'], row['value']
+        if baseline is not None:
+            line += f'  baseline {_format(baseline)}'
+            if value is not None and baseline:
+                line += f' ({(value - baseline) / baseline * 100:+.1f}%)'
+        self.stdout.write(line if row['ok'] else self.style.ERROR(line))
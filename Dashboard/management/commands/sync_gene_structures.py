@@ -1,6 +1,7 @@
-import requests
+from asgiref.sync import async_to_sync
 from django.core.management.base import BaseCommand
 from Dashboard.models import Gene, GeneStructure
+from Dashboard.structures import resolve_alphafold_structure
 
 class Command(BaseCommand):
     help = 'Syncs gene structures with PDB and AlphaFold'
@@ -194,21 +195,9 @@ class Command(BaseCommand):
     def resolve_alphafold(self, structure):
         """Fetches the AlphaFold API to get the mmCIF URL."""
         uniprot_acc = structure.external_id
-        api_url = f"https://alphafold.ebi.ac.uk/api/prediction/{uniprot_acc}"
-        
         try:
-            resp = requests.get(api_url, timeout=10)
-            if resp.status_code == 200:
-                data = resp.json()
-                if data and len(data) > 0:
-                    model_data = data[0]
-                    cif_url = model_data.get("cifUrl")
-                    if cif_url:
-                        structure.custom_data_url = cif_url
-                        structure.custom_data_format = "cif"
-                        structure.save()
-                        self.stdout.write(f"  Resolved AlphaFold URL: {cif_url}")
-            else:
-                self.stdout.write(self.style.ERROR(f"  Failed to resolve AlphaFold for {uniprot_acc}: Status {resp.status_code}"))
+            cif_url = async_to_sync(resolve_alphafold_structure)(structure)
+            if cif_url:
+                self.stdout.write(f"  Resolved AlphaFold URL: {cif_url}")
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"  Error resolving AlphaFold for {uniprot_acc}: {e}"))
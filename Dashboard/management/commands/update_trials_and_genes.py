@@ -16,20 +16,8 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS('Data update complete. Refreshing cache...'))
         
-        # Refresh the API cache
-        from django.core.cache import cache
-        from Dashboard.api_analytics import get_full_trials_dataset, get_dashboard_package
-        
-        # 1. Refresh Full Trials List
-        get_full_trials_dataset()
-        
-        # 2. Refresh Dashboard Packages (All & Familial)
-        # Clear existing keys to force regeneration
-        cache.delete('dashboard_package_familial_False')
-        cache.delete('dashboard_package_familial_True')
-        
-        # Pre-warm the cache
-        get_dashboard_package(request=None, familial=False)
-        get_dashboard_package(request=None, familial=True)
+        # Refresh the API cache (full trials list, analytics index, dashboard packages)
+        from Dashboard.api_analytics import refresh_analytics_caches
+        refresh_analytics_caches()
         
         self.stdout.write(self.style.SUCCESS('Cache refreshed successfully. Update process complete.'))
@@ -0,0 +1,269 @@
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+# Default latency buckets (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Sync stage results are kept in the Django cache, since syncs run in other processes (cron,
+# management commands): per stage, its latest run and an error counter (incremented atomically)
+SYNC_STAGE_CACHE_KEY = 'metrics:sync_stage:{sync}:{stage}'
+SYNC_STAGE_ERRORS_CACHE_KEY = 'metrics:sync_stage_errors:{sync}:{stage}'
+# Stages reported on /metrics (besides those run by this process)
+SYNC_STAGES = (
+    ('trials', 'fetch'), ('trials', 'upsert'), ('trials', 'prune'),
+    ('genes', 'fetch'), ('genes', 'upsert'),
+    ('healey', 'fetch'), ('healey', 'save'),
+    ('news', 'fetch'), ('news', 'save'),
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """One metric family with fixed label names; samples are keyed by label values."""
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for name, key, extra, value in self.samples():
+            lines.append(f'{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Sets a total kept elsewhere (e.g. in the cache by another process)."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in sorted(self._values.items())]
+        samples = []
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f'{self.name}_bucket', key, (('le', _format_value(bound)),), cumulative))
+            samples.append((f'{self.name}_sum', key, (), total))
+            samples.append((f'{self.name}_count', key, (), count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """`collect()` runs before every render, e.g. to load values kept outside this process."""
+        self._collectors.append(collect)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        for collect in self._collectors:
+            collect()
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    'dashboard_http_request_duration_seconds', 'Request latency by route template.', ('method', 'route', 'status'),
+))
+DB_QUERIES = registry.register(Counter(
+    'dashboard_db_queries_total', 'SQL queries issued while serving requests, by route template.', ('route',),
+))
+DB_QUERY_SECONDS = registry.register(Counter(
+    'dashboard_db_query_seconds_total', 'Time spent in SQL queries while serving requests, by route template.', ('route',),
+))
+CACHE_LOOKUPS = registry.register(Counter(
+    'dashboard_cache_lookups_total',
+    'Analytics cache lookups by key family and result (local_hit, redis_hit, stale, miss, refresh).',
+    ('family', 'result'),
+))
+SYNC_STAGE_DURATION = registry.register(Gauge(
+    'dashboard_sync_stage_duration_seconds', 'Duration of the latest run of each sync stage.', ('sync', 'stage'),
+))
+SYNC_STAGE_ROWS = registry.register(Gauge(
+    'dashboard_sync_stage_rows', 'Rows handled by the latest run of each sync stage.', ('sync', 'stage'),
+))
+SYNC_STAGE_LAST_SUCCESS = registry.register(Gauge(
+    'dashboard_sync_stage_last_success_timestamp_seconds', 'Completion time of the latest successful run of each sync stage.', ('sync', 'stage'),
+))
+SYNC_STAGE_ERRORS = registry.register(Counter(
+    'dashboard_sync_stage_errors_total', 'Errors raised or logged by each sync stage.', ('sync', 'stage'),
+))
+
+
+def record_cache_lookup(family, result):
+    CACHE_LOOKUPS.inc(family=family, result=result)
+
+
+# Stages run by this process, reported even when not listed in SYNC_STAGES
+_local_stages = set()
+
+
+def record_sync_error(sync, stage):
+    """Counts an error a sync stage logged and recovered from (e.g. one failing feed)."""
+    _local_stages.add((sync, stage))
+    key = SYNC_STAGE_ERRORS_CACHE_KEY.format(sync=sync, stage=stage)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(key, 1, timeout=None)
+
+
+def _record_sync_run(sync, stage, duration, rows=None, failed=False):
+    _local_stages.add((sync, stage))
+    key = SYNC_STAGE_CACHE_KEY.format(sync=sync, stage=stage)
+    if failed:
+        record_sync_error(sync, stage)
+        # A failed run keeps the rows and completion time of the last successful one
+        entry = {**(cache.get(key) or {}), 'duration': duration}
+    else:
+        entry = {'duration': duration, 'rows': rows, 'finished_at': time.time()}
+    cache.set(key, entry, timeout=None)
+
+
+class _StageResult:
+    rows = None
+
+
+@contextmanager
+def sync_stage(sync, stage):
+    """
+    Times one stage of a data sync; set `.rows` on the yielded object to report a row
+    count. An exception counts as an error (and is re-raised). Results are kept in the
+    Django cache so /metrics shows them whichever process ran the sync.
+    """
+    result = _StageResult()
+    started = time.perf_counter()
+    try:
+        yield result
+    except Exception:
+        _record_sync_run(sync, stage, time.perf_counter() - started, failed=True)
+        raise
+    _record_sync_run(sync, stage, time.perf_counter() - started, rows=result.rows)
+
+
+@asynccontextmanager
+async def async_sync_stage(sync, stage):
+    """sync_stage for async views: the cache writes run in a worker thread."""
+    result = _StageResult()
+    started = time.perf_counter()
+    try:
+        yield result
+    except Exception:
+        await sync_to_async(_record_sync_run)(sync, stage, time.perf_counter() - started, failed=True)
+        raise
+    await sync_to_async(_record_sync_run)(sync, stage, time.perf_counter() - started, rows=result.rows)
+
+
+def sync_stage_results():
+    """
+    Latest results of the SYNC_STAGES (and this process' stages) that have run, keyed
+    'sync:stage': {sync, stage, errors, duration, rows, finished_at} (one cache round trip).
+    """
+    stages = sorted(set(SYNC_STAGES) | _local_stages)
+    keys = {}
+    for sync, stage in stages:
+        keys[(sync, stage)] = (SYNC_STAGE_CACHE_KEY.format(sync=sync, stage=stage), SYNC_STAGE_ERRORS_CACHE_KEY.format(sync=sync, stage=stage))
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    results = {}
+    for (sync, stage), (run_key, errors_key) in keys.items():
+        if run_key not in values and errors_key not in values:
+            continue
+        results[f'{sync}:{stage}'] = {'sync': sync, 'stage': stage, 'errors': values.get(errors_key, 0), **values.get(run_key, {})}
+    return results
+
+
+def _collect_sync_stages():
+    for entry in sync_stage_results().values():
+        labels = {'sync': entry['sync'], 'stage': entry['stage']}
+        if 'duration' in entry:
+            SYNC_STAGE_DURATION.set(entry['duration'], **labels)
+        if entry.get('rows') is not None:
+            SYNC_STAGE_ROWS.set(entry['rows'], **labels)
+        if 'finished_at' in entry:
+            SYNC_STAGE_LAST_SUCCESS.set(entry['finished_at'], **labels)
+        SYNC_STAGE_ERRORS.set_total(entry['errors'], **labels)
+
+
+registry.add_collector(_collect_sync_stages)
@@ -0,0 +1,211 @@
+import hmac
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .metrics import DB_QUERIES, DB_QUERY_SECONDS, REQUEST_LATENCY
+from .profiling import PROFILE_MODES, RequestProfile
+from .query_inspector import QueryInspector
+
+logger = logging.getLogger('Dashboard.queries')
+
+# Longest query shape quoted in the log line
+LOGGED_SHAPE_LENGTH = 300
+
+
+class _QueryTally:
+    """execute_wrapper that only counts queries and their time (cheap enough for every request)."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+@asynccontextmanager
+async def _on_request_thread(make_context):
+    """
+    Creates and enters a sync context manager on the thread this request's async ORM
+    calls run on: database connections are per thread, so wrappers installed on the
+    event loop's connection would never see the queries.
+    """
+    def enter():
+        context = make_context()
+        return context, context.__enter__()
+
+    context, value = await sync_to_async(enter)()
+    try:
+        yield value
+    except BaseException as e:
+        if not await sync_to_async(context.__exit__)(type(e), e, e.__traceback__):
+            raise
+    else:
+        await sync_to_async(context.__exit__)(None, None, None)
+
+
+class _HybridMiddleware:
+    """
+    Base for middleware that runs in both modes (Django picks the mode from the rest of
+    the chain): under ASGI, `__call__` hands over to the coroutine `__acall__` rather than
+    making Django switch threads around the middleware.
+    """
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+class MetricsMiddleware(_HybridMiddleware):
+    """
+    Records request latency and the default connection's query count/time for /metrics,
+    labelled by route template (e.g. `api/genes/<symbol>/structure`) to bound cardinality.
+    """
+
+    def handle(self, request):
+        started = time.perf_counter()
+        tally = _QueryTally()
+        with connection.execute_wrapper(tally):
+            response = self.get_response(request)
+        return self._record(request, response, started, tally)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        tally = _QueryTally()
+        async with _on_request_thread(lambda: connection.execute_wrapper(tally)):
+            response = await self.get_response(request)
+        return self._record(request, response, started, tally)
+
+    def _record(self, request, response, started, tally):
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - started, method=request.method, route=route, status=response.status_code)
+        DB_QUERIES.inc(tally.count, route=route)
+        DB_QUERY_SECONDS.inc(tally.duration, route=route)
+        return response
+
+
+class QueryCountMiddleware(_HybridMiddleware):
+    """
+    Opt-in (QUERY_INSPECTOR_ENABLED) per-request SQL accounting: query count and DB time
+    go out in a `Server-Timing` header, and every request gets one JSON log line on the
+    `Dashboard.queries` logger. Repeated query shapes (likely N+1 loops) raise the line
+    to WARNING and are quoted in it. When disabled, Django drops the middleware at startup.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSPECTOR_ENABLED', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        started = time.perf_counter()
+        with QueryInspector() as queries:
+            response = self.get_response(request)
+        return self._report(request, response, started, queries)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        async with _on_request_thread(QueryInspector) as queries:
+            response = await self.get_response(request)
+        return self._report(request, response, started, queries)
+
+    def _report(self, request, response, started, queries):
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = queries.duration * 1000
+
+        timing = f'db;dur={db_ms:.1f};desc="{queries.count} queries", app;dur={total_ms:.1f}'
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+
+        repeated = queries.repeated()
+        record = {
+            'event': 'request_queries',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': queries.count,
+            'db_ms': round(db_ms, 1),
+            'total_ms': round(total_ms, 1),
+            'repeated': [{'sql': shape[:LOGGED_SHAPE_LENGTH], 'count': times} for shape, times in repeated],
+        }
+        logger.log(logging.WARNING if repeated else logging.INFO, json.dumps(record))
+        return response
+
+
+class ProfilingMiddleware(_HybridMiddleware):
+    """
+    Profiles a single request on demand: `X-Profile: cprofile|sample` header, or the
+    `?_profile=cprofile|sample` query flag (`1` means cprofile). Only staff sessions and
+    requests carrying `X-Profile-Token: <PROFILING_TOKEN>` are profiled; the flag is
+    ignored for everyone else. The saved file (see RequestProfile.save) is named in the
+    `X-Profile-File` response header. Unflagged requests cost two dict lookups.
+
+    Both profilers follow the thread they start on: under WSGI the whole request, under
+    ASGI the event loop, so code an async view runs through sync_to_async (the ORM
+    included) is not seen there.
+    """
+
+    def _requested_mode(self, request):
+        mode = request.headers.get('X-Profile') or request.GET.get('_profile')
+        if not mode:
+            return None
+        mode = mode.lower()
+        if mode in ('1', 'true'):
+            return 'cprofile'
+        return mode if mode in PROFILE_MODES else None
+
+    def _authorized(self, request):
+        token = getattr(settings, 'PROFILING_TOKEN', None)
+        supplied = request.headers.get('X-Profile-Token')
+        if token and supplied and hmac.compare_digest(token.encode(), supplied.encode()):
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_staff)
+
+    def handle(self, request):
+        mode = self._requested_mode(request)
+        if mode is None or not self._authorized(request):
+            return self.get_response(request)
+
+        with RequestProfile(mode) as profile:
+            response = self.get_response(request)
+        response['X-Profile-File'] = profile.save(f'{request.method} {request.path}')
+        return response
+
+    async def __acall__(self, request):
+        mode = self._requested_mode(request)
+        if mode is None or not await sync_to_async(self._authorized)(request):
+            return await self.get_response(request)
+
+        with RequestProfile(mode) as profile:
+            response = await self.get_response(request)
+        response['X-Profile-File'] = await sync_to_async(profile.save)(f'{request.method} {request.path}')
+        return response
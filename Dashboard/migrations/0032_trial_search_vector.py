@@ -0,0 +1,55 @@
+# Generated by Django 4.2.10 on 2026-10-18 23:06
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Weights: A = id/title, B = conditions/keywords, C = interventions/sponsor, D = summary.
+# to_tsvector(jsonb) only indexes the string values of the JSON documents.
+TRIAL_SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION dashboard_trial_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.nct_id, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.brief_title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.condition, '[]'::jsonb)), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.keyword, '[]'::jsonb)), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.intervention_name, '[]'::jsonb)), 'C') ||
+        setweight(to_tsvector('english', coalesce(NEW.lead_sponsor_name, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(NEW.brief_description, '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER dashboard_trial_search_vector
+    BEFORE INSERT OR UPDATE ON "Dashboard_trial"
+    FOR EACH ROW EXECUTE FUNCTION dashboard_trial_search_vector_update();
+
+-- Backfill existing rows through the trigger
+UPDATE "Dashboard_trial" SET search_vector = NULL;
+"""
+
+DROP_TRIAL_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS dashboard_trial_search_vector ON "Dashboard_trial";
+DROP FUNCTION IF EXISTS dashboard_trial_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0031_add_genestructure'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trial',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='trial',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='trial_search_vector_gin'),
+        ),
+        migrations.RunSQL(TRIAL_SEARCH_VECTOR_TRIGGER, DROP_TRIAL_SEARCH_VECTOR_TRIGGER),
+    ]
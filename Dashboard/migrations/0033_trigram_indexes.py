@@ -0,0 +1,32 @@
+# Generated by Django 4.2.10 on 2026-10-18 23:08
+
+from django.contrib.postgres.operations import TrigramExtension
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0032_trial_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='healeytrial',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['facility'], name='healey_facility_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='newsarticle',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='news_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='trial',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['brief_title'], name='trial_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='trial',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['lead_sponsor_name'], name='trial_sponsor_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.10 on 2026-10-18 23:16
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+# Non-array JSON values (legacy strings, null) yield empty arrays
+TRIAL_FILTER_ARRAYS_TRIGGER = """
+CREATE OR REPLACE FUNCTION dashboard_trial_filter_arrays_update() RETURNS trigger AS $$
+BEGIN
+    NEW.gene_symbols := ARRAY(
+        SELECT DISTINCT lower(btrim(g))
+        FROM jsonb_array_elements_text(
+            CASE WHEN jsonb_typeof(NEW.genes) = 'array' THEN NEW.genes ELSE '[]'::jsonb END
+        ) AS g
+        WHERE btrim(g) <> ''
+    );
+    NEW.location_countries := ARRAY(
+        SELECT DISTINCT lower(btrim(coalesce(loc->>'country', loc->>'LocationCountry')))
+        FROM jsonb_array_elements(
+            CASE WHEN jsonb_typeof(NEW.study_location) = 'array' THEN NEW.study_location ELSE '[]'::jsonb END
+        ) AS loc
+        WHERE jsonb_typeof(loc) = 'object'
+          AND btrim(coalesce(loc->>'country', loc->>'LocationCountry', '')) <> ''
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER dashboard_trial_filter_arrays
+    BEFORE INSERT OR UPDATE ON "Dashboard_trial"
+    FOR EACH ROW EXECUTE FUNCTION dashboard_trial_filter_arrays_update();
+
+-- Backfill existing rows through the trigger
+UPDATE "Dashboard_trial" SET gene_symbols = NULL;
+"""
+
+DROP_TRIAL_FILTER_ARRAYS_TRIGGER = """
+DROP TRIGGER IF EXISTS dashboard_trial_filter_arrays ON "Dashboard_trial";
+DROP FUNCTION IF EXISTS dashboard_trial_filter_arrays_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0033_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trial',
+            name='gene_symbols',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), editable=False, null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='trial',
+            name='location_countries',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), editable=False, null=True, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='trial',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['gene_symbols'], name='trial_gene_symbols_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='trial',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['location_countries'], name='trial_countries_gin'),
+        ),
+        migrations.RunSQL(TRIAL_FILTER_ARRAYS_TRIGGER, DROP_TRIAL_FILTER_ARRAYS_TRIGGER),
+    ]
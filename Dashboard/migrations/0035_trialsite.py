@@ -0,0 +1,75 @@
+# Generated by Django 4.2.10 on 2026-10-18 23:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+import json
+
+
+def _coordinate(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def backfill_trial_sites(apps, schema_editor):
+    # Frozen copy of utils.extract_study_sites; later syncs go through update_data
+    Trial = apps.get_model('Dashboard', 'Trial')
+    TrialSite = apps.get_model('Dashboard', 'TrialSite')
+    sites = []
+    for trial_id, locations in Trial.objects.values_list('unique_protocol_id', 'study_location').iterator():
+        if isinstance(locations, str):
+            try:
+                locations = json.loads(locations)
+            except ValueError:
+                continue
+        if not isinstance(locations, list):
+            continue
+        for loc in locations:
+            if not isinstance(loc, dict):
+                continue
+            geo = loc.get('geoPoint') if isinstance(loc.get('geoPoint'), dict) else {}
+            latitude, longitude = _coordinate(geo.get('lat')), _coordinate(geo.get('lon'))
+            if latitude is None or longitude is None:
+                latitude = longitude = None
+            sites.append(TrialSite(
+                trial_id=trial_id,
+                facility=(loc.get('facility') or '').strip(),
+                city=(loc.get('city') or '').strip(),
+                state=(loc.get('state') or '').strip(),
+                country=(loc.get('country') or loc.get('LocationCountry') or '').strip(),
+                zip_code=(loc.get('zip') or '').strip(),
+                latitude=latitude,
+                longitude=longitude,
+                status=(loc.get('status') or '').strip(),
+            ))
+    TrialSite.objects.bulk_create(sites, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0034_trial_filter_arrays'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrialSite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facility', models.TextField(blank=True, default='')),
+                ('city', models.CharField(blank=True, default='', max_length=255)),
+                ('state', models.CharField(blank=True, default='', max_length=255)),
+                ('country', models.CharField(blank=True, default='', max_length=255)),
+                ('zip_code', models.CharField(blank=True, default='', max_length=50)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('status', models.CharField(blank=True, default='', max_length=255)),
+                ('trial', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sites', to='Dashboard.trial')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['country'], name='trialsite_country_idx'), models.Index(fields=['latitude', 'longitude'], name='trialsite_coordinates_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_trial_sites, migrations.RunPython.noop),
+    ]
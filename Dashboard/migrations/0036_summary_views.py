@@ -0,0 +1,115 @@
+# Generated by Django 4.2.10 on 2026-10-18 23:20
+
+from django.db import migrations, models
+
+# One row of derived filter/aggregate dimensions per trial. Mirrors TrialIndex:
+# familial = linked genes or a non-empty `genes` JSON; sponsor categories follow
+# trial_index.categorize_sponsor (first matching keyword list wins).
+SUMMARY_VIEWS = """
+CREATE VIEW dashboard_trial_facts AS
+SELECT
+    t.unique_protocol_id AS trial_id,
+    coalesce(t.overall_status, '') AS overall_status,
+    coalesce(t.study_phase, '') AS study_phase,
+    (
+        EXISTS (SELECT 1 FROM "Dashboard_trial_related_genes" rg WHERE rg.trial_id = t.unique_protocol_id)
+        OR (t.genes IS NOT NULL AND t.genes <> '[]'::jsonb)
+    ) AS familial,
+    coalesce(upper(t.study_type) = 'INTERVENTIONAL', false) AS interventional,
+    CASE
+        WHEN lower(coalesce(t.lead_sponsor_name, '')) LIKE ANY (ARRAY[
+            '%nih%', '%national institutes%', '%national institute%', '%federal%', '%government%', '%va %', '%veterans%'
+        ]) THEN 'NIH/Federal'
+        WHEN lower(coalesce(t.lead_sponsor_name, '')) LIKE ANY (ARRAY[
+            '%pharma%', '%therapeutics%', '%inc%', '%corp%', '%ltd%', '%llc%', '%biogen%', '%novartis%',
+            '%roche%', '%pfizer%', '%sanofi%', '%lilly%', '%gsk%', '%astrazeneca%'
+        ]) THEN 'Industry'
+        WHEN lower(coalesce(t.lead_sponsor_name, '')) LIKE ANY (ARRAY[
+            '%university%', '%college%', '%hospital%', '%medical center%', '%school of medicine%', '%institute%', '%foundation%'
+        ]) THEN 'Academic'
+        ELSE 'Other'
+    END AS sponsor_category,
+    coalesce(extract(year FROM t.study_start_date)::integer, 0) AS start_year,
+    t.enrollment_count
+FROM "Dashboard_trial" t;
+
+CREATE MATERIALIZED VIEW dashboard_trial_summary AS
+SELECT
+    row_number() OVER () AS id,
+    overall_status, study_phase, familial, interventional, sponsor_category, start_year,
+    count(*)::integer AS trials,
+    coalesce(sum(enrollment_count), 0)::bigint AS enrollment
+FROM dashboard_trial_facts
+GROUP BY overall_status, study_phase, familial, interventional, sponsor_category, start_year;
+
+-- REFRESH ... CONCURRENTLY needs a unique index covering every row
+CREATE UNIQUE INDEX dashboard_trial_summary_key ON dashboard_trial_summary
+    (overall_status, study_phase, familial, interventional, sponsor_category, start_year);
+
+CREATE MATERIALIZED VIEW dashboard_country_summary AS
+SELECT
+    row_number() OVER () AS id,
+    f.overall_status, f.study_phase, f.familial, c.country, f.start_year,
+    count(*)::integer AS trials
+FROM (
+    SELECT DISTINCT s.trial_id, initcap(btrim(s.country)) AS country
+    FROM "Dashboard_trialsite" s
+    WHERE btrim(s.country) <> ''
+) c
+JOIN dashboard_trial_facts f ON f.trial_id = c.trial_id
+GROUP BY f.overall_status, f.study_phase, f.familial, c.country, f.start_year;
+
+CREATE UNIQUE INDEX dashboard_country_summary_key ON dashboard_country_summary
+    (overall_status, study_phase, familial, country, start_year);
+"""
+
+DROP_SUMMARY_VIEWS = """
+DROP MATERIALIZED VIEW IF EXISTS dashboard_country_summary;
+DROP MATERIALIZED VIEW IF EXISTS dashboard_trial_summary;
+DROP VIEW IF EXISTS dashboard_trial_facts;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0035_trialsite'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountrySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('overall_status', models.CharField(max_length=255)),
+                ('study_phase', models.CharField(max_length=50)),
+                ('familial', models.BooleanField()),
+                ('country', models.CharField(max_length=255)),
+                ('start_year', models.IntegerField()),
+                ('trials', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'dashboard_country_summary',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TrialSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('overall_status', models.CharField(max_length=255)),
+                ('study_phase', models.CharField(max_length=50)),
+                ('familial', models.BooleanField()),
+                ('interventional', models.BooleanField()),
+                ('sponsor_category', models.CharField(max_length=50)),
+                ('start_year', models.IntegerField()),
+                ('trials', models.IntegerField()),
+                ('enrollment', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'dashboard_trial_summary',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(SUMMARY_VIEWS, DROP_SUMMARY_VIEWS),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.10 on 2026-10-18 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0036_summary_views'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newsarticle',
+            index=models.Index(fields=['publication_date', 'id'], name='news_published_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trial',
+            index=models.Index(fields=['-status_verified_date', '-study_start_date', 'unique_protocol_id'], name='trial_default_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trial',
+            index=models.Index(fields=['status_verified_date', 'unique_protocol_id'], name='trial_verified_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.10 on 2026-10-19 10:12
+
+from django.db import migrations
+
+# Same function as 0034, with gene values cleaned like the serialized trials ("FUS Mutation" -> "fus")
+TRIAL_FILTER_ARRAYS_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION dashboard_trial_filter_arrays_update() RETURNS trigger AS $$
+BEGIN
+    NEW.gene_symbols := ARRAY(
+        SELECT DISTINCT gene
+        FROM (
+            SELECT lower(btrim({gene})) AS gene
+            FROM jsonb_array_elements_text(
+                CASE WHEN jsonb_typeof(NEW.genes) = 'array' THEN NEW.genes ELSE '[]'::jsonb END
+            ) AS g
+        ) AS genes
+        WHERE gene <> ''
+    );
+    NEW.location_countries := ARRAY(
+        SELECT DISTINCT lower(btrim(coalesce(loc->>'country', loc->>'LocationCountry')))
+        FROM jsonb_array_elements(
+            CASE WHEN jsonb_typeof(NEW.study_location) = 'array' THEN NEW.study_location ELSE '[]'::jsonb END
+        ) AS loc
+        WHERE jsonb_typeof(loc) = 'object'
+          AND btrim(coalesce(loc->>'country', loc->>'LocationCountry', '')) <> ''
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+-- Backfill existing rows through the trigger
+UPDATE "Dashboard_trial" SET gene_symbols = NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0037_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            TRIAL_FILTER_ARRAYS_FUNCTION.format(gene=r"regexp_replace(g, '\s*mutation\s*', '', 'gi')"),
+            TRIAL_FILTER_ARRAYS_FUNCTION.format(gene='g'),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.10 on 2026-10-19 11:05
+
+from django.db import migrations
+
+# Same function as 0038, with the symbols of related_genes (cleaned the same way) added,
+# so trials linked to a gene only through the M2M relation match the gene filter too
+TRIAL_FILTER_ARRAYS_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION dashboard_trial_filter_arrays_update() RETURNS trigger AS $$
+BEGIN
+    NEW.gene_symbols := ARRAY(
+        SELECT DISTINCT gene
+        FROM (
+            SELECT lower(btrim(regexp_replace(g, '\s*mutation\s*', '', 'gi'))) AS gene
+            FROM jsonb_array_elements_text(
+                CASE WHEN jsonb_typeof(NEW.genes) = 'array' THEN NEW.genes ELSE '[]'::jsonb END
+            ) AS g
+            {related_genes}
+        ) AS genes
+        WHERE gene <> ''
+    );
+    NEW.location_countries := ARRAY(
+        SELECT DISTINCT lower(btrim(coalesce(loc->>'country', loc->>'LocationCountry')))
+        FROM jsonb_array_elements(
+            CASE WHEN jsonb_typeof(NEW.study_location) = 'array' THEN NEW.study_location ELSE '[]'::jsonb END
+        ) AS loc
+        WHERE jsonb_typeof(loc) = 'object'
+          AND btrim(coalesce(loc->>'country', loc->>'LocationCountry', '')) <> ''
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+RELATED_GENES_SELECT = r"""
+            UNION ALL
+            SELECT lower(btrim(regexp_replace(gene.gene_symbol, '\s*mutation\s*', '', 'gi')))
+            FROM "Dashboard_trial_related_genes" AS link
+            JOIN "Dashboard_gene" AS gene ON gene.id = link.gene_id
+            WHERE link.trial_id = NEW.unique_protocol_id
+"""
+
+# Links added or removed (related_genes.set(), bulk inserts, gene deletes) and renamed genes
+# recompute the affected trials through the trial trigger, once per statement
+GENE_LINK_TRIGGERS = """
+CREATE OR REPLACE FUNCTION dashboard_trial_gene_links_update() RETURNS trigger AS $$
+BEGIN
+    UPDATE "Dashboard_trial" SET gene_symbols = NULL
+    WHERE unique_protocol_id IN (SELECT trial_id FROM changed_links);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER dashboard_trial_gene_links_insert
+    AFTER INSERT ON "Dashboard_trial_related_genes"
+    REFERENCING NEW TABLE AS changed_links
+    FOR EACH STATEMENT EXECUTE FUNCTION dashboard_trial_gene_links_update();
+
+CREATE TRIGGER dashboard_trial_gene_links_delete
+    AFTER DELETE ON "Dashboard_trial_related_genes"
+    REFERENCING OLD TABLE AS changed_links
+    FOR EACH STATEMENT EXECUTE FUNCTION dashboard_trial_gene_links_update();
+
+CREATE OR REPLACE FUNCTION dashboard_gene_symbol_update() RETURNS trigger AS $$
+BEGIN
+    UPDATE "Dashboard_trial" SET gene_symbols = NULL
+    WHERE unique_protocol_id IN (
+        SELECT link.trial_id
+        FROM "Dashboard_trial_related_genes" AS link
+        JOIN new_genes ON new_genes.id = link.gene_id
+        JOIN old_genes ON old_genes.id = new_genes.id
+        WHERE new_genes.gene_symbol IS DISTINCT FROM old_genes.gene_symbol
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER dashboard_gene_symbol
+    AFTER UPDATE ON "Dashboard_gene"
+    REFERENCING OLD TABLE AS old_genes NEW TABLE AS new_genes
+    FOR EACH STATEMENT EXECUTE FUNCTION dashboard_gene_symbol_update();
+"""
+
+DROP_GENE_LINK_TRIGGERS = """
+DROP TRIGGER IF EXISTS dashboard_gene_symbol ON "Dashboard_gene";
+DROP FUNCTION IF EXISTS dashboard_gene_symbol_update();
+DROP TRIGGER IF EXISTS dashboard_trial_gene_links_insert ON "Dashboard_trial_related_genes";
+DROP TRIGGER IF EXISTS dashboard_trial_gene_links_delete ON "Dashboard_trial_related_genes";
+DROP FUNCTION IF EXISTS dashboard_trial_gene_links_update();
+"""
+
+# Backfill existing rows through the trigger
+BACKFILL = 'UPDATE "Dashboard_trial" SET gene_symbols = NULL;'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dashboard', '0038_gene_symbols_strip_mutation'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            TRIAL_FILTER_ARRAYS_FUNCTION.format(related_genes=RELATED_GENES_SELECT) + GENE_LINK_TRIGGERS + BACKFILL,
+            DROP_GENE_LINK_TRIGGERS + TRIAL_FILTER_ARRAYS_FUNCTION.format(related_genes='') + BACKFILL,
+        ),
+    ]
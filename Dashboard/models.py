@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 # Table Update Log Update
 class Update_Log(models.Model):
@@ -86,6 +89,27 @@ class Trial(models.Model):
     eligibility_criteria_sex = models.CharField(max_length=255, null=True, blank=True)
     eligibility_criteria_min_age_years = models.CharField(max_length=255, null=True, blank=True)
     eligibility_criteria_max_age_years = models.CharField(max_length=255, null=True, blank=True)
+    # Weighted full-text document (title, conditions, keywords, interventions, sponsor, summary).
+    # Maintained by a database trigger on every insert/update, see migration 0032.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Lower-cased gene symbols (from `genes` and related_genes) and site countries (from
+    # `study_location`), maintained by database triggers for exact, indexed filtering with @>
+    # (see migrations 0034 and 0039)
+    gene_symbols = ArrayField(models.TextField(), null=True, editable=False)
+    location_countries = ArrayField(models.TextField(), null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='trial_search_vector_gin'),
+            GinIndex(fields=['gene_symbols'], name='trial_gene_symbols_gin'),
+            GinIndex(fields=['location_countries'], name='trial_countries_gin'),
+            # Trigram indexes for typo-tolerant (pg_trgm) lookups
+            GinIndex(fields=['brief_title'], name='trial_title_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['lead_sponsor_name'], name='trial_sponsor_trgm', opclasses=['gin_trgm_ops']),
+            # Keyset pagination: the default Trial Finder order, and the lastUpdated sort
+            models.Index(fields=['-status_verified_date', '-study_start_date', 'unique_protocol_id'], name='trial_default_order_idx'),
+            models.Index(fields=['status_verified_date', 'unique_protocol_id'], name='trial_verified_keyset_idx'),
+        ]
 
     def __str__(self):
         return self.brief_title
@@ -97,6 +121,56 @@ class Intervention(models.Model):
     intervention_type = models.CharField(max_length=255)
     intervention_description = models.TextField()
 
+# Study sites, flattened from Trial.study_location at sync time
+class TrialSite(models.Model):
+    trial = models.ForeignKey(Trial, related_name='sites', on_delete=models.CASCADE)
+    facility = models.TextField(blank=True, default='')
+    city = models.CharField(max_length=255, blank=True, default='')
+    state = models.CharField(max_length=255, blank=True, default='')
+    country = models.CharField(max_length=255, blank=True, default='')
+    zip_code = models.CharField(max_length=50, blank=True, default='')
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=255, blank=True, default='') # Site recruitment status, e.g. RECRUITING
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['country'], name='trialsite_country_idx'),
+            models.Index(fields=['latitude', 'longitude'], name='trialsite_coordinates_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.facility}, {self.city}, {self.country}"
+
+# Pre-aggregated trial counts, backed by materialized views refreshed after each sync (see migration 0036).
+# Keyed by the dashboard filter dimensions; overall_status is raw, so every status group can be expanded over it.
+class TrialSummary(models.Model):
+    overall_status = models.CharField(max_length=255)
+    study_phase = models.CharField(max_length=50)
+    familial = models.BooleanField()
+    interventional = models.BooleanField()
+    sponsor_category = models.CharField(max_length=50)
+    start_year = models.IntegerField() # 0 when the start date is unknown
+    trials = models.IntegerField()
+    enrollment = models.BigIntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'dashboard_trial_summary'
+
+# Trials per site country (each trial counted once per country), same filter dimensions as TrialSummary
+class CountrySummary(models.Model):
+    overall_status = models.CharField(max_length=255)
+    study_phase = models.CharField(max_length=50)
+    familial = models.BooleanField()
+    country = models.CharField(max_length=255) # Title Case
+    start_year = models.IntegerField()
+    trials = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'dashboard_country_summary'
+
 # Model for Healey Platform Trial; to be merged into singular Trial model at later date
 class HealeyTrial(models.Model):
     facility = models.CharField(max_length=255)
@@ -107,6 +181,11 @@ class HealeyTrial(models.Model):
     def __str__(self):
         return f"{self.facility}, {self.state}, {self.country}"
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['facility'], name='healey_facility_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
 # User Contact/Feedback Submissions
 class ContactSubmission(models.Model):
     name = models.CharField(max_length=255)
@@ -149,6 +228,11 @@ class NewsArticle(models.Model):
 
     class Meta:
         ordering = ['-publication_date']
+        indexes = [
+            GinIndex(fields=['title'], name='news_title_trgm', opclasses=['gin_trgm_ops']),
+            # Keyset pagination of the news feed
+            models.Index(fields=['publication_date', 'id'], name='news_published_keyset_idx'),
+        ]
 
 
 # 3D Structure data for genes
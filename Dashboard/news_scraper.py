@@ -4,6 +4,8 @@ from urllib.parse import quote
 from datetime import datetime, timedelta
 from django.utils.timezone import make_aware
 from .models import NewsArticle, Gene
+from .http_client import get_client
+from .metrics import record_sync_error, sync_stage
 import logging
 from fuzzywuzzy import fuzz
 
@@ -26,6 +28,12 @@ RSS_FEEDS = [
     "https://news.google.com/rss/search?q=Lou+Gehrig%27s+Disease&hl=en-US&gl=US&ceid=US:en"
 ]
 
+def fetch_feed(feed_url):
+    """Downloads a feed through the shared HTTP client (so it can be recorded and replayed) and parses it."""
+    response = get_client().get(feed_url, headers={'User-Agent': feedparser.USER_AGENT})
+    response.raise_for_status()
+    return feedparser.parse(response.content, response_headers=dict(response.headers))
+
 def normalize_title(title):
     """
     Normalizes a title by lowercasing, removing punctuation, 
@@ -138,114 +146,125 @@ def fetch_and_process_news():
     recent_articles = NewsArticle.objects.filter(publication_date__gte=recent_cutoff)
     db_recent_titles = {normalize_title(a.title) for a in recent_articles if a.title}
 
-    for feed_url in all_feeds:
-        try:
-            feed = feedparser.parse(feed_url)
-            priority = get_source_priority(feed_url)
+    with sync_stage('news', 'fetch') as stage:
+        for feed_url in all_feeds:
+            try:
+                feed = fetch_feed(feed_url)
+                priority = get_source_priority(feed_url)
+                # One lookup per feed rather than one per entry
+                known_urls = set(
+                    NewsArticle.objects.filter(url__in=[entry.get('link', '') for entry in feed.entries])
+                    .values_list('url', flat=True)
+                )
             
-            for entry in feed.entries:
-                title = entry.get('title', '')
-                link = entry.get('link', '')
+                for entry in feed.entries:
+                    title = entry.get('title', '')
+                    link = entry.get('link', '')
                 
-                if NewsArticle.objects.filter(url=link).exists():
-                    continue
+                    if link in known_urls:
+                        continue
                 
-                norm_title = normalize_title(title)
-                if not norm_title:
-                    continue
+                    norm_title = normalize_title(title)
+                    if not norm_title:
+                        continue
 
-                # Fuzzy Check against DB
-                if is_fuzzy_duplicate(norm_title, db_recent_titles):
-                    continue
+                    # Fuzzy Check against DB
+                    if is_fuzzy_duplicate(norm_title, db_recent_titles):
+                        continue
                 
-                # Fuzzy Check against Buffer
-                match_in_buffer = is_fuzzy_duplicate(norm_title, article_buffer.keys())
+                    # Fuzzy Check against Buffer
+                    match_in_buffer = is_fuzzy_duplicate(norm_title, article_buffer.keys())
                 
-                if match_in_buffer:
-                    existing_key = match_in_buffer
-                    existing = article_buffer[existing_key]
+                    if match_in_buffer:
+                        existing_key = match_in_buffer
+                        existing = article_buffer[existing_key]
                     
-                    published_parsed = entry.get('published_parsed') or entry.get('updated_parsed')
-                    pub_date = make_aware(datetime(*published_parsed[:6])) if published_parsed else make_aware(datetime(2000, 1, 1))
+                        published_parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+                        pub_date = make_aware(datetime(*published_parsed[:6])) if published_parsed else make_aware(datetime(2000, 1, 1))
 
-                    time_diff_seconds = (existing['data']['publication_date'] - pub_date).total_seconds()
+                        time_diff_seconds = (existing['data']['publication_date'] - pub_date).total_seconds()
                     
-                    replace = False
-                    if time_diff_seconds > 14400: # New one is > 4 hours older
-                        replace = True
-                    elif time_diff_seconds < -14400: # Existing one is > 4 hours older
                         replace = False
-                    else:
-                        if priority < existing['priority']:
+                        if time_diff_seconds > 14400: # New one is > 4 hours older
                             replace = True
-                        elif priority > existing['priority']:
+                        elif time_diff_seconds < -14400: # Existing one is > 4 hours older
                             replace = False
                         else:
-                            replace = pub_date < existing['data']['publication_date']
+                            if priority < existing['priority']:
+                                replace = True
+                            elif priority > existing['priority']:
+                                replace = False
+                            else:
+                                replace = pub_date < existing['data']['publication_date']
                     
-                    if not replace:
-                        continue
-                    else:
-                        if existing_key != norm_title:
-                            del article_buffer[existing_key]
+                        if not replace:
+                            continue
+                        else:
+                            if existing_key != norm_title:
+                                del article_buffer[existing_key]
                 
-                # Process and Buffer
-                summary = entry.get('summary', '') or entry.get('description', '')
-                full_text = (title + " " + summary).upper()
+                    # Process and Buffer
+                    summary = entry.get('summary', '') or entry.get('description', '')
+                    full_text = (title + " " + summary).upper()
                 
-                matched_keywords = []
-                for keyword in all_keywords:
-                    if re.search(r'\b' + re.escape(keyword) + r'\b', full_text):
-                        matched_keywords.append(keyword)
+                    matched_keywords = []
+                    for keyword in all_keywords:
+                        if re.search(r'\b' + re.escape(keyword) + r'\b', full_text):
+                            matched_keywords.append(keyword)
                 
-                if matched_keywords:
-                    published_parsed = entry.get('published_parsed') or entry.get('updated_parsed')
-                    pub_date = make_aware(datetime(*published_parsed[:6])) if published_parsed else make_aware(datetime(2000, 1, 1))
-
-                    article_buffer[norm_title] = {
-                        'priority': priority,
-                        'feed_title': feed.feed.get('title', 'Unknown Source'),
-                        'data': {
-                            'title': title,
-                            'summary': summary,
-                            'url': link,
-                            'publication_date': pub_date,
-                            'matched_keywords': matched_keywords,
-                            'image_url': None
+                    if matched_keywords:
+                        published_parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+                        pub_date = make_aware(datetime(*published_parsed[:6])) if published_parsed else make_aware(datetime(2000, 1, 1))
+
+                        article_buffer[norm_title] = {
+                            'priority': priority,
+                            'feed_title': feed.feed.get('title', 'Unknown Source'),
+                            'data': {
+                                'title': title,
+                                'summary': summary,
+                                'url': link,
+                                'publication_date': pub_date,
+                                'matched_keywords': matched_keywords,
+                                'image_url': None
+                            }
                         }
-                    }
                     
-                    if 'media_content' in entry:
-                        article_buffer[norm_title]['data']['image_url'] = entry.media_content[0]['url']
-                    elif 'links' in entry:
-                        for l in entry.links:
-                            if l.get('type', '').startswith('image/'):
-                                article_buffer[norm_title]['data']['image_url'] = l['href']
-                                break
-        except Exception as e:
-            logger.error(f"Failed to process feed {feed_url}: {e}")
+                        if 'media_content' in entry:
+                            article_buffer[norm_title]['data']['image_url'] = entry.media_content[0]['url']
+                        elif 'links' in entry:
+                            for l in entry.links:
+                                if l.get('type', '').startswith('image/'):
+                                    article_buffer[norm_title]['data']['image_url'] = l['href']
+                                    break
+            except Exception as e:
+                logger.error(f"Failed to process feed {feed_url}: {e}")
+                record_sync_error('news', 'fetch')
+        stage.rows = len(article_buffer)
 
     # 3. Save to DB
-    new_articles_count = 0
-    for norm_title, item in article_buffer.items():
-        data = item['data']
-        try:
-            article = NewsArticle.objects.create(
-                title=data['title'],
-                summary=data['summary'],
-                content=data['summary'],
-                source_name=item['feed_title'],
-                url=data['url'],
-                image_url=data['image_url'],
-                publication_date=data['publication_date'],
-                tags=data['matched_keywords'][:5]
-            )
-            related_genes = [keyword_to_gene[k] for k in data['matched_keywords'] if k in keyword_to_gene]
-            if related_genes:
-                article.related_genes.set(related_genes)
-            new_articles_count += 1
-        except Exception as e:
-            logger.error(f"Error saving article {data['title']}: {e}")
+    with sync_stage('news', 'save') as stage:
+        new_articles_count = 0
+        for norm_title, item in article_buffer.items():
+            data = item['data']
+            try:
+                article = NewsArticle.objects.create(
+                    title=data['title'],
+                    summary=data['summary'],
+                    content=data['summary'],
+                    source_name=item['feed_title'],
+                    url=data['url'],
+                    image_url=data['image_url'],
+                    publication_date=data['publication_date'],
+                    tags=data['matched_keywords'][:5]
+                )
+                related_genes = [keyword_to_gene[k] for k in data['matched_keywords'] if k in keyword_to_gene]
+                if related_genes:
+                    article.related_genes.set(related_genes)
+                new_articles_count += 1
+            except Exception as e:
+                logger.error(f"Error saving article {data['title']}: {e}")
+                record_sync_error('news', 'save')
+        stage.rows = new_articles_count
 
     logger.info(f"News scrape complete. Added {new_articles_count} new articles.")
     return new_articles_count
\ No newline at end of file
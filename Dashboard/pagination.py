@@ -0,0 +1,114 @@
+import base64
+import datetime
+import json
+
+from django.db.models import Q
+
+# `total` modes for paginated endpoints: exact COUNT(*), planner estimate, or none
+TOTAL_MODES = ('exact', 'estimate', 'none')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _ordering(queryset):
+    """[(field, descending)] of a queryset's explicit order_by, which must end with a unique field."""
+    return [(field.lstrip('-'), field.startswith('-')) for field in queryset.query.order_by]
+
+
+def _encode_value(value):
+    # Full precision: DjangoJSONEncoder would truncate datetimes to milliseconds
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(queryset, row):
+    """Opaque cursor pointing just after `row` in the queryset's ordering."""
+    payload = {
+        'o': list(queryset.query.order_by),
+        'v': [_encode_value(getattr(row, field)) for field, _ in _ordering(queryset)],
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(queryset, cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        ordering, values = payload['o'], payload['v']
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor('Malformed cursor')
+    # A cursor is only meaningful for the sort it was issued for
+    if ordering != list(queryset.query.order_by) or len(values) != len(ordering):
+        raise InvalidCursor('Cursor does not match the requested sort order')
+    return values
+
+
+def _after(ordering, values):
+    """
+    Q for rows sorting after `values` under `ordering`. Postgres sorts NULL above every
+    value (last ascending, first descending), so NULLs are compared the same way here.
+    """
+    (field, descending), value = ordering[0], values[0]
+    if value is None:
+        after = Q(**{f'{field}__isnull': False}) if descending else None
+        same = Q(**{f'{field}__isnull': True})
+    else:
+        after = Q(**{f'{field}__lt': value}) if descending else Q(**{f'{field}__gt': value}) | Q(**{f'{field}__isnull': True})
+        same = Q(**{field: value})
+
+    if len(ordering) == 1:
+        return after if after is not None else Q(pk__in=[])
+    rest = same & _after(ordering[1:], values[1:])
+    return rest if after is None else after | rest
+
+
+def paginate_keyset(queryset, cursor, per_page):
+    """
+    One page of an ordered queryset, starting after `cursor` (None for the first page).
+    Returns (rows, next_cursor); next_cursor is None on the last page, and an empty page
+    (per_page < 1) has no rows and no cursor. With an index on the sort keys, every page
+    costs the same as the first, and rows inserted or removed during a sync do not shift
+    the following pages.
+    """
+    if per_page < 1:
+        return [], None
+    if cursor:
+        queryset = queryset.filter(_after(_ordering(queryset), decode_cursor(queryset, cursor)))
+    rows = list(queryset[:per_page + 1])
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    return rows, encode_cursor(queryset, rows[-1])
+
+
+def paginate_offset(queryset, page, per_page):
+    """
+    Page-number pagination (OFFSET), returning (rows, next_cursor) like paginate_keyset
+    so a client can continue from any numbered page with cursors.
+    """
+    if per_page < 1:
+        return [], None
+    offset = (page - 1) * per_page
+    rows = list(queryset[offset:offset + per_page + 1])
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    return rows, encode_cursor(queryset, rows[-1])
+
+
+def estimated_count(queryset):
+    """Planner row estimate for a queryset (EXPLAIN, nothing is executed)."""
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_rows(queryset, total):
+    """COUNT for `total` = 'exact', a planner estimate for 'estimate', None for 'none'."""
+    if total == 'none':
+        return None
+    if total == 'estimate':
+        return estimated_count(queryset)
+    return queryset.count()
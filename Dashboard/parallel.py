@@ -0,0 +1,44 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on sections computed at once in this process (each holds its own DB connection)
+SECTION_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=SECTION_WORKERS, thread_name_prefix='sections')
+
+
+def _timed(build, own_connection):
+    if own_connection:
+        # Pool threads open their own connection; release it as a request would (honours CONN_MAX_AGE)
+        close_old_connections()
+    started = time.perf_counter()
+    try:
+        return build(), time.perf_counter() - started
+    finally:
+        if own_connection:
+            close_old_connections()
+
+
+def run_sections(sections, label='sections'):
+    """
+    Computes a {name: callable} dict of independent sections on the shared, bounded
+    thread pool and returns {name: result}, so the total time approaches the slowest
+    section rather than the sum. Per-section timings are logged.
+
+    Inside a transaction the sections run inline: other connections could not see its writes.
+    """
+    started = time.perf_counter()
+    if connection.in_atomic_block:
+        outcomes = {name: _timed(build, own_connection=False) for name, build in sections.items()}
+    else:
+        futures = {name: _executor.submit(_timed, build, True) for name, build in sections.items()}
+        outcomes = {name: future.result() for name, future in futures.items()}
+
+    timings = ', '.join(f'{name}={seconds * 1000:.1f}ms' for name, (_, seconds) in outcomes.items())
+    logger.info(f"Computed {label} in {(time.perf_counter() - started) * 1000:.1f}ms ({timings})")
+    return {name: result for name, (result, _) in outcomes.items()}
@@ -0,0 +1,103 @@
+import cProfile
+import datetime
+import os
+import re
+import sys
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+PROFILE_MODES = ('cprofile', 'sample')
+# Seconds between stack samples of the profiled thread
+SAMPLE_INTERVAL = 0.005
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a background thread.
+    Overhead does not grow with the number of calls, unlike cProfile. The result is the
+    collapsed-stack format ("outer;inner;leaf count" per line) read by flamegraph.pl,
+    speedscope and similar tools.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._sampler = None
+
+    def _frame_name(self, frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(self._frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def start(self):
+        self._sampler = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._sampler.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """Profiles the enclosed code with cProfile ('cprofile') or the SamplingProfiler ('sample')."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.profiler = cProfile.Profile() if mode == 'cprofile' else SamplingProfiler()
+
+    def __enter__(self):
+        if self.mode == 'cprofile':
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+
+    def save(self, label):
+        """
+        Writes the profile (pstats .prof, or collapsed stacks .folded) to PROFILING_DIR,
+        removing the oldest profiles beyond PROFILING_MAX_FILES. Returns the file name.
+        """
+        directory = settings.PROFILING_DIR
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', label).strip('-')[:80]
+        name = f"{stamp}-{slug}.{'prof' if self.mode == 'cprofile' else 'folded'}"
+        path = os.path.join(directory, name)
+        if self.mode == 'cprofile':
+            self.profiler.dump_stats(path)
+        else:
+            with open(path, 'w') as handle:
+                handle.write(self.profiler.collapsed())
+        rotate_profiles(directory, settings.PROFILING_MAX_FILES)
+        return name
+
+
+def rotate_profiles(directory, max_files):
+    profiles = sorted(name for name in os.listdir(directory) if name.endswith(('.prof', '.folded')))
+    for name in profiles[:max(len(profiles) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass  # Removed by another worker
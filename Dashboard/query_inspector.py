@@ -0,0 +1,61 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+
+# A query shape issued at least this many times in one unit of work is reported as a likely N+1
+REPEATED_QUERY_THRESHOLD = 5
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def query_shape(sql):
+    """SQL with its variable parts folded: parameter lists of any length compare equal."""
+    return _WHITESPACE.sub(' ', _IN_LIST.sub('(%s, ...)', sql)).strip()
+
+
+class QueryInspector:
+    """
+    Counts the queries (and DB time) issued on this thread's connections while active,
+    grouped by shape. Shapes repeated REPEATED_QUERY_THRESHOLD times or more are the
+    typical N+1 signature (one query per row of an outer loop)::
+
+        with QueryInspector() as queries:
+            build_something()
+        assert not queries.repeated()
+
+    Queries run on other threads (e.g. the parallel dashboard sections) are not seen.
+    """
+
+    def __init__(self, threshold=REPEATED_QUERY_THRESHOLD):
+        self.threshold = threshold
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._stack = None
+
+    def repeated(self):
+        """[(shape, times)] for the shapes issued at least `threshold` times, most frequent first."""
+        return [(shape, times) for shape, times in self.shapes.most_common() if times >= self.threshold]
@@ -0,0 +1,207 @@
+import datetime
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import duckdb
+import pandas as pd
+from django.conf import settings
+
+from .duckdb_engine import DuckDBEngine
+from .models import Trial, Gene, TrialSite, Intervention, NewsArticle
+
+logger = logging.getLogger(__name__)
+
+# Snapshot versions kept on disk; older ones are pruned after each snapshot
+REPLICA_KEEP_VERSIONS = 3
+# Schema the replica views live in (in the engine's in-memory database)
+REPLICA_SCHEMA = 'replica'
+# File naming the snapshot version queries currently read
+CURRENT_POINTER = 'CURRENT'
+
+# Table name in the replica -> Django model (M2M link tables included, for joins)
+REPLICA_TABLES = {
+    'trials': Trial,
+    'genes': Gene,
+    'trial_genes': Trial.related_genes.through,
+    'sites': TrialSite,
+    'interventions': Intervention,
+    'news': NewsArticle,
+    'news_genes': NewsArticle.related_genes.through,
+}
+
+# Columns left out of the replica (Postgres-only search state)
+EXCLUDED_FIELDS = {'search_vector'}
+
+DUCKDB_TYPES = {
+    'AutoField': 'BIGINT',
+    'BigAutoField': 'BIGINT',
+    'IntegerField': 'BIGINT',
+    'BigIntegerField': 'BIGINT',
+    'SmallIntegerField': 'BIGINT',
+    'PositiveIntegerField': 'BIGINT',
+    'FloatField': 'DOUBLE',
+    'DecimalField': 'DOUBLE',
+    'BooleanField': 'BOOLEAN',
+    'DateField': 'DATE',
+    'DateTimeField': 'TIMESTAMPTZ',
+    'JSONField': 'JSON',
+    'ArrayField': 'VARCHAR[]',
+}
+
+
+class ReplicaUnavailable(Exception):
+    """No snapshot has been taken yet (callers fall back to Postgres)."""
+
+
+class _ReplicaColumn:
+    def __init__(self, field):
+        target = field.target_field if field.is_relation else field
+        self.name = field.attname
+        self.type = DUCKDB_TYPES.get(target.get_internal_type(), 'VARCHAR')
+
+    def convert(self, value):
+        # JSON documents are stored as their text, like Postgres' jsonb::text; sorted keys
+        # make equal documents equal text
+        if self.type == 'JSON' and value is not None:
+            return json.dumps(value, sort_keys=True)
+        return value
+
+
+def _columns(model):
+    return [
+        _ReplicaColumn(field) for field in model._meta.concrete_fields
+        if field.name not in EXCLUDED_FIELDS
+    ]
+
+
+def replica_root():
+    return settings.ANALYTICS_REPLICA_DIR
+
+
+def current_version_dir():
+    """Directory of the snapshot queries should read, or None before the first snapshot."""
+    try:
+        with open(os.path.join(replica_root(), CURRENT_POINTER)) as pointer:
+            version = pointer.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(replica_root(), version)
+    return path if os.path.isdir(path) else None
+
+
+def _write_table(con, model, path):
+    columns = _columns(model)
+    names = [column.name for column in columns]
+    rows = model.objects.values_list(*names).order_by()
+    frame = pd.DataFrame(
+        [[column.convert(value) for column, value in zip(columns, row)] for row in rows.iterator(chunk_size=5000)],
+        columns=names,
+        dtype=object,
+    )
+    # Explicit casts: pandas cannot infer a type for all-NULL (or empty) columns
+    select = ', '.join(f'CAST("{column.name}" AS {column.type}) AS "{column.name}"' for column in columns)
+    con.register('replica_rows', frame)
+    try:
+        con.execute(f"COPY (SELECT {select} FROM replica_rows) TO '{path}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+    finally:
+        con.unregister('replica_rows')
+    return len(frame)
+
+
+def snapshot_replica():
+    """
+    Post-sync step: exports the trial, gene, site, intervention and news tables to a new
+    versioned directory of Parquet files, then points CURRENT at it. The version is
+    written under a temporary name and renamed, so readers never see a partial snapshot.
+    Returns the new version name.
+    """
+    started = time.perf_counter()
+    root = replica_root()
+    os.makedirs(root, exist_ok=True)
+    version = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    staging = os.path.join(root, f'.{version}.tmp')
+    os.makedirs(staging)
+
+    counts = {}
+    con = duckdb.connect(database=':memory:')
+    try:
+        for table, model in REPLICA_TABLES.items():
+            counts[table] = _write_table(con, model, os.path.join(staging, f'{table}.parquet'))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        con.close()
+
+    os.rename(staging, os.path.join(root, version))
+    pointer = os.path.join(root, f'.{CURRENT_POINTER}.tmp')
+    with open(pointer, 'w') as handle:
+        handle.write(version)
+    os.replace(pointer, os.path.join(root, CURRENT_POINTER))
+    _prune_versions(root, version)
+
+    summary = ', '.join(f'{table}={count}' for table, count in counts.items())
+    logger.info(f"Snapshot {version} of the analytics replica in {time.perf_counter() - started:.1f}s ({summary})")
+    return version
+
+
+def _prune_versions(root, current):
+    versions = sorted(
+        name for name in os.listdir(root)
+        if not name.startswith('.') and name != CURRENT_POINTER and os.path.isdir(os.path.join(root, name))
+    )
+    stale = [name for name in versions if name != current][:max(len(versions) - REPLICA_KEEP_VERSIONS, 0)]
+    for name in stale:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+# Version directory the engine's views currently read (reset whenever the engine reconnects)
+_views = {'path': None}
+_views_lock = threading.Lock()
+
+
+def _create_schema(con):
+    con.execute(f"CREATE SCHEMA IF NOT EXISTS {REPLICA_SCHEMA}")
+    _views['path'] = None
+    return f'memory.{REPLICA_SCHEMA}'
+
+
+replica_engine = DuckDBEngine(setup=_create_schema)
+
+
+def _point_views(cursor, path):
+    # One transaction: a concurrent query sees either every old view or every new one
+    cursor.execute("BEGIN TRANSACTION")
+    for table in REPLICA_TABLES:
+        parquet = os.path.join(path, f'{table}.parquet').replace("'", "''")
+        cursor.execute(f"CREATE OR REPLACE VIEW {REPLICA_SCHEMA}.{table} AS SELECT * FROM read_parquet('{parquet}')")
+    cursor.execute("COMMIT")
+
+
+@contextmanager
+def replica_cursor():
+    """
+    DuckDB cursor whose default schema holds one view per REPLICA_TABLES entry over the
+    current snapshot. A newer snapshot is picked up on the next query; queries never
+    touch Postgres. Raises ReplicaUnavailable before the first snapshot.
+    """
+    path = current_version_dir()
+    if path is None:
+        raise ReplicaUnavailable('No analytics replica snapshot has been taken yet')
+    with replica_engine.cursor() as cursor:
+        with _views_lock:
+            if _views['path'] != path:
+                _point_views(cursor, path)
+                _views['path'] = path
+        yield cursor
+
+
+def query_replica(sql, params=None):
+    """Runs a (parameterized) query against the replica and returns a DataFrame."""
+    with replica_cursor() as cursor:
+        return cursor.execute(sql, params).df()
@@ -0,0 +1,25 @@
+from .http_client import get_async_client
+
+ALPHAFOLD_PREDICTION_URL = "https://alphafold.ebi.ac.uk/api/prediction/{accession}"
+# After AlphaFold had no model (or failed), page views skip the lookup this long (seconds);
+# sync_gene_structures still retries every run
+ALPHAFOLD_MISS_TTL = 600
+ALPHAFOLD_MISS_CACHE_KEY = 'alphafold_miss:{accession}'
+
+
+async def resolve_alphafold_structure(structure):
+    """
+    Looks up the mmCIF URL of an AlphaFold structure (keyed by UniProt accession) and
+    stores it on the structure. Returns the URL, or None if AlphaFold has no model.
+    Raises httpx.HTTPError when the API cannot be reached or answers with an error.
+    """
+    response = await get_async_client().get(ALPHAFOLD_PREDICTION_URL.format(accession=structure.external_id))
+    response.raise_for_status()
+    models = response.json()
+    cif_url = models[0].get("cifUrl") if models else None
+    if cif_url:
+        structure.custom_data_url = cif_url
+        structure.custom_data_format = "cif"
+        await structure.asave(update_fields=["custom_data_url", "custom_data_format"])
+    return cif_url
+
@@ -0,0 +1,39 @@
+from django.db import connection
+from django.db.models import Sum
+
+from .trial_index import expand_status_filter
+
+# Materialized views behind TrialSummary and CountrySummary (migration 0036)
+SUMMARY_VIEWS = ['dashboard_trial_summary', 'dashboard_country_summary']
+
+
+def refresh_summary_views():
+    """
+    Recomputes the pre-aggregated summary views after a sync.
+    CONCURRENTLY keeps them readable while refreshing (diffs against a unique index).
+    """
+    with connection.cursor() as cursor:
+        for view in SUMMARY_VIEWS:
+            cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY {view}')
+
+
+def filter_summaries(queryset, status=None, phase=None, familial=False):
+    """apply_analytics_filters for the summary views (which have no gene dimension)."""
+    if status:
+        queryset = queryset.filter(overall_status__in=expand_status_filter(status))
+    if phase:
+        queryset = queryset.filter(study_phase__in=phase)
+    if familial:
+        queryset = queryset.filter(familial=True)
+    return queryset
+
+
+def summary_counts(queryset, field, status=None, phase=None, familial=False):
+    """[(value of `field`, number of trials)] for the filtered summary rows, ordered like _value_counts."""
+    rows = (
+        filter_summaries(queryset, status, phase, familial)
+        .values(field)
+        .annotate(count=Sum('trials'))
+        .order_by('-count', f'-{field}')
+    )
+    return [(row[field], int(row['count'])) for row in rows]
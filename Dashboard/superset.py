@@ -0,0 +1,235 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+import httpx
+from django.core.cache import cache
+
+from .http_client import get_async_client
+
+logger = logging.getLogger(__name__)
+
+# Superset API Configuration
+SUPERSET_URL = os.environ.get("SUPERSET_URL")
+ADMIN_USERNAME = os.environ.get("SUPERSET_ADMIN_USERNAME")
+ADMIN_PASSWORD = os.environ.get("SUPERSET_ADMIN_PASSWORD")
+
+# Access tokens are refreshed this long before they expire
+ACCESS_TOKEN_REFRESH_MARGIN = 60
+# Lifetimes assumed for tokens without a readable `exp` (Superset's defaults)
+DEFAULT_ACCESS_TOKEN_LIFETIME = 900
+DEFAULT_GUEST_TOKEN_LIFETIME = 300
+# How long the embedded dashboard's id is reused before listing dashboards again
+DASHBOARD_ID_TTL = 600
+# Share of a guest token's validity it is served from the cache (the rest is left to the browser)
+GUEST_TOKEN_CACHE_FRACTION = 0.75
+GUEST_TOKEN_CACHE_KEY = 'superset_guest_token'
+# How often a request waiting on another event loop's re-authentication checks again (seconds)
+LOCK_POLL_INTERVAL = 0.02
+
+GUEST_USER = {"username": "guest_user", "first_name": "Guest", "last_name": "User"}
+
+
+class SupersetError(Exception):
+    pass
+
+
+class SupersetAuthError(SupersetError):
+    pass
+
+
+def token_expiry(token, default_lifetime, now):
+    """Expiry (epoch seconds) from a JWT's `exp` claim; the signature is not checked."""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return now + default_lifetime
+
+
+class SupersetTokenBroker:
+    """
+    Hands out guest tokens for the embedded dashboard without the serial
+    login -> CSRF -> list dashboards -> guest token chain on every page view.
+
+    The broker stays logged in over the shared pooled client (access tokens are refreshed
+    shortly before they expire, falling back to a new login), the dashboard id is reused
+    for DASHBOARD_ID_TTL, and guest tokens are shared through the Django cache for most
+    of their validity. `client` defaults to get_async_client().
+    """
+
+    def __init__(self, base_url, username, password, client=None, clock=time.time):
+        self.base_url = (base_url or '').rstrip('/')
+        self.username = username
+        self.password = password
+        self.client = client
+        self.clock = clock
+        self._locks = weakref.WeakKeyDictionary()
+        self._thread_locks = {'auth': threading.Lock(), 'guest': threading.Lock()}
+        self.reset()
+
+    def reset(self):
+        """Forgets every token and the dashboard id (e.g. after a Superset restart)."""
+        self._access_token = None
+        self._refresh_token = None
+        self._access_expires_at = 0
+        self._csrf_token = None
+        self._dashboard_id = None
+        self._dashboard_checked_at = None
+
+    @asynccontextmanager
+    async def _lock(self, name):
+        """
+        Serializes re-authentication ('auth') and guest token fetches ('guest'): among the
+        coroutines of one event loop, then across loops (under WSGI every async view runs in
+        its own). The process-wide lock is polled, so waiting never blocks the loop.
+        """
+        locks = self._locks.setdefault(asyncio.get_running_loop(), {})
+        if name not in locks:
+            locks[name] = asyncio.Lock()
+        async with locks[name]:
+            thread_lock = self._thread_locks[name]
+            while not thread_lock.acquire(blocking=False):
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                thread_lock.release()
+
+    def _client(self):
+        return self.client or get_async_client()
+
+    def _url(self, path):
+        return f"{self.base_url}{path}"
+
+    def _store_access_token(self, access_token):
+        if not access_token:
+            raise SupersetAuthError("Superset returned no access token")
+        self._access_token = access_token
+        self._access_expires_at = token_expiry(access_token, DEFAULT_ACCESS_TOKEN_LIFETIME, self.clock())
+
+    async def _login(self):
+        payload = {"username": self.username, "password": self.password, "provider": "db", "refresh": True}
+        try:
+            response = await self._client().post(self._url("/api/v1/security/login"), json=payload)
+            response.raise_for_status()
+            tokens = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise SupersetAuthError(f"Superset login failed: {e}") from e
+        self._store_access_token(tokens.get('access_token'))
+        self._refresh_token = tokens.get('refresh_token')
+        # The CSRF token is bound to the session cookie issued at login
+        self._csrf_token = None
+
+    async def _refresh(self):
+        headers = {"Authorization": f"Bearer {self._refresh_token}"}
+        try:
+            response = await self._client().post(self._url("/api/v1/security/refresh"), headers=headers)
+            response.raise_for_status()
+            self._store_access_token(response.json().get('access_token'))
+        except (httpx.HTTPError, ValueError, SupersetAuthError) as e:
+            logger.info(f"Superset token refresh failed ({e}), logging in again")
+            await self._login()
+
+    def _access_token_fresh(self):
+        return self._access_token is not None and self.clock() < self._access_expires_at - ACCESS_TOKEN_REFRESH_MARGIN
+
+    async def access_token(self):
+        if self._access_token_fresh():
+            return self._access_token
+        async with self._lock('auth'):
+            if self._access_token_fresh():
+                return self._access_token
+            if self._access_token is not None and self._refresh_token:
+                await self._refresh()
+            else:
+                await self._login()
+            return self._access_token
+
+    async def csrf_token(self):
+        access_token = await self.access_token()
+        if self._csrf_token is None:
+            headers = {"Authorization": f"Bearer {access_token}"}
+            try:
+                response = await self._client().get(self._url("/api/v1/security/csrf_token/"), headers=headers)
+                response.raise_for_status()
+                self._csrf_token = response.json().get('result')
+            except (httpx.HTTPError, ValueError) as e:
+                raise SupersetAuthError(f"Superset CSRF token request failed: {e}") from e
+            if not self._csrf_token:
+                raise SupersetAuthError("Superset returned no CSRF token")
+        return self._csrf_token
+
+    async def _request(self, method, path, csrf=False, **kwargs):
+        """Authenticated request; a 401 (token revoked, Superset restarted) logs in again once."""
+        for attempt in range(2):
+            headers = {"Authorization": f"Bearer {await self.access_token()}"}
+            if csrf:
+                headers.update({"X-CSRFToken": await self.csrf_token(), "Referer": self.base_url})
+            try:
+                response = await self._client().request(method, self._url(path), headers=headers, **kwargs)
+            except httpx.HTTPError as e:
+                raise SupersetError(f"Superset request failed: {e}") from e
+            if response.status_code == 401 and attempt == 0:
+                self._access_token = self._csrf_token = None
+                continue
+            if response.status_code != 200:
+                raise SupersetError(f"Superset {method} {path} returned {response.status_code}: {response.text}")
+            try:
+                return response.json()
+            except ValueError as e:
+                raise SupersetError(f"Superset {method} {path} returned invalid JSON") from e
+
+    async def dashboard_id(self):
+        """Id of the first available dashboard (None if there is none), reused for DASHBOARD_ID_TTL."""
+        if self._dashboard_checked_at is not None and self.clock() - self._dashboard_checked_at < DASHBOARD_ID_TTL:
+            return self._dashboard_id
+        dashboards = (await self._request('GET', "/api/v1/dashboard/")).get('result', [])
+        self._dashboard_id = str(dashboards[0]['id']) if dashboards else None
+        self._dashboard_checked_at = self.clock()
+        return self._dashboard_id
+
+    async def _cached_guest_token(self, key):
+        cached = await cache.aget(key)
+        if cached and cached['refresh_at'] > self.clock():
+            return cached['token']
+        return None
+
+    async def guest_token(self, dashboard_id):
+        """Guest token for the dashboard, shared by every worker through the Django cache."""
+        key = f"{GUEST_TOKEN_CACHE_KEY}:{dashboard_id}"
+        token = await self._cached_guest_token(key)
+        if token:
+            return token
+
+        async with self._lock('guest'):
+            # Another request may have fetched it while this one waited
+            token = await self._cached_guest_token(key)
+            if token:
+                return token
+
+            payload = {
+                "user": GUEST_USER,
+                "resources": [{"type": "dashboard", "id": str(dashboard_id)}],
+                "rls": [],
+            }
+            token = (await self._request('POST', "/api/v1/security/guest_token/", csrf=True, json=payload)).get('token')
+            if not token:
+                raise SupersetError(f"Superset returned no guest token for dashboard {dashboard_id}")
+
+            now = self.clock()
+            lifetime = token_expiry(token, DEFAULT_GUEST_TOKEN_LIFETIME, now) - now
+            cache_for = lifetime * GUEST_TOKEN_CACHE_FRACTION
+            if cache_for >= 1:
+                await cache.aset(key, {'token': token, 'refresh_at': now + cache_for}, timeout=int(cache_for))
+            return token
+
+
+superset_broker = SupersetTokenBroker(SUPERSET_URL, ADMIN_USERNAME, ADMIN_PASSWORD)
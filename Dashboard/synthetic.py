@@ -0,0 +1,492 @@
+import base64
+import datetime
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from django.db import transaction
+
+from .models import Gene, Intervention, NewsArticle, Trial, TrialSite, TrialStatus
+from .utils import extract_study_sites
+
+# Protocol id prefix of synthetic trials, so they can never collide with synced ones
+SYNTHETIC_ID_PREFIX = 'SYN-'
+
+# (symbol, name, risk category), a slice of the ALSoD gene list
+SYNTHETIC_GENES = [
+    ('SOD1', 'Superoxide dismutase 1', 'Definitive ALS gene'),
+    ('C9orf72', 'Chromosome 9 open reading frame 72', 'Definitive ALS gene'),
+    ('TARDBP', 'TAR DNA binding protein', 'Definitive ALS gene'),
+    ('FUS', 'FUS RNA binding protein', 'Definitive ALS gene'),
+    ('TBK1', 'TANK binding kinase 1', 'Definitive ALS gene'),
+    ('OPTN', 'Optineurin', 'Definitive ALS gene'),
+    ('VCP', 'Valosin containing protein', 'Definitive ALS gene'),
+    ('UBQLN2', 'Ubiquilin 2', 'Definitive ALS gene'),
+    ('KIF5A', 'Kinesin family member 5A', 'Definitive ALS gene'),
+    ('NEK1', 'NIMA related kinase 1', 'Definitive ALS gene'),
+    ('ATXN2', 'Ataxin 2', 'Strong evidence'),
+    ('UNC13A', 'Unc-13 homolog A', 'Strong evidence'),
+    ('GRN', 'Granulin precursor', 'Strong evidence'),
+    ('MAPT', 'Microtubule associated protein tau', 'Strong evidence'),
+    ('CHCHD10', 'Coiled-coil-helix-coiled-coil-helix domain containing 10', 'Clinical modifier'),
+    ('ANXA11', 'Annexin A11', 'Clinical modifier'),
+]
+
+# (raw overall_status, TrialStatus name, weight)
+SYNTHETIC_STATUSES = [
+    ('RECRUITING', 'Recruiting', 25),
+    ('COMPLETED', 'Completed', 35),
+    ('ACTIVE_NOT_RECRUITING', 'Active, Not Recruiting', 10),
+    ('NOT_YET_RECRUITING', 'Not Yet Recruiting', 6),
+    ('ENROLLING_BY_INVITATION', 'Enrolling By Invitation', 3),
+    ('TERMINATED', 'Terminated', 8),
+    ('WITHDRAWN', 'Withdrawn', 4),
+    ('SUSPENDED', 'Suspended', 1),
+    ('UNKNOWN', 'Unknown', 8),
+]
+
+# (study_phase, weight); observational studies have no phase
+SYNTHETIC_PHASES = [
+    ('Early Phase 1', 2), ('Phase 1', 15), ('Phase 1/2', 8), ('Phase 2', 30),
+    ('Phase 2/3', 6), ('Phase 3', 15), ('Phase 4', 4), ('NA', 20),
+]
+
+# Spread over the FUNDING_CATEGORIES keyword classes (see trial_index.categorize_sponsor)
+SYNTHETIC_SPONSORS = [
+    'Biogen', 'Amylyx Pharmaceuticals Inc.', 'Cytokinetics', 'Denali Therapeutics Inc.', 'Novartis Pharmaceuticals',
+    'Massachusetts General Hospital', 'Johns Hopkins University', 'University College, London', 'Mayo Clinic',
+    'Emory University', 'National Institute of Neurological Disorders and Stroke (NINDS)', 'VA Office of Research and Development',
+    'ALS Association', 'Target ALS', 'Sean M. Healey & AMG Center for ALS',
+]
+
+# (facility, city, state, country, latitude, longitude)
+SYNTHETIC_SITES = [
+    ('Massachusetts General Hospital', 'Boston', 'Massachusetts', 'United States', 42.3626, -71.0692),
+    ('Johns Hopkins Hospital', 'Baltimore', 'Maryland', 'United States', 39.2963, -76.5923),
+    ('Mayo Clinic', 'Rochester', 'Minnesota', 'United States', 44.0225, -92.4668),
+    ('Cedars-Sinai Medical Center', 'Los Angeles', 'California', 'United States', 34.0755, -118.3804),
+    ('Northwestern University', 'Chicago', 'Illinois', 'United States', 41.8955, -87.6212),
+    ('Emory University', 'Atlanta', 'Georgia', 'United States', 33.7925, -84.3240),
+    ('Houston Methodist', 'Houston', 'Texas', 'United States', 29.7100, -95.3990),
+    ('University of Washington', 'Seattle', 'Washington', 'United States', 47.6505, -122.3074),
+    ('Montreal Neurological Institute', 'Montreal', 'Quebec', 'Canada', 45.5092, -73.5820),
+    ('Sunnybrook Health Sciences Centre', 'Toronto', 'Ontario', 'Canada', 43.7221, -79.3751),
+    ('King\'s College Hospital', 'London', '', 'United Kingdom', 51.4682, -0.0939),
+    ('Sheffield Institute for Translational Neuroscience', 'Sheffield', '', 'United Kingdom', 53.3814, -1.4883),
+    ('Hôpital de la Pitié-Salpêtrière', 'Paris', '', 'France', 48.8380, 2.3650),
+    ('Charité Universitätsmedizin', 'Berlin', '', 'Germany', 52.5262, 13.3766),
+    ('Universitätsklinikum Ulm', 'Ulm', '', 'Germany', 48.4222, 9.9567),
+    ('UMC Utrecht', 'Utrecht', '', 'Netherlands', 52.0862, 5.1794),
+    ('KU Leuven', 'Leuven', '', 'Belgium', 50.8796, 4.6714),
+    ('Karolinska University Hospital', 'Stockholm', '', 'Sweden', 59.3510, 18.0330),
+    ('Centro Clinico NeMO', 'Milan', '', 'Italy', 45.5090, 9.1520),
+    ('Hospital Universitario La Paz', 'Madrid', '', 'Spain', 40.4810, -3.6870),
+    ('Beaumont Hospital', 'Dublin', '', 'Ireland', 53.3905, -6.2234),
+    ('Macquarie University', 'Sydney', 'New South Wales', 'Australia', -33.7738, 151.1126),
+    ('Royal Melbourne Hospital', 'Melbourne', 'Victoria', 'Australia', -37.7990, 144.9560),
+    ('Nagoya University Hospital', 'Nagoya', '', 'Japan', 35.1560, 136.9240),
+    ('Peking University Third Hospital', 'Beijing', '', 'China', 39.9830, 116.3540),
+    ('Seoul National University Hospital', 'Seoul', '', 'Korea, Republic of', 37.5796, 126.9990),
+    ('Tel Aviv Sourasky Medical Center', 'Tel Aviv', '', 'Israel', 32.0810, 34.7890),
+    ('Hospital Israelita Albert Einstein', 'São Paulo', '', 'Brazil', -23.6000, -46.7150),
+]
+
+# (CT.gov intervention type, weight)
+SYNTHETIC_INTERVENTION_TYPES = [
+    ('DRUG', 45), ('BIOLOGICAL', 10), ('GENETIC', 5), ('DEVICE', 10),
+    ('BEHAVIORAL', 10), ('PROCEDURE', 5), ('DIETARY_SUPPLEMENT', 5), ('OTHER', 10),
+]
+
+SYNTHETIC_CONDITIONS = ['Amyotrophic Lateral Sclerosis', 'ALS', 'Motor Neuron Disease', 'Frontotemporal Dementia', 'FTD', 'Frontotemporal Lobar Degeneration']
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _date(rng, start_year, end_year):
+    return datetime.date(rng.randint(start_year, end_year), rng.randint(1, 12), rng.randint(1, 28))
+
+
+def synthetic_trial(i, seed=0):
+    """
+    Field values of synthetic trial number `i`, in the shape update_data() stores (CT.gov
+    locations in study_location, interventions in intervention_name). The same `i` and
+    `seed` always give the same trial, so corpora can be grown in place.
+    """
+    rng = random.Random(f'{seed}:{i}')
+    interventional = rng.random() < 0.75
+    raw_status = _weighted(rng, [(raw, weight) for raw, _, weight in SYNTHETIC_STATUSES])
+    start = _date(rng, 2000, datetime.date.today().year)
+    # Most trials mention no gene; the rest one or two, skewed to the common ones
+    gene_count = rng.choices([0, 1, 2], weights=[70, 25, 5])[0]
+    genes = sorted({SYNTHETIC_GENES[min(int(rng.expovariate(0.3)), len(SYNTHETIC_GENES) - 1)][0] for _ in range(gene_count)})
+    # Site counts are long-tailed: most trials are single-site, a few run at dozens of sites
+    site_count = min(int(rng.paretovariate(1.2)), 40) if rng.random() < 0.9 else 0
+    locations = []
+    for facility, city, state, country, lat, lon in rng.sample(SYNTHETIC_SITES, min(site_count, len(SYNTHETIC_SITES))):
+        locations.append({
+            'facility': facility, 'city': city, 'state': state, 'country': country,
+            'zip': f'{rng.randint(10000, 99999)}', 'status': 'RECRUITING' if raw_status == 'RECRUITING' else '',
+            'geoPoint': {'lat': lat, 'lon': lon},
+        })
+    interventions = [
+        {'type': kind, 'name': f'{kind.title()} {rng.randint(1, 999)}', 'description': f'Synthetic {kind.lower()} intervention'}
+        for kind in sorted({_weighted(rng, SYNTHETIC_INTERVENTION_TYPES) for _ in range(rng.randint(1, 3) if interventional else 0)})
+    ]
+    conditions = rng.sample(SYNTHETIC_CONDITIONS, rng.randint(1, 2))
+    return {
+        'unique_protocol_id': f'{SYNTHETIC_ID_PREFIX}{i:07d}',
+        'nct_id': f'NCT9{i:07d}',
+        'brief_title': f"{'A Study of' if interventional else 'Natural History of'} {' and '.join(genes) or conditions[0]} in {conditions[0]} ({i})",
+        'brief_description': f'Synthetic benchmark trial {i} studying {", ".join(conditions)}.',
+        'study_type': 'INTERVENTIONAL' if interventional else 'OBSERVATIONAL',
+        'study_phase': _weighted(rng, SYNTHETIC_PHASES) if interventional else None,
+        'overall_status': raw_status,
+        'study_start_date': start,
+        'status_verified_date': _date(rng, start.year, datetime.date.today().year),
+        'lead_sponsor_name': rng.choice(SYNTHETIC_SPONSORS),
+        'condition': conditions,
+        'keyword': genes + ['neurodegeneration'],
+        'intervention_types': interventions,
+        'intervention_name': interventions,
+        'enrollment_count': int(rng.lognormvariate(4, 1)) if rng.random() < 0.95 else None,
+        'enrollment_type': 'ESTIMATED' if raw_status in ('RECRUITING', 'NOT_YET_RECRUITING') else 'ACTUAL',
+        'study_location': locations,
+        'genes': genes,
+    }
+
+
+def ensure_synthetic_reference_data():
+    """Genes and statuses synthetic trials link to; returns ({symbol: Gene}, {raw status: TrialStatus})."""
+    genes = {}
+    for symbol, name, category in SYNTHETIC_GENES:
+        genes[symbol] = Gene.objects.filter(gene_symbol=symbol).first() or Gene.objects.create(
+            gene_symbol=symbol, gene_name=name, gene_risk_category=category,
+        )
+    statuses = {raw: TrialStatus.objects.get_or_create(name=name)[0] for raw, name, _ in SYNTHETIC_STATUSES}
+    return genes, statuses
+
+
+def seed_synthetic_trials(stop, start=0, seed=0, batch_size=1000):
+    """
+    Bulk-inserts synthetic trials `start`..`stop - 1` with their statuses, genes, sites and
+    interventions (one transaction per batch). Summary views are not refreshed.
+    """
+    genes, statuses = ensure_synthetic_reference_data()
+    StatusLink = Trial.status.through
+    GeneLink = Trial.related_genes.through
+    for batch_start in range(start, stop, batch_size):
+        rows = [synthetic_trial(i, seed) for i in range(batch_start, min(batch_start + batch_size, stop))]
+        with transaction.atomic():
+            trials = Trial.objects.bulk_create([Trial(**row) for row in rows])
+            StatusLink.objects.bulk_create([
+                StatusLink(trial_id=trial.pk, trialstatus_id=statuses[row['overall_status']].pk) for trial, row in zip(trials, rows)
+            ])
+            GeneLink.objects.bulk_create([
+                GeneLink(trial_id=trial.pk, gene_id=genes[symbol].pk) for trial, row in zip(trials, rows) for symbol in row['genes']
+            ])
+            TrialSite.objects.bulk_create([
+                TrialSite(trial=trial, **site) for trial, row in zip(trials, rows) for site in extract_study_sites(row['study_location'])
+            ])
+            Intervention.objects.bulk_create([
+                Intervention(
+                    trial=trial, intervention_name=item['name'], intervention_type=item['type'],
+                    intervention_description=item['description'],
+                )
+                for trial, row in zip(trials, rows) for item in row['intervention_name']
+            ])
+    return stop - start
+
+
+# Feeds synthetic news articles are attributed to
+SYNTHETIC_NEWS_SOURCES = ['ALS News Today', 'Medical Xpress', 'Nature Neuroscience', 'FTD News']
+
+
+def synthetic_news_article(i, seed=0):
+    """Field values of synthetic news article number `i` (deterministic, like synthetic_trial)."""
+    rng = random.Random(f'news:{seed}:{i}')
+    gene = SYNTHETIC_GENES[min(int(rng.expovariate(0.3)), len(SYNTHETIC_GENES) - 1)][0]
+    published = datetime.datetime.combine(_date(rng, 2015, datetime.date.today().year), datetime.time(rng.randint(0, 23)), datetime.timezone.utc)
+    return {
+        'title': f'{gene} findings in {rng.choice(SYNTHETIC_CONDITIONS)} ({i})',
+        'summary': f'Synthetic benchmark article {i} on {gene}.',
+        'source_name': rng.choice(SYNTHETIC_NEWS_SOURCES),
+        'url': f'https://news.example.org/synthetic/{seed}/{i}',
+        'publication_date': published,
+        'tags': ['Research', gene],
+        'gene': gene,
+    }
+
+
+def seed_synthetic_news(stop, start=0, seed=0):
+    """Bulk-inserts synthetic news articles `start`..`stop - 1`, each linked to one gene."""
+    genes, _ = ensure_synthetic_reference_data()
+    GeneLink = NewsArticle.related_genes.through
+    rows = [synthetic_news_article(i, seed) for i in range(start, stop)]
+    with transaction.atomic():
+        articles = NewsArticle.objects.bulk_create([NewsArticle(**{k: v for k, v in row.items() if k != 'gene'}) for row in rows])
+        GeneLink.objects.bulk_create([
+            GeneLink(newsarticle_id=article.pk, gene_id=genes[row['gene']].pk) for article, row in zip(articles, rows)
+        ])
+    return stop - start
+
+
+# Conditions outside the dashboard's scope; studies listing only these are dropped by fetch_trial_data
+SYNTHETIC_EXCLUDED_CONDITIONS = ['Spinal Muscular Atrophy', 'Alzheimer Disease', 'Myasthenia Gravis', 'Progressive Supranuclear Palsy']
+
+SYNTHETIC_INCLUSION_CRITERIA = [
+    'Age 18 years or older',
+    'Diagnosis of possible, probable or definite ALS according to the revised El Escorial criteria',
+    'Onset of weakness within 36 months prior to screening',
+    'Slow vital capacity of at least 60% of predicted',
+    'Confirmed pathogenic variant in the gene under study',
+    'Able to provide informed consent and comply with study procedures',
+    'Stable dose of riluzole for at least 30 days, or not taking riluzole',
+    'Diagnosis of behavioural variant FTD according to Rascovsky criteria',
+]
+
+SYNTHETIC_EXCLUSION_CRITERIA = [
+    'Tracheostomy or permanent assisted ventilation',
+    'Participation in another interventional trial within 30 days',
+    'Pregnant or breastfeeding',
+    'Clinically significant hepatic or renal impairment',
+    'History of HIV, hepatitis B or hepatitis C infection',
+    'Contraindication to lumbar puncture',
+    'Dementia that would prevent informed consent',
+]
+
+SYNTHETIC_OUTCOMES = [
+    ('Change in ALSFRS-R total score', '24 weeks'),
+    ('Change in slow vital capacity', '48 weeks'),
+    ('Plasma neurofilament light chain concentration', '12 weeks'),
+    ('Incidence of treatment-emergent adverse events', '52 weeks'),
+    ('Time to death or permanent assisted ventilation', '72 weeks'),
+    ('Change in CDR plus NACC FTLD sum of boxes', '52 weeks'),
+]
+
+# Dashboard study_phase -> ClinicalTrials.gov v2 phases
+CTGOV_PHASES = {
+    'Early Phase 1': ['EARLY_PHASE1'], 'Phase 1': ['PHASE1'], 'Phase 1/2': ['PHASE1', 'PHASE2'], 'Phase 2': ['PHASE2'],
+    'Phase 2/3': ['PHASE2', 'PHASE3'], 'Phase 3': ['PHASE3'], 'Phase 4': ['PHASE4'], 'NA': ['NA'],
+}
+
+# Largest pageSize the ClinicalTrials.gov v2 API accepts
+CTGOV_MAX_PAGE_SIZE = 1000
+
+
+def _month(date):
+    return date.strftime('%Y-%m')
+
+
+def _criteria_text(rng):
+    inclusion = rng.sample(SYNTHETIC_INCLUSION_CRITERIA, rng.randint(2, 5))
+    exclusion = rng.sample(SYNTHETIC_EXCLUSION_CRITERIA, rng.randint(2, 4))
+    return (
+        'Inclusion Criteria:\n\n' + '\n'.join(f'* {item}' for item in inclusion)
+        + '\n\nExclusion Criteria:\n\n' + '\n'.join(f'* {item}' for item in exclusion)
+    )
+
+
+def _outcomes(rng, count):
+    return [{'measure': measure, 'timeFrame': time_frame} for measure, time_frame in rng.sample(SYNTHETIC_OUTCOMES, count)]
+
+
+def synthetic_study(i, seed=0):
+    """
+    Synthetic study number `i` as the ClinicalTrials.gov v2 API returns it for the `fields`
+    selection of fetch_trial_data (only the requested pieces of each module). It describes
+    the same trial as synthetic_trial(i, seed); a few studies only list out-of-scope
+    conditions, as the live search does, and are filtered out on ingest.
+    """
+    trial = synthetic_trial(i, seed)
+    rng = random.Random(f'{seed}:{i}:study')
+    conditions = trial['condition']
+    if rng.random() < 0.03:
+        conditions = rng.sample(SYNTHETIC_EXCLUDED_CONDITIONS, 1)
+    expanded_access = trial['study_type'] == 'INTERVENTIONAL' and rng.random() < 0.02
+    start = trial['study_start_date']
+    submitted = start - datetime.timedelta(days=rng.randint(10, 400))
+    principal_investigator = rng.random() < 0.3
+
+    design = {'studyType': 'EXPANDED_ACCESS' if expanded_access else trial['study_type']}
+    if trial['study_phase']:
+        design['phases'] = CTGOV_PHASES[trial['study_phase']]
+    if trial['enrollment_count'] is not None:
+        design['enrollmentInfo'] = {'count': trial['enrollment_count'], 'type': trial['enrollment_type']}
+
+    eligibility = {
+        'eligibilityCriteria': _criteria_text(rng),
+        'healthyVolunteers': rng.random() < 0.1,
+        'sex': rng.choices(['ALL', 'FEMALE', 'MALE'], weights=[90, 5, 5])[0],
+        'minimumAge': f'{rng.choice([18, 21, 25, 30])} Years',
+    }
+    if rng.random() < 0.6:
+        eligibility['maximumAge'] = f'{rng.choice([65, 75, 80, 85])} Years'
+    if trial['study_type'] == 'OBSERVATIONAL':
+        eligibility['studyPopulation'] = f"People living with {conditions[0]} and their caregivers"
+
+    responsible_party = {'type': 'PRINCIPAL_INVESTIGATOR' if principal_investigator else 'SPONSOR'}
+    if principal_investigator:
+        responsible_party['investigatorFullName'] = f'Investigator {rng.randint(1, 5000)}'
+
+    outcomes = {'primaryOutcomes': _outcomes(rng, rng.randint(1, 2))}
+    if rng.random() < 0.7:
+        outcomes['secondaryOutcomes'] = _outcomes(rng, rng.randint(1, 3))
+
+    protocol = {
+        'identificationModule': {
+            'nctId': trial['nct_id'],
+            'orgStudyIdInfo': {'id': trial['unique_protocol_id']},
+            'briefTitle': trial['brief_title'],
+        },
+        'statusModule': {
+            'statusVerifiedDate': _month(trial['status_verified_date']),
+            'overallStatus': trial['overall_status'],
+            'expandedAccessInfo': {'hasExpandedAccess': expanded_access},
+            'startDateStruct': {'date': start.isoformat(), 'type': 'ACTUAL' if start <= datetime.date.today() else 'ESTIMATED'},
+            'completionDateStruct': {'date': _month(start + datetime.timedelta(days=rng.randint(180, 2000)))},
+            'studyFirstSubmitDate': submitted.isoformat(),
+            'studyFirstSubmitQcDate': (submitted + datetime.timedelta(days=rng.randint(0, 30))).isoformat(),
+        },
+        'sponsorCollaboratorsModule': {
+            'responsibleParty': responsible_party,
+            'leadSponsor': {'name': trial['lead_sponsor_name']},
+        },
+        'oversightModule': {
+            'isFdaRegulatedDrug': any(item['type'] in ('DRUG', 'BIOLOGICAL', 'GENETIC') for item in trial['intervention_name']),
+            'isFdaRegulatedDevice': any(item['type'] == 'DEVICE' for item in trial['intervention_name']),
+        },
+        'descriptionModule': {'briefSummary': trial['brief_description']},
+        'conditionsModule': {'conditions': conditions, 'keywords': trial['keyword']},
+        'designModule': design,
+        'eligibilityModule': eligibility,
+        'outcomesModule': outcomes,
+    }
+    if trial['intervention_name']:
+        protocol['armsInterventionsModule'] = {
+            'interventions': [{'type': item['type'], 'description': item['description']} for item in trial['intervention_name']],
+        }
+    if trial['study_location']:
+        protocol['contactsLocationsModule'] = {'locations': trial['study_location']}
+    return {'protocolSection': protocol}
+
+
+def encode_page_token(offset):
+    return base64.urlsafe_b64encode(f'offset:{offset}'.encode()).decode().rstrip('=')
+
+
+def decode_page_token(token):
+    try:
+        return int(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode().removeprefix('offset:'))
+    except ValueError:
+        return None
+
+
+def synthetic_studies_page(total, page_token=None, page_size=CTGOV_MAX_PAGE_SIZE, seed=0):
+    """
+    One page of a `total`-study search, as GET /api/v2/studies returns it: `studies`, plus
+    `nextPageToken` while more pages remain. Returns None for an invalid token.
+    """
+    offset = decode_page_token(page_token) if page_token else 0
+    if offset is None or not 0 <= offset <= total:
+        return None
+    stop = min(offset + max(1, min(page_size, CTGOV_MAX_PAGE_SIZE)), total)
+    page = {'studies': [synthetic_study(i, seed) for i in range(offset, stop)]}
+    if stop < total:
+        page['nextPageToken'] = encode_page_token(stop)
+    return page
+
+
+def synthetic_alsod_page():
+    """The ALSoD gene table markup scrape_alsod_gene_list parses, listing SYNTHETIC_GENES."""
+    rows = ''.join(
+        '<tr class="clickable-row">'
+        f'<td class="assetIDConfig">{n}</td><td class="assetIDConfig">{symbol}</td>'
+        f'<td class="assetIDConfig">{name}</td><td class="assetIDConfig">{category}</td></tr>'
+        for n, (symbol, name, category) in enumerate(SYNTHETIC_GENES, 1)
+    )
+    return f'<html><body><table>{rows}</table></body></html>'
+
+
+class SyntheticSourcesServer:
+    """
+    Local stand-in for the trial sync's upstream sources, on a background thread:
+    `/api/v2/studies` serves a `total`-study ClinicalTrials.gov search with nextPageToken
+    paging (pageSize is honoured up to the API's maximum) and `/alsod/` the ALSoD gene
+    table. Rendered pages are kept, so only the first pass pays for generating them.
+    Point CTGOV_STUDIES_URL and ALSOD_URL at `studies_url` and `alsod_url`::
+
+        with SyntheticSourcesServer(5000) as server, override_settings(
+                CTGOV_STUDIES_URL=server.studies_url, ALSOD_URL=server.alsod_url):
+            update_data()
+    """
+
+    def __init__(self, total, seed=0):
+        self.total = total
+        self.seed = seed
+        self.requests = 0
+        self._pages = {}
+        self._httpd = None
+
+    def _render(self, path, query):
+        if path == '/alsod/':
+            return 200, 'text/html; charset=utf-8', synthetic_alsod_page().encode()
+        if path != '/api/v2/studies':
+            return 404, 'application/json', b'{"error": "not found"}'
+        token = query.get('pageToken', [None])[0]
+        try:
+            page_size = int(query.get('pageSize', ['10'])[0])
+        except ValueError:
+            return 400, 'application/json', b'{"error": "pageSize must be an integer"}'
+        key = (token, page_size)
+        if key not in self._pages:
+            page = synthetic_studies_page(self.total, token, page_size, self.seed)
+            if page is None:
+                return 400, 'application/json', b'{"error": "invalid pageToken"}'
+            self._pages[key] = json.dumps(page).encode()
+        return 200, 'application/json', self._pages[key]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                server.requests += 1
+                status, content_type, body = server._render(url.path, parse_qs(url.query))
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def studies_url(self):
+        return f'{self.base_url}/api/v2/studies'
+
+    @property
+    def alsod_url(self):
+        return f'{self.base_url}/alsod/'
+
+    def __enter__(self):
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        threading.Thread(target=self._httpd.serve_forever, name='synthetic-sources', daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._httpd.shutdown()
+        self._httpd.server_close()
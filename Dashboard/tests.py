@@ -1,8 +1,49 @@
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase, TransactionTestCase, AsyncClient, Client, override_settings
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
 from unittest.mock import patch, MagicMock
-from .models import NewsArticle, Gene
+from asgiref.sync import async_to_sync, iscoroutinefunction
+import httpx
+from django.db.models import Sum
+from .models import NewsArticle, Gene, Trial, TrialStatus, HealeyTrial, CountrySummary, GeneStructure
+from .summaries import refresh_summary_views
 from .news_scraper import fetch_and_process_news
+from .utils import sync_trial_sites, run_analytical_query, fetch_trial_data, scrape_alsod_gene_list
+from .duckdb_engine import DuckDBEngine
+from .query_inspector import QueryInspector, query_shape
+from .profiling import SamplingProfiler
+from .middleware import MetricsMiddleware, ProfilingMiddleware
+from .metrics import CACHE_LOOKUPS, DB_QUERIES, async_sync_stage, registry, sync_stage, sync_stage_results, record_sync_error
+from .benchmarks import BENCHMARK_BUILDERS, BENCHMARK_ENDPOINTS, check_budget, confirm_exceeded, derive_budget, slowest_result, endpoint_name, run_benchmarks, run_ingest_benchmark
+from .cassettes import CassetteMiss, use_cassette
+from .http_client import ThreadedAsyncClient, close_async_client, get_async_client, get_client, lifespan
+from .synthetic import SYNTHETIC_EXCLUDED_CONDITIONS, SyntheticSourcesServer, decode_page_token, seed_synthetic_news, seed_synthetic_trials, synthetic_news_article, synthetic_studies_page, synthetic_study, synthetic_trial
+from .api_analytics import router as analytics_router
+from .superset import SupersetTokenBroker, ACCESS_TOKEN_REFRESH_MARGIN
+from .pagination import paginate_offset
+from .replica import snapshot_replica, query_replica, current_version_dir, REPLICA_KEEP_VERSIONS
+from .api import fuzzy_lookup, get_news, get_gene_structure, update_healey_trial
+from .trial_index import get_trial_index
+from .caching import get_or_build, local_cache, lock_key, stale_key, version_key
+from .api_analytics import _build_full_trials_dataset, get_countries, get_latest_news, get_trials_list, get_filter_options, get_trial_facet_search, get_dashboard_stats, get_trials_by_phase, get_funding_sources, get_geographic_distribution, get_global_map_data, get_global_map_clusters, get_global_map_cluster_trials, get_trials_by_year, get_dashboard_package, get_dashboard_cube, _build_dashboard_package, DASHBOARD_PACKAGE_SECTIONS, execute_query
 from datetime import datetime
+import base64
+import gzip
+import io
+import requests
+import pstats
+import json
+import os
+import tempfile
+from collections import Counter
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import threading
+import time
+import duckdb
+import pandas as pd
 from django.utils.timezone import make_aware
 
 class NewsScraperTest(TestCase):
@@ -15,8 +56,9 @@ class NewsScraperTest(TestCase):
             gene_risk_category="Definitive ALS gene"
         )
 
+    @patch('Dashboard.news_scraper.get_client')
     @patch('Dashboard.news_scraper.feedparser.parse')
-    def test_fetch_and_process_news_google_rss(self, mock_parse):
+    def test_fetch_and_process_news_google_rss(self, mock_parse, mock_get_client):
         # Mock Google News RSS entry
         mock_entry = MagicMock()
         mock_entry.get.side_effect = lambda k, d=None: {
@@ -57,8 +99,9 @@ class NewsScraperTest(TestCase):
         print(f"Tags: {article.tags}")
         self.assertTrue(any("SUPEROXIDE DISMUTASE 1" in tag for tag in article.tags))
 
+    @patch('Dashboard.news_scraper.get_client')
     @patch('Dashboard.news_scraper.feedparser.parse')
-    def test_fetch_ignores_irrelevant(self, mock_parse):
+    def test_fetch_ignores_irrelevant(self, mock_parse, mock_get_client):
         # Mock entry with NO keywords
         mock_entry = MagicMock()
         mock_entry.get.side_effect = lambda k, d=None: {
@@ -76,4 +119,1088 @@ class NewsScraperTest(TestCase):
         count = fetch_and_process_news()
         
         self.assertEqual(count, 0)
-        self.assertFalse(NewsArticle.objects.filter(url='http://example.com/health').exists())
\ No newline at end of file
+        self.assertFalse(NewsArticle.objects.filter(url='http://example.com/health').exists())
+
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SingleFlightCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.builder = MagicMock(return_value={"trials": ["fresh"]})
+
+    def test_miss_builds_once_and_caches(self):
+        self.assertEqual(get_or_build('dataset', self.builder), {"trials": ["fresh"]})
+        self.assertEqual(get_or_build('dataset', self.builder), {"trials": ["fresh"]})
+        self.builder.assert_called_once()
+        self.assertEqual(cache.get(stale_key('dataset'))['data'], {"trials": ["fresh"]})
+        self.assertIsNone(cache.get(lock_key('dataset')))
+
+    def test_serves_stale_while_another_worker_rebuilds(self):
+        cache.set(stale_key('dataset'), {"version": "v0", "data": {"trials": ["stale"]}})
+        cache.set(lock_key('dataset'), 'other-worker')
+
+        self.assertEqual(get_or_build('dataset', self.builder), {"trials": ["stale"]})
+        self.builder.assert_not_called()
+
+    def test_force_refresh_rebuilds_even_when_cached(self):
+        cache.set('dataset', {"version": "v0", "data": {"trials": ["old"]}})
+        self.assertEqual(get_or_build('dataset', self.builder, force_refresh=True), {"trials": ["fresh"]})
+        self.assertEqual(cache.get('dataset')['data'], {"trials": ["fresh"]})
+
+    def test_local_cache_reuses_decoded_payload_until_version_changes(self):
+        first = get_or_build('dataset', self.builder)
+        with patch.object(cache, 'get', wraps=cache.get) as cache_get:
+            self.assertIs(get_or_build('dataset', self.builder), first)
+            # Only the small version key is read on an L1 hit
+            cache_get.assert_called_once_with(version_key('dataset'))
+
+        # Another worker rebuilds: the version bump invalidates this worker's copy
+        cache.set('dataset', {"version": "v2", "data": {"trials": ["rebuilt"]}})
+        cache.set(version_key('dataset'), "v2")
+        self.assertEqual(get_or_build('dataset', self.builder), {"trials": ["rebuilt"]})
+        self.builder.assert_called_once()
+
+
+class FullTrialsDatasetQueryCountTest(TestCase):
+    # Trials, prefetched genes, prefetched statuses
+    MAX_QUERIES = 3
+
+    def setUp(self):
+        self.sod1 = Gene.objects.create(gene_symbol="SOD1", gene_name="Superoxide dismutase 1", gene_risk_category="Definitive")
+        self.recruiting = TrialStatus.objects.create(name="RECRUITING")
+        self.completed = TrialStatus.objects.create(name="COMPLETED")
+
+    def create_trials(self, count, offset=0):
+        for i in range(offset, offset + count):
+            trial = Trial.objects.create(
+                unique_protocol_id=f"PROTO-{i}",
+                nct_id=f"NCT{i:08d}",
+                brief_title=f"Trial {i}",
+                overall_status="RECRUITING",
+                genes=["FUS Mutation"],
+            )
+            trial.status.add(self.recruiting, self.completed)
+            trial.related_genes.add(self.sod1)
+
+    def test_rebuild_query_count_is_constant(self):
+        self.create_trials(3)
+        with self.assertNumQueries(self.MAX_QUERIES):
+            _build_full_trials_dataset()
+
+        self.create_trials(20, offset=3)
+        with self.assertNumQueries(self.MAX_QUERIES):
+            data = _build_full_trials_dataset()
+
+        self.assertEqual(data['pagination']['total_count'], 23)
+        trial = next(t for t in data['trials'] if t['id'] == 'PROTO-0')
+        # The lowest-pk status wins, as with the previous .first() lookup
+        self.assertEqual(trial['status'], 'Recruiting')
+        self.assertEqual(trial['genes'], ['FUS', 'SOD1'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TrialIndexAnalyticsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        sod1 = Gene.objects.create(gene_symbol="SOD1", gene_name="Superoxide dismutase 1", gene_risk_category="Definitive")
+        fus = Gene.objects.create(gene_symbol="FUS", gene_name="Fused in sarcoma", gene_risk_category="Definitive")
+        boston = {"facility": "MGH", "city": "Boston", "country": "United States", "geoPoint": {"lat": 42.3601, "lon": -71.0589}}
+        trial = Trial.objects.create(
+            unique_protocol_id="P1", nct_id="NCT1", brief_title="SOD1 trial", overall_status="RECRUITING",
+            study_phase="Phase 3", study_type="INTERVENTIONAL", enrollment_count=100, lead_sponsor_name="Biogen",
+            study_start_date="2020-05-01", study_location=[boston, {"city": "Paris", "country": "france"}],
+        )
+        # Two linked genes must not count the trial twice
+        trial.related_genes.add(sod1, fus)
+        Trial.objects.create(
+            unique_protocol_id="P2", nct_id="NCT2", brief_title="SOD10 trial", overall_status="COMPLETED",
+            study_phase="Phase 2", study_type="INTERVENTIONAL", enrollment_count=40, lead_sponsor_name="Harvard University",
+            study_start_date="2015-01-01", study_location=[boston], genes=["SOD10"],
+        )
+        Trial.objects.create(
+            unique_protocol_id="P3", nct_id="NCT3", brief_title="Registry", overall_status="RECRUITING",
+            study_type="OBSERVATIONAL", lead_sponsor_name="NINDS",
+        )
+        # Sites are flattened at sync time
+        for t in Trial.objects.all():
+            sync_trial_sites(t)
+        refresh_summary_views()
+
+    def test_filters_match_whole_gene_symbols(self):
+        self.assertEqual(get_dashboard_stats(None, status=None, phase=None, gene="sod1")["total_trials"], 1)
+        self.assertEqual(get_dashboard_stats(None, status=None, phase=None, gene="SOD10")["total_trials"], 1)
+        self.assertEqual(get_trials_by_phase(None, familial=True), [{"name": "Phase 3", "value": 1}, {"name": "Phase 2", "value": 1}])
+        self.assertEqual(get_trials_by_phase(None, status=["recruiting"]), [{"name": "Phase 3", "value": 1}, {"name": "Unknown", "value": 1}])
+
+    def test_gene_filter_strips_mutation_suffix(self):
+        Trial.objects.create(
+            unique_protocol_id="P4", nct_id="NCT4", brief_title="FUS trial", overall_status="RECRUITING",
+            study_type="INTERVENTIONAL", genes=["FUS Mutation"],
+        )
+        # P1 is linked to FUS, P4 only names it in its genes JSON
+        self.assertEqual(get_dashboard_stats(None, status=None, phase=None, gene="fus")["total_trials"], 2)
+        self.assertIn("fus", get_trial_index().genes.values)
+        self.assertNotIn("fus mutation", get_trial_index().genes.values)
+        # The gene_symbols array behind the ORM filters is cleaned the same way
+        self.assertEqual(Trial.objects.get(unique_protocol_id="P4").gene_symbols, ["fus"])
+
+    def test_trials_list_gene_filter_matches_related_genes(self):
+        def listed(gene):
+            return [t["id"] for t in get_trials_list(None, per_page=25, status=None, phase=None, study_type=None, gene=gene)["trials"]]
+
+        # P1 names no genes in its JSON, only through related_genes
+        self.assertEqual(Trial.objects.get(unique_protocol_id="P1").gene_symbols, ["fus", "sod1"])
+        self.assertEqual(listed("sod1"), ["P1"])
+        self.assertEqual(len(listed("sod1")), get_dashboard_stats(None, status=None, phase=None, gene="sod1")["total_trials"])
+
+        trial = Trial.objects.get(unique_protocol_id="P1")
+        trial.related_genes.remove(Gene.objects.get(gene_symbol="SOD1"))
+        self.assertEqual(listed("sod1"), [])
+        Gene.objects.filter(gene_symbol="FUS").update(gene_symbol="FUS Mutation")
+        self.assertEqual(Trial.objects.get(unique_protocol_id="P1").gene_symbols, ["fus"])
+        Gene.objects.filter(gene_symbol="FUS Mutation").update(gene_symbol="TARDBP")
+        self.assertEqual(listed("tardbp"), ["P1"])
+
+    def test_aggregates(self):
+        # Stat cards only cover interventional trials
+        stats = get_dashboard_stats(None, status=None, phase=None)
+        self.assertEqual((stats["total_trials"], stats["total_participants"], stats["clinical_sites"]), (2, 140, 3))
+        self.assertEqual(stats["avg_enrollment"], 70)
+        self.assertEqual([f["value"] for f in get_funding_sources(None)], [1, 1, 1, 0])
+        self.assertEqual(get_geographic_distribution(None), [{"name": "United States", "value": 2}, {"name": "France", "value": 1}])
+        self.assertEqual(get_trials_by_year(None), [{"year": 2015, "count": 1}, {"year": 2020, "count": 1}])
+        self.assertEqual(get_trials_by_year(None, country="FRANCE"), [{"year": 2020, "count": 1}])
+
+        self.assertEqual(get_countries(None), ["United States", "france"])
+
+        [cluster] = get_global_map_data(None, status=["recruiting", "completed"])
+        self.assertEqual((cluster["city"], cluster["trial_count"]), ("Boston", 2))
+        self.assertEqual([t["id"] for t in cluster["trials"]], ["P1", "P2"])
+
+    def test_global_map_clusters(self):
+        filters = {"status": ["recruiting", "completed"], "phase": None}
+        [cell] = get_global_map_clusters(None, zoom=2, **filters)["clusters"]
+        self.assertEqual((cell["trial_count"], cell["site_count"], cell["city"]), (2, 1, "Boston"))
+        self.assertEqual(cell["position"], [42.3601, -71.0589])
+        # Only clusters in view are returned
+        self.assertEqual(get_global_map_clusters(None, zoom=2, bbox="0,0,10,10", **filters)["clusters"], [])
+        self.assertEqual(len(get_global_map_clusters(None, zoom=2, bbox="-72,42,-70,43", **filters)["clusters"]), 1)
+        self.assertEqual(get_global_map_clusters(None, zoom=2, bbox="nope", **filters).status_code, 400)
+        # Past the grid pyramid, the site clusters themselves
+        [site] = get_global_map_clusters(None, zoom=20, **filters)["clusters"]
+        self.assertEqual(site["key"], "site/42.36,-71.059")
+
+        # Trial lists are loaded per cluster, under the same filters (active trials by default)
+        trials = get_global_map_cluster_trials(None, key=cell["key"], **filters)
+        self.assertEqual([t["id"] for t in trials["trials"]], ["P1", "P2"])
+        self.assertEqual(get_global_map_cluster_trials(None, key=site["key"], status=None, phase=None)["trial_count"], 1)
+        self.assertEqual(get_global_map_cluster_trials(None, key="99/1", **filters).status_code, 400)
+
+    def test_summary_views_refresh(self):
+        # Without a gene filter the charts read the materialized views, which only change on refresh
+        Trial.objects.create(
+            unique_protocol_id="P4", nct_id="NCT4", brief_title="New trial", overall_status="NOT_YET_RECRUITING",
+            study_phase="Phase 2", study_type="INTERVENTIONAL", lead_sponsor_name="Acme Therapeutics Inc",
+            study_start_date="2020-02-01",
+        )
+        self.assertEqual(get_trials_by_phase(None, status=["active_all"]), [{"name": "Phase 3", "value": 1}, {"name": "Unknown", "value": 1}])
+        refresh_summary_views()
+        self.assertEqual(
+            get_trials_by_phase(None, status=["active_all"]),
+            [{"name": "Phase 3", "value": 1}, {"name": "Phase 2", "value": 1}, {"name": "Unknown", "value": 1}],
+        )
+        self.assertEqual({f["name"]: f["value"] for f in get_funding_sources(None)}, {"Industry": 2, "Academic": 1, "Other": 1, "NIH/Federal": 0})
+        self.assertEqual(get_trials_by_year(None), [{"year": 2015, "count": 1}, {"year": 2020, "count": 2}])
+        self.assertEqual(CountrySummary.objects.filter(country="France").aggregate(n=Sum("trials"))["n"], 1)
+
+
+    def test_dashboard_package_cube(self):
+        cube = get_dashboard_cube()
+        self.assertEqual(cube['dimensions']['phase'], [None, "Phase 3", "Phase 2"])
+        self.assertIn("sod1", cube['dimensions']['gene'])
+        # Every precomputed cell matches the live computation
+        get_package = async_to_sync(get_dashboard_package)
+        for status, phase, gene, familial in [(None, None, None, False), ("recruiting", None, None, True), ("completed", "Phase 2", "sod10", False)]:
+            package = get_package(None, familial=familial, status=status, phase=phase, gene=gene)
+            self.assertEqual(package, _build_dashboard_package(None, status, phase, gene, familial))
+        self.assertEqual(get_package(None, status="RECRUITING")["stats"]["total_trials"], 1)
+        # Combinations outside the cube are computed live
+        with patch("Dashboard.api_analytics._build_dashboard_package", return_value={"live": True}):
+            self.assertEqual(get_package(None, gene="KIF5A"), {"live": True})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DashboardPackageSectionsTest(TransactionTestCase):
+    # Committed data, so the section threads (each on its own connection) can see it
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        Trial.objects.create(
+            unique_protocol_id="P1", nct_id="NCT1", brief_title="Trial", overall_status="RECRUITING",
+            study_phase="Phase 2", study_type="INTERVENTIONAL", enrollment_count=10,
+        )
+        refresh_summary_views()
+
+    def test_sections_run_concurrently(self):
+        with self.assertLogs("Dashboard.parallel", level="INFO") as logs:
+            package = _build_dashboard_package(None, None, "Phase 2", None, False)
+        self.assertEqual(package["stats"]["total_trials"], 1)
+        self.assertEqual(package["status_data"], [{"name": "RECRUITING", "value": 1}])
+        self.assertEqual(list(package), list(DASHBOARD_PACKAGE_SECTIONS))
+        self.assertIn("status_data=", logs.output[0])
+
+
+class DuckDBEngineTest(SimpleTestCase):
+
+    def setUp(self):
+        self.setup_calls = 0
+
+        def setup(con):
+            self.setup_calls += 1
+            con.execute("CREATE SCHEMA replica")
+            con.execute("CREATE TABLE replica.trials AS SELECT range AS id, range % 3 AS phase FROM range(30)")
+            return 'memory.replica'
+
+        self.engine = DuckDBEngine(setup=setup, max_cursors=2)
+
+    def test_setup_runs_once_and_queries_are_parameterized(self):
+        for phase in (0, 1):
+            df = self.engine.query("SELECT count(*) AS n FROM trials WHERE phase = ?", [phase])
+            self.assertEqual(int(df["n"][0]), 10)
+        self.assertEqual(self.setup_calls, 1)
+        self.engine.reset()
+        self.engine.query("SELECT 1")
+        self.assertEqual(self.setup_calls, 2)
+
+    def test_reset_waits_for_open_cursors(self):
+        with self.engine.cursor() as cursor:
+            old = self.engine._connection
+            self.engine.reset()
+            # A query running on the old connection is not cut off
+            self.assertEqual(cursor.execute("SELECT count(*) FROM trials").fetchone(), (30,))
+            self.assertEqual(int(self.engine.query("SELECT count(*) AS n FROM trials")["n"][0]), 30)
+        self.assertEqual(self.setup_calls, 2)
+        with self.assertRaises(duckdb.ConnectionException):
+            old.execute("SELECT 1")
+
+    def test_concurrent_cursors_are_capped(self):
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def work():
+            with self.engine.cursor() as cursor:
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                cursor.execute("SELECT sum(id) FROM trials").fetchall()
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertLessEqual(peak[0], 2)
+
+    def test_run_analytical_query_resets_a_broken_attachment(self):
+        with patch("Dashboard.utils.postgres_engine") as engine:
+            engine.query.side_effect = duckdb.IOException("connection lost")
+            self.assertTrue(run_analytical_query("SELECT 1").empty)
+            engine.reset.assert_called_once()
+
+
+class AnalyticsReplicaTest(TestCase):
+
+    def setUp(self):
+        replica_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(replica_dir.cleanup)
+        settings_override = override_settings(ANALYTICS_REPLICA_DIR=replica_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.root = replica_dir.name
+
+        gene = Gene.objects.create(gene_symbol="SOD1", gene_name="Superoxide Dismutase 1", gene_risk_category="Definitive ALS gene")
+        for i, (status, enrollment, genes) in enumerate([("RECRUITING", 40, ["SOD1"]), ("COMPLETED", 120, ["C9orf72_x"]), ("RECRUITING", None, None)]):
+            trial = Trial.objects.create(
+                unique_protocol_id=f"P{i}", nct_id=f"NCT{i}", brief_title=f"Study {i}", overall_status=status,
+                enrollment_count=enrollment, study_start_date=f"202{i}-01-01", genes=genes,
+            )
+            trial.sites.create(country="France", city="Paris")
+        Trial.objects.get(pk="P0").related_genes.add(gene)
+
+    def run_query(self, filters, logic='AND'):
+        request = MagicMock(body=json.dumps({"filters": filters, "logic": logic}))
+        return execute_query(request)
+
+    def test_query_builder_matches_the_orm(self):
+        cases = [
+            ([{"field": "overall_status", "operator": "equals", "value": "RECRUITING"}], 'AND'),
+            ([{"field": "enrollment_count", "operator": "gte", "value": "40"}], 'AND'),
+            ([{"field": "genes", "operator": "contains", "value": "sod"}, {"field": "study_start_date", "operator": "gt", "value": "2021-06-01"}], 'OR'),
+            ([{"field": "genes", "operator": "contains", "value": "9orf72_"}], 'AND'),
+            ([{"field": "genes", "operator": "contains", "value": "9orf72%"}], 'AND'),
+            ([{"field": "brief_title", "operator": "starts_with", "value": "study"}], 'AND'),
+        ]
+        orm = [self.run_query(*case) for case in cases]
+        snapshot_replica()
+        for case, expected in zip(cases, orm):
+            self.assertEqual(self.run_query(*case), expected, case)
+        self.assertEqual([r["total_count"] for r in orm], [2, 2, 2, 1, 0, 3])
+
+    def test_query_builder_order_and_json_equality_match_the_orm(self):
+        # Inserted last, sorts first
+        Trial.objects.create(unique_protocol_id="A9", nct_id="NCTA9", overall_status="RECRUITING", study_location=[{"country": "France", "city": "Paris"}])
+        cases = [
+            ([{"field": "overall_status", "operator": "equals", "value": "RECRUITING"}], 'AND'),
+            # jsonb equality ignores key order
+            ([{"field": "study_location", "operator": "equals", "value": [{"city": "Paris", "country": "France"}]}], 'AND'),
+        ]
+        orm = [self.run_query(*case) for case in cases]
+        self.assertEqual([r["nct_id"] for r in orm[0]["results"]], ["NCTA9", "NCT0", "NCT2"])
+        self.assertEqual(orm[1]["total_count"], 1)
+        snapshot_replica()
+        for case, expected in zip(cases, orm):
+            self.assertEqual(self.run_query(*case), expected, case)
+
+    def test_snapshots_are_versioned_and_pruned(self):
+        snapshot_replica()
+        joined = query_replica(
+            "SELECT g.gene_symbol, count(*) AS n FROM trials t JOIN trial_genes tg ON tg.trial_id = t.unique_protocol_id "
+            "JOIN genes g ON g.id = tg.gene_id JOIN sites s ON s.trial_id = t.unique_protocol_id WHERE s.country = ? GROUP BY 1",
+            ["France"],
+        )
+        self.assertEqual(joined.to_dict("records"), [{"gene_symbol": "SOD1", "n": 1}])
+
+        # Queries pick up a newer snapshot; only the latest versions stay on disk
+        Trial.objects.create(unique_protocol_id="P9", nct_id="NCT9")
+        versions = [snapshot_replica() for _ in range(REPLICA_KEEP_VERSIONS + 1)]
+        self.assertEqual(int(query_replica("SELECT count(*) AS n FROM trials")["n"][0]), 4)
+        self.assertEqual(current_version_dir(), os.path.join(self.root, versions[-1]))
+        self.assertEqual(sorted(name for name in os.listdir(self.root) if name != "CURRENT"), versions[1:])
+
+
+class StubSuperset(BaseHTTPRequestHandler):
+    """Minimal Superset security/dashboard API; tokens are unsigned JWTs expiring on the test clock."""
+    calls = Counter()
+    now = [1000.0]
+    login_delay = [0.0]
+
+    @classmethod
+    def token(cls, lifetime, **claims):
+        payload = base64.urlsafe_b64encode(json.dumps(dict(exp=cls.now[0] + lifetime, **claims)).encode()).decode()
+        return f"e30.{payload.rstrip('=')}.sig"
+
+    def reply(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.calls[self.path] += 1
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path == "/api/v1/security/login":
+            time.sleep(self.login_delay[0])
+            self.reply({"access_token": self.token(900), "refresh_token": self.token(86400)})
+        elif self.path == "/api/v1/security/refresh":
+            self.reply({"access_token": self.token(900)})
+        elif self.path == "/api/v1/security/guest_token/":
+            ok = self.headers.get("X-CSRFToken") == "csrf" and self.headers.get("Authorization", "").startswith("Bearer ")
+            self.reply({"token": self.token(300, n=self.calls[self.path])} if ok else {"msg": "CSRF"}, 200 if ok else 400)
+
+    def do_GET(self):
+        self.calls[self.path] += 1
+        if self.path == "/api/v1/security/csrf_token/":
+            self.reply({"result": "csrf"})
+        elif self.path == "/api/v1/dashboard/":
+            self.reply({"result": [{"id": 7}, {"id": 9}]})
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SupersetTokenBrokerTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        StubSuperset.calls.clear()
+        StubSuperset.now[0] = 1000.0
+        StubSuperset.login_delay[0] = 0.0
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubSuperset)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.broker = SupersetTokenBroker(f"http://127.0.0.1:{server.server_port}", "admin", "secret", clock=lambda: StubSuperset.now[0])
+
+    @async_to_sync
+    async def fetch(self):
+        async with httpx.AsyncClient(trust_env=False) as self.broker.client:
+            dashboard_id = await self.broker.dashboard_id()
+            return dashboard_id, await self.broker.guest_token(dashboard_id)
+
+    def test_tokens_and_dashboard_id_are_reused(self):
+        dashboard_id, token = self.fetch()
+        self.assertEqual(dashboard_id, "7")
+        for _ in range(5):
+            self.assertEqual(self.fetch(), (dashboard_id, token))
+        self.assertEqual(StubSuperset.calls, Counter({
+            "/api/v1/security/login": 1, "/api/v1/security/csrf_token/": 1,
+            "/api/v1/dashboard/": 1, "/api/v1/security/guest_token/": 1,
+        }))
+
+        # Past 75% of the guest token's 300s validity a new one is issued
+        StubSuperset.now[0] += 230
+        self.assertNotEqual(self.fetch()[1], token)
+        self.assertEqual(StubSuperset.calls["/api/v1/security/guest_token/"], 2)
+
+    def test_access_token_is_refreshed_before_expiry(self):
+        self.fetch()
+        StubSuperset.now[0] += 900 - ACCESS_TOKEN_REFRESH_MARGIN
+        cache.clear()
+        self.fetch()
+        self.assertEqual(StubSuperset.calls["/api/v1/security/refresh"], 1)
+        self.assertEqual(StubSuperset.calls["/api/v1/security/login"], 1)
+        self.assertEqual(StubSuperset.calls["/api/v1/security/guest_token/"], 2)
+
+
+    def test_one_login_across_event_loops(self):
+        # Under WSGI every async view runs in its own thread and event loop
+        StubSuperset.login_delay[0] = 0.2
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(async_to_sync(self.broker.access_token)())) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(tokens)), 1)
+        self.assertEqual(StubSuperset.calls["/api/v1/security/login"], 1)
+
+
+class AsyncOutboundViewsTest(TestCase):
+
+    def client_for(self, handler):
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def test_async_clients_follow_the_server(self):
+        async def clients():
+            return get_async_client(), get_async_client()
+
+        # Throwaway event loops (WSGI, tests) share the synchronous client's pool
+        self.assertIsInstance(async_to_sync(clients)()[0], ThreadedAsyncClient)
+
+        async def serve():
+            first, second = get_async_client(), get_async_client()
+            messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+            sent = []
+
+            async def receive():
+                return next(messages)
+
+            async def send(message):
+                sent.append(message["type"])
+
+            await lifespan({"type": "lifespan"}, receive, send)
+            return first, second, sent
+
+        with patch("Dashboard.http_client._long_lived_loops", True):
+            first, second, sent = async_to_sync(serve)()
+        # Under ASGI the loop keeps one client, closed at shutdown
+        self.assertIs(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+
+    def test_alphafold_structure_is_resolved_once(self):
+        gene = Gene.objects.create(gene_symbol="NEK1", gene_name="NIMA Related Kinase 1", gene_risk_category="Definitive ALS gene")
+        GeneStructure.objects.create(gene=gene, source_type=GeneStructure.SOURCE_ALPHAFOLD, external_id="Q96PY6", is_primary=True)
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(str(request.url))
+            return httpx.Response(200, json=[{"cifUrl": "https://alphafold.ebi.ac.uk/files/AF-Q96PY6-F1-model_v4.cif"}])
+
+        with patch("Dashboard.structures.get_async_client", return_value=self.client_for(handler)):
+            for _ in range(2):
+                data = async_to_sync(get_gene_structure)(None, "nek1")
+        self.assertEqual(data["structure"]["componentProps"]["custom-data-url"], "https://alphafold.ebi.ac.uk/files/AF-Q96PY6-F1-model_v4.cif")
+        self.assertEqual(requests_seen, ["https://alphafold.ebi.ac.uk/api/prediction/Q96PY6"])
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_missing_alphafold_model_is_not_looked_up_on_every_view(self):
+        cache.clear()
+        gene = Gene.objects.create(gene_symbol="NEK1", gene_name="NIMA Related Kinase 1", gene_risk_category="Definitive ALS gene")
+        GeneStructure.objects.create(gene=gene, source_type=GeneStructure.SOURCE_ALPHAFOLD, external_id="Q96PY6", is_primary=True)
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(str(request.url))
+            return httpx.Response(200, json=[])
+
+        with patch("Dashboard.structures.get_async_client", return_value=self.client_for(handler)):
+            for _ in range(3):
+                data = async_to_sync(get_gene_structure)(None, "nek1")
+        self.assertEqual(data["structure"]["external_id"], "Q96PY6")
+        self.assertEqual(len(requests_seen), 1)
+
+    def test_slow_upstream_requests_overlap(self):
+        page = (
+            "<table><tr><th>Site</th></tr>"
+            "<tr><td>Massachusetts General Hospital</td><td>MA</td><td>Enrolling</td>"
+            "<td><a class='none' href='mailto:als@mgh.org'>ALS Team</a></td></tr></table>"
+        )
+
+        async def handler(request):
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, text=page)
+
+        async def update_many():
+            return await asyncio.gather(*[update_healey_trial(None) for _ in range(5)])
+
+        started = time.perf_counter()
+        with patch("Dashboard.api.get_async_client", return_value=self.client_for(handler)):
+            responses = async_to_sync(update_many)()
+        self.assertLess(time.perf_counter() - started, 0.8)
+        self.assertEqual({response.status_code for response in responses}, {200})
+        site = HealeyTrial.objects.get()
+        self.assertEqual(site.trial_contact_info, [{"trial_contact_name": "ALS Team", "trial_contact_email": "als@mgh.org"}])
+
+
+class QueryInspectorTest(TestCase):
+
+    def setUp(self):
+        status = TrialStatus.objects.create(name="RECRUITING")
+        for i in range(6):
+            Trial.objects.create(unique_protocol_id=f"P{i}", nct_id=f"NCT{i}", genes=["SOD1"]).status.add(status)
+
+    def test_repeated_shapes_are_flagged(self):
+        self.assertEqual(query_shape('SELECT 1 WHERE id IN (%s, %s,\n %s)'), query_shape('SELECT 1 WHERE id IN (%s, %s)'))
+        with QueryInspector() as queries:
+            for trial in Trial.objects.all():
+                trial.status.first()
+        self.assertEqual(queries.count, 7)
+        self.assertEqual([times for _, times in queries.repeated()], [6])
+
+    def test_full_dataset_has_no_n_plus_one(self):
+        with QueryInspector() as queries:
+            _build_full_trials_dataset()
+        self.assertEqual(queries.repeated(), [])
+
+    @override_settings(QUERY_INSPECTOR_ENABLED=True)
+    def test_middleware_reports_queries(self):
+        with self.assertLogs("Dashboard.queries", level="INFO") as logs:
+            response = Client().get("/api/analytics/countries")
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="1 queries", app;dur=[\d.]+$')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record["path"], record["status"], record["queries"], record["repeated"]), ("/api/analytics/countries", 200, 1, []))
+
+
+class ProfilingMiddlewareTest(TestCase):
+
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        settings_override = override_settings(PROFILING_DIR=profile_dir.name, PROFILING_TOKEN="s3cret", PROFILING_MAX_FILES=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.dir = profile_dir.name
+
+    def test_only_authorized_requests_are_profiled(self):
+        client = Client()
+        self.assertNotIn("X-Profile-File", client.get("/api/analytics/countries", HTTP_X_PROFILE="cprofile"))
+        self.assertNotIn("X-Profile-File", client.get("/api/analytics/countries?_profile=1", HTTP_X_PROFILE_TOKEN="wrong"))
+        self.assertEqual(os.listdir(self.dir), [])
+
+        response = client.get("/api/analytics/countries?_profile=1", HTTP_X_PROFILE_TOKEN="s3cret")
+        self.assertEqual(response.status_code, 200)
+        name = response["X-Profile-File"]
+        self.assertTrue(name.endswith("-GET-api-analytics-countries.prof"))
+        stats = pstats.Stats(os.path.join(self.dir, name))
+        self.assertTrue(any(func[2] == "get_countries" for func in stats.stats))
+
+        # Rotation keeps the newest PROFILING_MAX_FILES profiles
+        names = [client.get("/api/analytics/countries", HTTP_X_PROFILE="sample", HTTP_X_PROFILE_TOKEN="s3cret")["X-Profile-File"] for _ in range(2)]
+        self.assertEqual(sorted(os.listdir(self.dir)), names)
+
+    def test_sampling_profiler_collapses_stacks(self):
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+        profiler.stop()
+        lines = profiler.collapsed().splitlines()
+        self.assertTrue(lines)
+        self.assertIn("test_sampling_profiler_collapses_stacks (tests.py:", lines[0])
+        self.assertTrue(lines[0].rsplit(" ", 1)[1].isdigit())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MetricsEndpointTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def test_exposes_route_latency_and_query_counts(self):
+        client = Client()
+        self.assertEqual(client.get("/api/analytics/countries").status_code, 200)
+        response = client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('dashboard_http_request_duration_seconds_count{method="GET",route="api/analytics/countries",status="200"}', body)
+        self.assertIn('dashboard_http_request_duration_seconds_bucket{method="GET",route="api/analytics/countries",status="200",le="+Inf"}', body)
+        self.assertIn('dashboard_db_queries_total{route="api/analytics/countries"}', body)
+
+    def test_async_requests_stay_async_and_are_counted(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(view)))
+        self.assertTrue(iscoroutinefunction(ProfilingMiddleware(view)))
+        self.assertFalse(iscoroutinefunction(MetricsMiddleware(lambda request: HttpResponse())))
+
+        route = "api/genes/<symbol>/structure"
+        before = DB_QUERIES._values.get((route,), 0)
+        response = async_to_sync(AsyncClient().get)("/api/genes/NOPE/structure")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(DB_QUERIES._values[(route,)], before + 1)
+        with override_settings(QUERY_INSPECTOR_ENABLED=True):
+            response = async_to_sync(AsyncClient().get)("/api/genes/NOPE/structure")
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+    def test_counts_cache_lookups_by_result(self):
+        def lookups(result):
+            return CACHE_LOOKUPS._values.get(("metrics_test", result), 0)
+
+        before = lookups("miss"), lookups("local_hit")
+        get_or_build("metrics_test", lambda: {"built": True})
+        get_or_build("metrics_test", lambda: {"built": True})
+        self.assertEqual((lookups("miss"), lookups("local_hit")), (before[0] + 1, before[1] + 1))
+
+    def test_sync_stages_are_reported(self):
+        with sync_stage("trials", "fetch") as stage:
+            stage.rows = 42
+        record_sync_error("news", "fetch")
+        with self.assertRaises(ValueError):
+            with sync_stage("genes", "upsert"):
+                raise ValueError("boom")
+
+        body = registry.render()
+        self.assertIn('dashboard_sync_stage_rows{sync="trials",stage="fetch"} 42', body)
+        self.assertIn('dashboard_sync_stage_last_success_timestamp_seconds{sync="trials",stage="fetch"}', body)
+        self.assertIn('dashboard_sync_stage_errors_total{sync="news",stage="fetch"} 1', body)
+        self.assertIn('dashboard_sync_stage_errors_total{sync="genes",stage="upsert"} 1', body)
+        self.assertNotIn('dashboard_sync_stage_last_success_timestamp_seconds{sync="genes"', body)
+
+    def test_overlapping_syncs_keep_every_stage_and_error(self):
+        def news():
+            for _ in range(50):
+                record_sync_error("news", "fetch")
+
+        def trials():
+            for _ in range(50):
+                with sync_stage("trials", "upsert") as stage:
+                    stage.rows = 3
+
+        threads = [threading.Thread(target=news), threading.Thread(target=news), threading.Thread(target=trials)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        async_to_sync(self.async_stage)()
+
+        stages = sync_stage_results()
+        self.assertEqual(stages["news:fetch"]["errors"], 100)
+        self.assertEqual((stages["trials:upsert"]["rows"], stages["trials:upsert"]["errors"]), (3, 0))
+        self.assertEqual(stages["healey:fetch"]["rows"], 1)
+
+    async def async_stage(self):
+        async with async_sync_stage("healey", "fetch") as stage:
+            stage.rows = 1
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_is_required_when_configured(self):
+        client = Client()
+        self.assertEqual(client.get("/metrics").status_code, 401)
+        self.assertEqual(client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BenchmarkSuiteTest(TestCase):
+
+    def test_every_analytics_route_is_benchmarked(self):
+        routes = {(method, f"/api/analytics{path}") for path, view in analytics_router.path_operations.items() for operation in view.operations for method in operation.methods}
+        self.assertLessEqual(routes, {(method, path) for method, path, _ in BENCHMARK_ENDPOINTS})
+
+    def test_synthetic_corpus(self):
+        self.assertEqual(synthetic_trial(7, seed=1), synthetic_trial(7, seed=1))
+        self.assertNotEqual(synthetic_trial(7, seed=1), synthetic_trial(7, seed=2))
+        # Corpora grow in place
+        seed_synthetic_trials(20)
+        seed_synthetic_trials(50, start=20)
+        self.assertEqual(Trial.objects.count(), 50)
+        trial = Trial.objects.get(unique_protocol_id="SYN-0000026")
+        expected = synthetic_trial(26)
+        self.assertEqual(trial.sites.count(), len(expected["study_location"]))
+        self.assertEqual(sorted(trial.related_genes.values_list("gene_symbol", flat=True)), expected["genes"])
+        self.assertEqual(trial.gene_symbols, [g.lower() for g in expected["genes"]])
+        seed_synthetic_news(5)
+        seed_synthetic_news(8, start=5)
+        article = NewsArticle.objects.get(url=synthetic_news_article(6)["url"])
+        self.assertEqual(list(article.related_genes.values_list("gene_symbol", flat=True)), [synthetic_news_article(6)["gene"]])
+        self.assertEqual(len(get_latest_news(None)), 3)
+
+    def test_run_benchmarks(self):
+        seed_synthetic_trials(30)
+        refresh_summary_views()
+        results = run_benchmarks(repeat=2, only="trials-by-phase")
+        self.assertEqual(set(results["endpoints"]), {"GET /api/analytics/trials-by-phase", "GET /api/analytics/trials-by-phase?gene=SOD1"})
+        self.assertEqual(results["builders"], {})
+        gene_filtered = results["endpoints"]["GET /api/analytics/trials-by-phase?gene=SOD1"]
+        self.assertEqual(set(gene_filtered["cold"]), {"runs", "p50_ms", "p95_ms", "queries", "peak_memory_mb"})
+        # Cold runs build the trial index, warm ones read it from the local cache
+        self.assertGreater(gene_filtered["cold"]["queries"], 0)
+        self.assertEqual(gene_filtered["warm"]["queries"], 0)
+        self.assertGreater(gene_filtered["payload_bytes"], 0)
+
+    def test_budget_check(self):
+        budget = {"analytics": {"scale": 100, "endpoints": {"GET /api/trials/": {"cold": {"p95_ms": 50, "queries": 3}, "payload_bytes": 1000}}}}
+        measured = {"analytics": {"endpoints": {"GET /api/trials/": {"cold": {"p95_ms": 20.0, "queries": 5}}}}}
+        baseline = {"analytics": {"scales": {"100": {"endpoints": {"GET /api/trials/": {"cold": {"queries": 2}}}}}}}
+        rows = {row["path"][-1]: row for row in check_budget(budget, measured, baseline)}
+        self.assertTrue(rows["p95_ms"]["ok"])
+        self.assertIsNone(rows["p95_ms"]["baseline"])
+        self.assertFalse(rows["queries"]["ok"])
+        self.assertEqual(rows["queries"]["baseline"], 2)
+        # A budgeted value that was not measured fails rather than passing silently
+        self.assertFalse(rows["payload_bytes"]["ok"])
+
+    def test_shipped_budget_names_benchmarked_endpoints(self):
+        with open(settings.BENCHMARK_BUDGET) as handle:
+            budget = json.load(handle)
+        self.assertLessEqual(set(budget["analytics"]["endpoints"]), {endpoint_name(*endpoint) for endpoint in BENCHMARK_ENDPOINTS})
+        self.assertLessEqual(set(budget["analytics"]["builders"]), set(BENCHMARK_BUILDERS))
+        self.assertLessEqual(set(budget["ingest"]["stages"]), {"fetch", "enhance", "update_initial", "update_resync"})
+        # The shipped budget and baseline come from the same run
+        with open(settings.BENCHMARK_BASELINE) as handle:
+            baseline = json.load(handle)
+        for section, spec in budget.items():
+            self.assertEqual(derive_budget(spec, baseline[section]["scales"][str(spec["scale"])]), spec)
+
+    def test_derived_budget_catches_a_doubling(self):
+        spec = {"scale": 100, "endpoints": {"GET /api/trials/": {"cold": {"p95_ms": 1, "queries": 1, "peak_memory_mb": 1}, "warm": {"p95_ms": 1}, "payload_bytes": 1}}}
+        measured = {"endpoints": {"GET /api/trials/": {"cold": {"p95_ms": 5143.2, "queries": 10001, "peak_memory_mb": 47.04}, "warm": {"p95_ms": 3.1}, "payload_bytes": 2}}}
+        derived = derive_budget(spec, measured)
+        self.assertEqual(derived["endpoints"]["GET /api/trials/"], {"cold": {"p95_ms": 7715, "queries": 11002, "peak_memory_mb": 71}, "warm": {"p95_ms": 14}, "payload_bytes": 3})
+        doubled = {"analytics": {"endpoints": {"GET /api/trials/": {"cold": {"p95_ms": 10286.4}}}}}
+        self.assertFalse(check_budget({"analytics": derived}, doubled)[0]["ok"])
+        with self.assertRaises(ValueError):
+            derive_budget(spec, {"endpoints": {}})
+
+    def test_budget_is_derived_from_the_slowest_round(self):
+        spec = {"scale": 100, "stages": {"fetch": {"p95_ms": 1, "queries": 1}}}
+        rounds = [{"studies": 100, "stages": {"fetch": {"p50_ms": 90, "p95_ms": 100, "queries": 4}}}, {"stages": {"fetch": {"p95_ms": 130, "queries": 3}}}]
+        self.assertEqual(slowest_result(spec, rounds), {"studies": 100, "stages": {"fetch": {"p50_ms": 90, "p95_ms": 130, "queries": 4}}})
+        self.assertEqual(rounds[0]["stages"]["fetch"]["p95_ms"], 100)
+
+    def test_exceeded_thresholds_are_measured_again(self):
+        spec = {"scale": 100, "endpoints": {"GET /a": {"cold": {"p95_ms": 100}}, "GET /b": {"cold": {"p95_ms": 100}}}}
+        result = {"endpoints": {"GET /a": {"cold": {"p95_ms": 150}}, "GET /b": {"cold": {"p95_ms": 90}}}}
+        # A slow run that does not reproduce passes
+        remeasure = MagicMock(return_value={"endpoints": {"GET /a": {"cold": {"p95_ms": 95}}}})
+        self.assertEqual(confirm_exceeded("analytics", spec, result, remeasure), [("endpoints", "GET /a", "cold", "p95_ms")])
+        remeasure.assert_called_once_with([("endpoints", "GET /a", "cold", "p95_ms")])
+        self.assertTrue(all(row["ok"] for row in check_budget({"analytics": spec}, {"analytics": result})))
+        # A reproducible regression fails
+        result["endpoints"]["GET /b"]["cold"]["p95_ms"] = 200
+        confirm_exceeded("analytics", spec, result, lambda paths: {"endpoints": {"GET /b": {"cold": {"p95_ms": 210}}}})
+        self.assertEqual(result["endpoints"]["GET /b"]["cold"]["p95_ms"], 210)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SyntheticIngestTest(TestCase):
+
+    def test_studies_page_through_next_page_token(self):
+        first = synthetic_studies_page(25, page_size=10)
+        self.assertEqual(len(first["studies"]), 10)
+        self.assertEqual(decode_page_token(first["nextPageToken"]), 10)
+        last = synthetic_studies_page(25, first["nextPageToken"], page_size=20)
+        self.assertEqual(len(last["studies"]), 15)
+        self.assertNotIn("nextPageToken", last)
+        self.assertIsNone(synthetic_studies_page(25, "bogus"))
+
+        study = synthetic_study(26)["protocolSection"]
+        self.assertEqual(study["identificationModule"]["orgStudyIdInfo"]["id"], "SYN-0000026")
+        self.assertEqual(len(study["contactsLocationsModule"]["locations"]), len(synthetic_trial(26)["study_location"]))
+        self.assertTrue(study["eligibilityModule"]["eligibilityCriteria"].startswith("Inclusion Criteria:"))
+
+    def test_stub_server_feeds_the_sync(self):
+        with SyntheticSourcesServer(100) as server, override_settings(CTGOV_STUDIES_URL=server.studies_url, ALSOD_URL=server.alsod_url):
+            pages = []
+            token = None
+            while True:
+                page = requests.get(server.studies_url, params={"pageSize": 40, **({"pageToken": token} if token else {})}).json()
+                pages.append(len(page["studies"]))
+                token = page.get("nextPageToken")
+                if not token:
+                    break
+            self.assertEqual(pages, [40, 40, 20])
+            self.assertEqual(requests.get(server.studies_url, params={"pageToken": "bogus"}).status_code, 400)
+
+            genes = scrape_alsod_gene_list()
+            self.assertIn("SOD1", genes["Gene Symbol"].tolist())
+            with redirect_stdout(io.StringIO()):
+                trials = fetch_trial_data()
+        # Out-of-scope studies are filtered out, the rest keep their identifiers
+        kept = {f"NCT9{i:07d}" for i in range(100) if synthetic_study(i)["protocolSection"]["conditionsModule"]["conditions"][0] not in SYNTHETIC_EXCLUDED_CONDITIONS}
+        self.assertEqual(len(kept), 98)
+        self.assertEqual(set(trials["nct_id"]), kept)
+
+    def test_ingest_benchmark(self):
+        result = run_ingest_benchmark(30, repeat=1)
+        self.assertEqual(set(result["stages"]), {"fetch", "enhance", "update_initial", "update_resync"})
+        self.assertEqual(result["pages"], 1)
+        self.assertEqual(result["ingested_trials"], Trial.objects.count())
+        self.assertGreater(result["stages"]["update_initial"]["queries"], result["ingested_trials"])
+        self.assertEqual(result["sync_stages"]["trials:upsert"]["rows"], result["ingested_trials"])
+        trial = Trial.objects.get(unique_protocol_id="SYN-0000026")
+        self.assertEqual(sorted(trial.genes), ["ANXA11", "SOD1"])
+        self.assertEqual(trial.sites.count(), len(synthetic_trial(26)["study_location"]))
+
+
+class HttpCassetteTest(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "cassettes", "sync.jsonl.gz")
+
+    def test_replays_a_recorded_sync_without_the_network(self):
+        with SyntheticSourcesServer(60) as server, override_settings(CTGOV_STUDIES_URL=server.studies_url):
+            with use_cassette(self.path, "record"), redirect_stdout(io.StringIO()):
+                recorded = fetch_trial_data()
+            self.assertEqual(server.requests, 1)
+        with open(self.path, "rb") as handle:
+            self.assertEqual(handle.read(2), b"\x1f\x8b")
+
+        # The stub server is gone: the sync now runs off the cassette, as often as needed
+        with override_settings(CTGOV_STUDIES_URL=server.studies_url), use_cassette(self.path, "replay"), redirect_stdout(io.StringIO()):
+            replayed = fetch_trial_data()
+            again = fetch_trial_data()
+        pd.testing.assert_frame_equal(replayed, recorded)
+        pd.testing.assert_frame_equal(again, recorded)
+
+    def test_async_recording_replays_through_the_sync_client(self):
+        async def fetch(url):
+            try:
+                return await get_async_client().get(url, params={"pageSize": 2, "format": "json"}, headers={"Authorization": "Bearer secret"})
+            finally:
+                await close_async_client()
+
+        with SyntheticSourcesServer(5) as server:
+            with use_cassette(self.path, "record"):
+                recorded = async_to_sync(fetch)(server.studies_url)
+            with use_cassette(self.path, "replay"):
+                # Query order and request headers do not matter
+                replayed = get_client().get(server.studies_url, params={"format": "json", "pageSize": 2})
+                with self.assertRaises(CassetteMiss), self.assertLogs("Dashboard.cassettes", "WARNING"):
+                    get_client().get(server.studies_url, params={"pageSize": 3})
+            self.assertEqual(server.requests, 1)
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed.json(), recorded.json())
+        with gzip.open(self.path, "rt") as handle:
+            self.assertNotIn("secret", handle.read())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TrialFacetsTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        trials = [
+            {"id": "A", "status": "Recruiting", "phase": "Phase 2", "studyType": "Interventional", "genes": ["SOD1"], "interventionTypes": ["DRUG"], "locations": [{"country": "United States"}]},
+            {"id": "B", "status": "Recruiting", "phase": "Phase 3", "studyType": "Interventional", "genes": ["SOD1", "FUS"], "interventionTypes": [], "locations": [{"country": "france"}]},
+            {"id": "C", "status": "Not Yet Recruiting", "phase": "Phase 2", "studyType": "Observational", "genes": [], "interventionTypes": ["DRUG"], "locations": []},
+        ]
+        patcher = patch('Dashboard.api_analytics._get_active_trials_list', return_value=trials)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counts_ignore_own_facet_selection(self):
+        data = get_trial_facet_search(None, status=None, phase=["Phase 2"], study_type=None, gene=["SOD1"], intervention_type=None, country=None)
+        self.assertEqual(data["ids"], ["A"])
+        # Phase counts only apply the gene selection, gene counts only the phase selection
+        self.assertEqual(data["facets"]["phase"], {"Phase 2": 1, "Phase 3": 1})
+        self.assertEqual(data["facets"]["gene"], {"FUS": 0, "SOD1": 1})
+        self.assertEqual(data["facets"]["intervention_type"], {"Drug": 1, "Not Specified": 0})
+
+    def test_filter_options_lists_every_value(self):
+        options = get_filter_options(None, status=None, phase=["Phase 3", "Phase 2"], study_type=None, gene=None, intervention_type=None, country=["France"])
+        self.assertEqual(options["genes"], ["FUS", "SOD1"])
+        self.assertEqual(options["intervention_types"], ["Drug", "Not Specified"])
+        self.assertEqual(options["counts"]["country"], {"France": 1, "United States": 1})
+        self.assertEqual(options["counts"]["status"], {"Not Yet Recruiting": 0, "Recruiting": 1})
+
+
+class TrialSearchTest(TestCase):
+
+    def setUp(self):
+        Trial.objects.create(
+            unique_protocol_id="P1", nct_id="NCT00000001", brief_title="Exercise and ALS",
+            brief_description="An exercise program. Participants may continue taking riluzole during the study.",
+            overall_status="RECRUITING",
+        )
+        Trial.objects.create(
+            unique_protocol_id="P2", nct_id="NCT00000002", brief_title="Riluzole dosing in ALS",
+            brief_description="Higher riluzole doses.", lead_sponsor_name="Sanofi",
+            overall_status="COMPLETED", condition=["Amyotrophic Lateral Sclerosis"],
+        )
+        Trial.objects.create(
+            unique_protocol_id="P3", nct_id="NCT00000003", brief_title="Tofersen in SOD1-ALS",
+            keyword=["antisense"], overall_status="RECRUITING",
+        )
+
+    def search(self, text, **filters):
+        params = dict(page=1, per_page=25, status=None, phase=None, study_type=None, gene=None, country=None, sort_by='-status_verified_date', sort_order='desc')
+        params.update(filters)
+        return get_trials_list(None, search=text, **params)
+
+    def test_results_are_ranked_by_weighted_fields(self):
+        data = self.search("riluzole")
+        # Title matches outrank summary-only matches
+        self.assertEqual([t["id"] for t in data["trials"]], ["P2", "P1"])
+        self.assertEqual(data["pagination"]["total_count"], 2)
+        self.assertIn("<mark>Riluzole</mark>", data["trials"][0]["highlights"]["title"])
+        self.assertIn("<mark>riluzole</mark>", data["trials"][1]["highlights"]["summary"])
+
+    def test_search_vector_follows_updates_and_json_fields(self):
+        self.assertEqual([t["id"] for t in self.search("antisense")["trials"]], ["P3"])
+        self.assertEqual([t["id"] for t in self.search("sclerosis", status=["completed"])["trials"]], ["P2"])
+        self.assertEqual([t["id"] for t in self.search("NCT00000003")["trials"]], ["P3"])
+
+        Trial.objects.filter(pk="P3").update(keyword=["gene therapy"])
+        self.assertEqual(self.search("antisense")["trials"], [])
+
+
+class FuzzyLookupTest(TestCase):
+
+    def setUp(self):
+        for i, sponsor in enumerate(["Biogen", "Biogen", "Cytokinetics", "Massachusetts General Hospital"]):
+            Trial.objects.create(unique_protocol_id=f"P{i}", nct_id=f"NCT{i}", brief_title=f"Trial {i}", lead_sponsor_name=sponsor)
+        HealeyTrial.objects.create(facility="Massachusetts General Hospital", state="MA")
+
+    def test_matches_misspellings(self):
+        [match] = fuzzy_lookup(None, q="biogn", field="sponsor", threshold=0.3, limit=10)
+        self.assertEqual((match["value"], match["count"]), ("Biogen", 2))
+
+        matches = fuzzy_lookup(None, q="Massachusets Generl", field="facility", threshold=0.3, limit=10)
+        self.assertEqual([m["value"] for m in matches], ["Massachusetts General Hospital"])
+
+    def test_threshold_and_field_validation(self):
+        self.assertEqual(fuzzy_lookup(None, q="biogn", field="sponsor", threshold=0.9, limit=10), [])
+        self.assertEqual(fuzzy_lookup(None, q="x", field="investigator", threshold=0.3, limit=10).status_code, 400)
+
+
+class TrialsListFilterTest(TestCase):
+
+    def setUp(self):
+        Trial.objects.create(unique_protocol_id="P1", nct_id="NCT1", genes=["SOD1"], study_location=[{"city": "Paris", "country": "France"}])
+        Trial.objects.create(unique_protocol_id="P2", nct_id="NCT2", genes=["SOD10"], study_location=[{"country": "French Guiana"}])
+        Trial.objects.create(unique_protocol_id="P3", nct_id="NCT3", genes="not a list", study_location=None)
+
+    def ids(self, **filters):
+        params = dict(page=1, per_page=25, status=None, phase=None, study_type=None, gene=None, search=None, country=None, sort_by='nctId', sort_order='asc')
+        params.update(filters)
+        return [t["id"] for t in get_trials_list(None, **params)["trials"]]
+
+    def test_gene_and_country_match_whole_values(self):
+        self.assertEqual(self.ids(gene="sod1"), ["P1"])
+        self.assertEqual(self.ids(gene="SOD10"), ["P2"])
+        self.assertEqual(self.ids(country="FRANCE"), ["P1"])
+        self.assertEqual(self.ids(country="Fran"), [])
+
+    def test_derived_arrays_follow_json_updates(self):
+        Trial.objects.filter(pk="P3").update(genes=["FUS"], study_location=[{"LocationCountry": "Japan"}, "bad entry"])
+        self.assertEqual(self.ids(gene="fus", country="japan"), ["P3"])
+
+
+class KeysetPaginationTest(TestCase):
+
+    def setUp(self):
+        # Ties and NULLs in the sort keys
+        for i, (verified, start, enrollment) in enumerate([
+            ("2024-01-01", "2020-01-01", 10), ("2024-01-01", None, None), (None, "2019-01-01", 10),
+            ("2023-06-01", "2018-01-01", 5), (None, None, None), ("2024-01-01", "2020-01-01", 30),
+        ]):
+            Trial.objects.create(unique_protocol_id=f"P{i}", nct_id=f"NCT{i}", status_verified_date=verified, study_start_date=start, enrollment_count=enrollment)
+
+    def walk(self, **params):
+        params = {**dict(per_page=2, status=None, phase=None, study_type=None, gene=None, search=None, country=None, total='none'), **params}
+        ids, cursor = [], None
+        while True:
+            data = get_trials_list(None, cursor=cursor, **params)
+            ids += [t["id"] for t in data["trials"]]
+            cursor = data["pagination"]["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_cursor_pages_follow_the_sort_order(self):
+        for sort_by, sort_order in [('-status_verified_date', 'desc'), ('enrollment', 'desc'), ('enrollment', 'asc'), ('lastUpdated', 'asc')]:
+            expected = [t["id"] for t in get_trials_list(None, page=1, per_page=25, status=None, phase=None, study_type=None, sort_by=sort_by, sort_order=sort_order)["trials"]]
+            self.assertEqual(self.walk(sort_by=sort_by, sort_order=sort_order), expected)
+            self.assertEqual(len(expected), 6)
+
+    def test_cursor_pages_follow_search_rank(self):
+        # ts_rank values (real) are not exactly representable as Python floats, and some tie
+        for i, (title, summary) in enumerate([
+            ("Riluzole", "Riluzole dosing"), ("Riluzole riluzole", None), ("Edaravone", "Compared with riluzole"),
+            ("Riluzole", "Riluzole dosing"), ("Riluzole in FTD", "Riluzole and riluzole"),
+        ]):
+            Trial.objects.create(unique_protocol_id=f"S{i}", nct_id=f"NCTS{i}", brief_title=title, brief_description=summary)
+        expected = [t["id"] for t in get_trials_list(None, page=1, per_page=25, status=None, phase=None, study_type=None, search="riluzole")["trials"]]
+        self.assertEqual(len(expected), 5)
+        # One row per page puts a cursor between the tied S0 and S3
+        self.assertEqual(self.walk(search="riluzole", per_page=1), expected)
+
+    def test_cursor_is_stable_and_validated(self):
+        first = get_trials_list(None, page=1, per_page=2, status=None, phase=None, study_type=None, total='exact')
+        self.assertEqual(first["pagination"]["total_count"], 6)
+        expected = self.walk(sort_by='-status_verified_date', sort_order='desc')
+        # A row inserted before the cursor (NULL dates sort first) does not shift the next page
+        Trial.objects.create(unique_protocol_id="P00", nct_id="NCT00")
+        second = get_trials_list(None, per_page=2, status=None, phase=None, study_type=None, cursor=first["pagination"]["next_cursor"])
+        self.assertEqual([t["id"] for t in second["trials"]], expected[2:4])
+        self.assertIsNone(second["pagination"]["page"])
+        self.assertEqual(get_trials_list(None, status=None, phase=None, study_type=None, cursor="bogus").status_code, 400)
+        other_sort = get_trials_list(None, status=None, phase=None, study_type=None, sort_by='nctId', cursor=first["pagination"]["next_cursor"])
+        self.assertEqual(other_sort.status_code, 400)
+        self.assertIsInstance(get_trials_list(None, status=None, phase=None, study_type=None, total='estimate')["pagination"]["total_count"], int)
+
+    def test_news_cursor(self):
+        published = make_aware(datetime(2024, 5, 1, 12, 0, 0, 123456))
+        for i in range(3):
+            NewsArticle.objects.create(title=f"Article {i}", url=f"https://example.com/{i}", publication_date=published)
+        response = HttpResponse()
+        first = get_news(None, response, genes=None, limit=2, total='exact')
+        self.assertEqual(response['X-Total-Count'], "3")
+        rest = get_news(None, HttpResponse(), genes=None, limit=2, cursor=response['X-Next-Cursor'])
+        self.assertEqual([a.title for a in first + rest], ["Article 2", "Article 1", "Article 0"])
+
+    def test_zero_limit(self):
+        NewsArticle.objects.create(title="Article", url="https://example.com/a", publication_date=make_aware(datetime(2024, 5, 1)))
+        response = Client().get("/api/news/", {"limit": 0})
+        self.assertEqual((response.status_code, response.json()), (200, []))
+        self.assertNotIn("X-Next-Cursor", response)
+        self.assertEqual(paginate_offset(Trial.objects.order_by("unique_protocol_id"), 1, 0), ([], None))
+        self.assertEqual(get_trials_list(None, per_page=0, status=None, phase=None, study_type=None).status_code, 400)
@@ -0,0 +1,381 @@
+import datetime
+import re
+from collections import defaultdict
+
+import numpy as np
+from django.db.models import Prefetch
+
+from .caching import get_or_build
+from .models import Trial, Gene, TrialSite
+
+TRIAL_INDEX_CACHE_KEY = 'analytics_trial_index_v2'
+
+# Frontend status groups, shared with apply_analytics_filters
+STATUS_GROUPS = {
+    'recruiting': ['RECRUITING', 'ENROLLING_BY_INVITATION'],
+    'active': ['ACTIVE_NOT_RECRUITING'],
+    'completed': ['COMPLETED'],
+    # Actionable/Active trials for patients
+    'active_all': ['RECRUITING', 'ENROLLING_BY_INVITATION', 'NOT_YET_RECRUITING', 'AVAILABLE'],
+    'inactive': ['COMPLETED', 'TERMINATED', 'WITHDRAWN', 'SUSPENDED', 'UNKNOWN', 'NO_LONGER_AVAILABLE']
+}
+
+# Sponsor categories, in display order
+FUNDING_CATEGORIES = ['NIH/Federal', 'Industry', 'Academic', 'Other']
+FEDERAL_KEYWORDS = ['nih', 'national institutes', 'national institute', 'federal', 'government', 'va ', 'veterans']
+INDUSTRY_KEYWORDS = ['pharma', 'therapeutics', 'inc', 'corp', 'ltd', 'llc', 'biogen', 'novartis', 'roche', 'pfizer', 'sanofi', 'lilly', 'gsk', 'astrazeneca']
+ACADEMIC_KEYWORDS = ['university', 'college', 'hospital', 'medical center', 'school of medicine', 'institute', 'foundation']
+
+# Intervention types counted as drugs on the genetic-markers chart
+DRUG_INTERVENTION_TYPES = ['drug', 'biological', 'genetic']
+
+# Grid pyramid for the global map: zoom z uses square cells of 360 / 2**z degrees
+MAP_MAX_GRID_ZOOM = 12
+
+# Number of set bits for every byte value, used to count packed bitmaps
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def expand_status_filter(status):
+    """Maps frontend status groups (e.g. 'active_all') to raw overall_status values."""
+    combined_statuses = []
+    for s in status:
+        combined_statuses.extend(STATUS_GROUPS.get(s.lower(), [s.upper()]))
+    return combined_statuses
+
+
+def categorize_sponsor(sponsor_name):
+    sponsor = (sponsor_name or '').lower()
+    if any(kw in sponsor for kw in FEDERAL_KEYWORDS):
+        return 'NIH/Federal'
+    if any(kw in sponsor for kw in INDUSTRY_KEYWORDS):
+        return 'Industry'
+    if any(kw in sponsor for kw in ACADEMIC_KEYWORDS):
+        return 'Academic'
+    return 'Other'
+
+
+def grid_cells(lat, lon, zoom):
+    """Row-major code of the zoom-level grid cell containing each (lat, lon)."""
+    size = 360.0 / (1 << zoom)
+    columns = 1 << zoom
+    rows = np.floor((np.asarray(lat, dtype=float) + 90.0) / size).astype(np.int64)
+    cols = np.minimum(np.floor((np.asarray(lon, dtype=float) + 180.0) / size).astype(np.int64), columns - 1)
+    return rows * columns + cols
+
+
+def _readonly(array):
+    array.setflags(write=False)
+    return array
+
+
+def _freeze_arrays(state):
+    for value in state.values():
+        if isinstance(value, np.ndarray):
+            _readonly(value)
+
+
+def codes_for(vocabulary, values):
+    """Codes of the `values` present in a dictionary-encoded column's vocabulary."""
+    lookup = {v: i for i, v in enumerate(vocabulary)}
+    return [lookup[v] for v in values if v in lookup]
+
+
+def _encode(values):
+    """Dictionary-encodes a list of hashable values into (codes, vocabulary)."""
+    vocabulary = {}
+    codes = np.fromiter((vocabulary.setdefault(v, len(vocabulary)) for v in values), dtype=np.int32, count=len(values))
+    return _readonly(codes), tuple(vocabulary)
+
+
+class MembershipBitmaps:
+    """
+    Packed bitmaps for a multi-valued trial attribute (genes, countries, ...).
+    Row i holds one bit per trial, set when the trial has value i.
+    """
+
+    def __init__(self, memberships, size):
+        self.size = size
+        lookup = {}
+        for members in memberships:
+            for value in members:
+                lookup.setdefault(value, len(lookup))
+        matrix = np.zeros((len(lookup), size), dtype=bool)
+        for trial_idx, members in enumerate(memberships):
+            for value in members:
+                matrix[lookup[value], trial_idx] = True
+        self.values = tuple(lookup)
+        self.lookup = lookup
+        self.bits = _readonly(np.packbits(matrix, axis=1))
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        _freeze_arrays(state)
+
+    def row_mask(self, row):
+        return np.unpackbits(self.bits[row], count=self.size).view(bool)
+
+    def mask(self, value):
+        """Trials having `value` (an all-False mask for unknown values)."""
+        row = self.lookup.get(value)
+        if row is None:
+            return np.zeros(self.size, dtype=bool)
+        return self.row_mask(row)
+
+    def any_of(self, values):
+        """Packed mask of trials having at least one of `values`."""
+        rows = [self.lookup[v] for v in values if v in self.lookup]
+        if not rows:
+            return np.zeros(self.bits.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bits[rows], axis=0)
+
+    def counts(self, mask):
+        """Number of trials in `mask` having each value, aligned with self.values."""
+        return self.packed_counts(np.packbits(mask))
+
+    def packed_counts(self, packed_mask):
+        return _POPCOUNT[self.bits & packed_mask].sum(axis=1, dtype=np.int64)
+
+
+class FacetIndex:
+    """
+    Posting bitmaps for faceted search: one packed bitmap per (facet, value).
+
+    Selected values are OR-ed within a facet and AND-ed across facets. The counts
+    for a facet ignore that facet's own selection, so they tell the user how many
+    trials each value would add or leave, all from a single call.
+    """
+
+    def __init__(self, trials, facets):
+        self.size = len(trials)
+        self.ids = _readonly(np.array([t['id'] for t in trials], dtype=object))
+        # `facets` maps a facet name to a function returning a trial's values for it
+        self.facets = {
+            name: MembershipBitmaps([set(values_of(t)) for t in trials], self.size)
+            for name, values_of in facets.items()
+        }
+        self.everything = _readonly(np.packbits(np.ones(self.size, dtype=bool)))
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        _freeze_arrays(state)
+
+    def _intersect(self, packed_masks):
+        result = self.everything
+        for packed_mask in packed_masks:
+            result = result & packed_mask
+        return result
+
+    def search(self, selections):
+        """
+        Returns (matching ids, {facet: {value: count}}) for `selections`,
+        a {facet: [selected values]} dict. Empty selections do not filter.
+        """
+        selected = {
+            name: self.facets[name].any_of(values)
+            for name, values in selections.items()
+            if values and name in self.facets
+        }
+
+        counts = {}
+        for name, bitmaps in self.facets.items():
+            others = self._intersect(m for other, m in selected.items() if other != name)
+            counts[name] = dict(sorted(zip(bitmaps.values, bitmaps.packed_counts(others).tolist())))
+
+        matched = np.unpackbits(self._intersect(selected.values()), count=self.size).view(bool)
+        return self.ids[matched].tolist(), counts
+
+
+class GeneMarkerIndex:
+    """
+    Columnar copy of the serialized trials dataset for the genetic-markers chart.
+    Per-gene trial, drug, interventional and observational counts are popcounts
+    of the gene bitmaps against a filter mask.
+    """
+
+    def __init__(self, trials, inactive_statuses):
+        n = len(trials)
+        self.size = n
+        self.active = _readonly(np.array([t['status'] not in inactive_statuses for t in trials], dtype=bool))
+        self.status_codes, self.statuses = _encode([t['status'].lower() for t in trials])
+        self.phase_codes, self.phases = _encode([t['phase'] for t in trials])
+        self.familial = _readonly(np.array([bool(t['genes']) for t in trials], dtype=bool))
+        study_types = [(t['studyType'] or '').lower() for t in trials]
+        self.interventional = _readonly(np.packbits(np.array([st == 'interventional' for st in study_types], dtype=bool)))
+        self.observational = _readonly(np.packbits(np.array([st == 'observational' for st in study_types], dtype=bool)))
+        self.has_drug = _readonly(np.packbits(np.array(
+            [any(it.lower() in DRUG_INTERVENTION_TYPES for it in t['interventionTypes'] or []) for t in trials], dtype=bool,
+        )))
+        self.genes = MembershipBitmaps([{g.lower() for g in t['genes']} for t in trials], n)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        _freeze_arrays(state)
+
+    def filter_mask(self, status=None, phase=None, gene=None, familial=False):
+        """get_genetic_markers filters: no status means active trials only, an empty list means all."""
+        if status is None:
+            mask = self.active.copy()
+        elif status:
+            mask = np.isin(self.status_codes, codes_for(self.statuses, [s.lower() for s in status]))
+        else:
+            mask = np.ones(self.size, dtype=bool)
+        if phase:
+            mask &= np.isin(self.phase_codes, codes_for(self.phases, phase))
+        if gene:
+            mask &= self.genes.mask(gene.lower())
+        if familial:
+            mask &= self.familial
+        return mask
+
+    def counts(self, mask):
+        """
+        [(gene, trials, drugs, interventional, observational)] for the genes of the
+        trials in `mask`, ordered by the position of each gene's first trial.
+        """
+        packed = np.packbits(mask)
+        trials = self.genes.packed_counts(packed).tolist()
+        drugs = self.genes.packed_counts(packed & self.has_drug).tolist()
+        interventional = self.genes.packed_counts(packed & self.interventional).tolist()
+        observational = self.genes.packed_counts(packed & self.observational).tolist()
+        rows = [row for row, count in enumerate(trials) if count]
+        rows.sort(key=lambda row: np.argmax(self.genes.row_mask(row) & mask))
+        return [(self.genes.values[row], trials[row], drugs[row], interventional[row], observational[row]) for row in rows]
+
+
+class TrialIndex:
+    """
+    Immutable columnar snapshot of the Trial table used by the analytics endpoints.
+
+    Categorical columns are dictionary-encoded into NumPy code arrays, multi-valued
+    attributes are packed membership bitmaps, and geocoded TrialSite rows form a
+    site table whose ~100m clusters are bucketed into a grid pyramid for the map.
+    Filters evaluate as vectorized boolean masks over trial positions.
+    The index is rebuilt once per sync and cached/versioned through `get_or_build`.
+    """
+
+    def __init__(self, trials):
+        n = len(trials)
+        self.size = n
+        self.built_at = datetime.datetime.now(datetime.timezone.utc)
+
+        self.ids = _readonly(np.array([t['id'] for t in trials], dtype=object))
+        self.titles = _readonly(np.array([t['title'] for t in trials], dtype=object))
+        self.status_codes, self.statuses = _encode([t['overall_status'] for t in trials])
+        self.phase_codes, self.phases = _encode([t['study_phase'] for t in trials])
+        # Positions in FUNDING_CATEGORIES
+        self.sponsor_codes = _readonly(np.array([FUNDING_CATEGORIES.index(categorize_sponsor(t['lead_sponsor_name'])) for t in trials], dtype=np.int8))
+
+        self.interventional = _readonly(np.array([(t['study_type'] or '').upper() == 'INTERVENTIONAL' for t in trials], dtype=bool))
+        self.familial = _readonly(np.array([t['familial'] for t in trials], dtype=bool))
+        self.has_enrollment = _readonly(np.array([t['enrollment_count'] is not None for t in trials], dtype=bool))
+        self.enrollment = _readonly(np.array([t['enrollment_count'] or 0 for t in trials], dtype=np.int64))
+        # 0 when the start date is unknown
+        self.start_year = _readonly(np.array([t['start_year'] or 0 for t in trials], dtype=np.int32))
+        self.site_counts = _readonly(np.array([len(t['sites']) for t in trials], dtype=np.int32))
+
+        self.genes = MembershipBitmaps([t['genes'] for t in trials], n)
+        self.countries = MembershipBitmaps([t['countries'] for t in trials], n)
+
+        # Flattened table of geocoded study sites, for the global map
+        sites = [(trial_idx, site) for trial_idx, t in enumerate(trials) for site in t['sites'] if site['cluster_key']]
+        self.site_trial = _readonly(np.array([trial_idx for trial_idx, _ in sites], dtype=np.int32))
+        self.site_cluster, cluster_keys = _encode([site['cluster_key'] for _, site in sites])
+        # The first site seen in a cluster names it
+        cluster_info = {}
+        for _, site in sites:
+            cluster_info.setdefault(site['cluster_key'], site)
+        self.clusters = tuple(cluster_info[key] for key in cluster_keys)
+        self.cluster_keys = cluster_keys
+        positions = np.array([cluster['position'] for cluster in self.clusters], dtype=float).reshape(-1, 2)
+        self.cluster_lat = _readonly(positions[:, 0])
+        self.cluster_lon = _readonly(positions[:, 1])
+        # Grid cell of every cluster at each zoom level (row z), precomputed once per build
+        self.cluster_cells = _readonly(np.stack([
+            grid_cells(self.cluster_lat, self.cluster_lon, zoom) for zoom in range(MAP_MAX_GRID_ZOOM + 1)
+        ]))
+
+    def __setstate__(self, state):
+        # Arrays come back writeable from the cache's unpickling
+        self.__dict__.update(state)
+        _freeze_arrays(state)
+
+    def filter_mask(self, status=None, phase=None, gene=None, familial=False, country=None):
+        """Vectorized equivalent of apply_analytics_filters (plus an optional country filter)."""
+        mask = np.ones(self.size, dtype=bool)
+        if status:
+            mask &= self.status_mask(expand_status_filter(status))
+        if phase:
+            mask &= np.isin(self.phase_codes, codes_for(self.phases, phase))
+        if gene:
+            mask &= self.genes.mask(gene.strip().lower())
+        if familial:
+            mask &= self.familial
+        if country:
+            mask &= self.countries.mask(country.strip().title())
+        return mask
+
+    def status_mask(self, statuses):
+        return np.isin(self.status_codes, codes_for(self.statuses, statuses))
+
+
+def _sites_by_trial():
+    """Groups TrialSite rows by trial id, in study_location order, with a map cluster key."""
+    sites = defaultdict(list)
+    rows = TrialSite.objects.order_by('pk').values_list('trial_id', 'facility', 'city', 'country', 'latitude', 'longitude')
+    for trial_id, facility, city, country, lat, lon in rows.iterator():
+        site = {'cluster_key': None, 'country': country}
+        if lat is not None and lon is not None:
+            # Group nearby sites by rounding to 3 decimal places (~100m)
+            site = {
+                'cluster_key': f"{round(lat, 3)},{round(lon, 3)}",
+                'name': facility or 'Unknown Facility',
+                'city': city,
+                'country': country,
+                'position': [lat, lon],
+            }
+        sites[trial_id].append(site)
+    return sites
+
+
+def _clean_genes(genes):
+    # Same cleanup as the serialized trials ("FUS Mutation" -> "fus")
+    cleaned = (re.sub(r'\s*mutation\s*', '', str(g), flags=re.IGNORECASE).strip().lower() for g in genes if g)
+    return {g for g in cleaned if g}
+
+
+def build_trial_index():
+    """Builds a TrialIndex from the database (three queries)."""
+    raw_trials = Trial.objects.only(
+        'unique_protocol_id', 'brief_title', 'overall_status', 'study_phase', 'study_type',
+        'lead_sponsor_name', 'enrollment_count', 'study_start_date', 'genes',
+    ).prefetch_related(Prefetch('related_genes', queryset=Gene.objects.only('gene_symbol')))
+    sites_by_trial = _sites_by_trial()
+
+    trials = []
+    for t in raw_trials:
+        related_symbols = [g.gene_symbol for g in t.related_genes.all()]
+        json_genes = t.genes if isinstance(t.genes, list) else []
+        # Sites without coordinates still count towards clinical_sites, but not the map
+        sites = sites_by_trial.get(t.unique_protocol_id, [])
+        trials.append({
+            'id': t.unique_protocol_id,
+            'title': t.brief_title,
+            'overall_status': t.overall_status or '',
+            'study_phase': t.study_phase or '',
+            'study_type': t.study_type,
+            'lead_sponsor_name': t.lead_sponsor_name,
+            'enrollment_count': t.enrollment_count,
+            'start_year': t.study_start_date.year if t.study_start_date else None,
+            'familial': bool(related_symbols) or t.genes not in (None, []),
+            'genes': _clean_genes(related_symbols + json_genes),
+            'countries': {site['country'].title() for site in sites if site['country']},
+            'sites': sites,
+        })
+
+    return TrialIndex(trials)
+
+
+def get_trial_index(force_refresh: bool = False):
+    """Returns the cached TrialIndex, building it (single-flight) on a miss."""
+    return get_or_build(TRIAL_INDEX_CACHE_KEY, build_trial_index, force_refresh=force_refresh)
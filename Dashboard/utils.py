@@ -1,4 +1,3 @@
-import requests
 import os
 import re
 import ast
@@ -13,7 +12,9 @@ from bs4 import BeautifulSoup
 from django.db import models
 from django.db.models import Q
 import numpy as np
-from .models import Trial, Gene, Update_Log, HealeyTrial, Intervention, TrialStatus
+from .models import Trial, Gene, Update_Log, HealeyTrial, Intervention, TrialStatus, TrialSite
+from .http_client import get_client
+from .metrics import sync_stage
 from .schemas import HealeyTrialSchema, HealeyContactInfoSchema
 from datetime import datetime, timedelta
 from dateutil import parser as date_parser
@@ -30,6 +31,7 @@ from io import StringIO
 import logging
 import time
 import duckdb
+from .duckdb_engine import postgres_engine
 
 # Configure Logging
 log_dir = os.path.join(settings.BASE_DIR, 'logs')
@@ -43,199 +45,245 @@ formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 file_handler.setFormatter(formatter)
 llm_logger.addHandler(file_handler)
 
-def run_analytical_query(query: str):
+def run_analytical_query(query: str, params=None):
     """
     Executes an analytical query using DuckDB against the Postgres database.
+    Runs on the process-wide engine (extension loaded and Postgres attached once);
+    tables are read as in the attached `db` catalog, and `params` bind `?`/`$name` placeholders.
     """
     try:
-        # Connect to an in-memory DuckDB
-        con = duckdb.connect(database=':memory:')
-        
-        # Install and load the postgres extension for DuckDB
-        con.sql("INSTALL postgres; LOAD postgres;")
-        
-        # Construct connection string from Django settings
-        db_settings = settings.DATABASES['default']
-        conn_str = f"dbname={db_settings['NAME']} user={db_settings['USER']} password={db_settings['PASSWORD']} host={db_settings['HOST']} port={db_settings['PORT']}"
-        
-        # Attach Postgres
-        con.sql(f"ATTACH '{conn_str}' AS db (TYPE POSTGRES);")
-        
-        # Execute Query
-        # Note: The query should reference tables as db.public.table_name or similar logic
-        # We can set the search path or just expect the user to qualify
-        con.sql("USE db;") 
-        
-        result_df = con.sql(query).df()
-        return result_df
+        return postgres_engine.query(query, params)
+    except (duckdb.IOException, duckdb.ConnectionException) as e:
+        print(f"DuckDB Query Error: {e}")
+        # A dropped Postgres attachment is re-established on the next query
+        postgres_engine.reset()
+        return pd.DataFrame()
     except Exception as e:
         print(f"DuckDB Query Error: {e}")
         return pd.DataFrame()
 
 
 
+def _coordinate(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+# Flattens a ClinicalTrials.gov locations list (Trial.study_location) into TrialSite field dicts.
+def extract_study_sites(study_location):
+    locations = study_location
+    if isinstance(locations, str):
+        # Handle if it's a string (serialization artifact)
+        try:
+            locations = json.loads(locations)
+        except ValueError:
+            return []
+    if not isinstance(locations, list):
+        return []
+
+    sites = []
+    for loc in locations:
+        if not isinstance(loc, dict):
+            continue
+        geo = loc.get('geoPoint') if isinstance(loc.get('geoPoint'), dict) else {}
+        latitude, longitude = _coordinate(geo.get('lat')), _coordinate(geo.get('lon'))
+        if latitude is None or longitude is None:
+            latitude = longitude = None
+        sites.append({
+            'facility': (loc.get('facility') or '').strip(),
+            'city': (loc.get('city') or '').strip(),
+            'state': (loc.get('state') or '').strip(),
+            'country': (loc.get('country') or loc.get('LocationCountry') or '').strip(),
+            'zip_code': (loc.get('zip') or '').strip(),
+            'latitude': latitude,
+            'longitude': longitude,
+            'status': (loc.get('status') or '').strip(),
+        })
+    return sites
+
+# Replaces a trial's TrialSite rows with the sites in its study_location JSON.
+def sync_trial_sites(trial_obj):
+    TrialSite.objects.filter(trial=trial_obj).delete()
+    TrialSite.objects.bulk_create([
+        TrialSite(trial=trial_obj, **site) for site in extract_study_sites(trial_obj.study_location)
+    ])
+
 # This function is designed to update the database with trial and gene data.
 # It iterates over each trial, updating or creating trial records, and associates genes by creating or fetching gene records.
 # The logic for dynamically using field names from the Trial model minimizes hardcoding and adapts to changes in the model's structure.
 def update_data():
     print("Inside update_data function...")
-    trials_data = enhanced_fetch_trial_data()  # Ensure this returns a DataFrame
+    with sync_stage('trials', 'fetch') as stage:
+        trials_data = enhanced_fetch_trial_data()  # Ensure this returns a DataFrame
+        stage.rows = len(trials_data)
     print(f"Fetched {len(trials_data)} trial records (with gene matching).")
 
-    gene_list_df = scrape_alsod_gene_list()  # Fetch the gene list
+    with sync_stage('genes', 'fetch') as stage:
+        gene_list_df = scrape_alsod_gene_list()  # Fetch the gene list
+        stage.rows = len(gene_list_df)
     print(f"Scraped gene list with {len(gene_list_df)} records.")
     valid_gene_symbols = set(gene_list_df['Gene Symbol'].tolist())
 
     # Update or create Gene records
     updated_genes = 0
-    for _, row in gene_list_df.iterrows():
-        _, created = Gene.objects.update_or_create(
-            gene_symbol=row['Gene Symbol'],
-            defaults={
-                'gene_name': row['Gene Name'],
-                'gene_risk_category': row['Gene Risk Category']
-            }
-        )
-        updated_genes += (1 if created else 0)
+    with sync_stage('genes', 'upsert') as stage:
+        for _, row in gene_list_df.iterrows():
+            _, created = Gene.objects.update_or_create(
+                gene_symbol=row['Gene Symbol'],
+                defaults={
+                    'gene_name': row['Gene Name'],
+                    'gene_risk_category': row['Gene Risk Category']
+                }
+            )
+            updated_genes += (1 if created else 0)
+        stage.rows = len(gene_list_df)
     print(f"Total genes updated or created: {updated_genes}")
 
     updated_trials = 0
     updated_trial_ids = set()  # Collect IDs of trials being updated or created
 
-    # Iterate through each trial record
-    for _, row in trials_data.iterrows():
-        trial_defaults = row.to_dict()
+    with sync_stage('trials', 'upsert') as stage:
+        # Iterate through each trial record
+        for _, row in trials_data.iterrows():
+            trial_defaults = row.to_dict()
 
-        # Convert date strings to date objects or None if invalid
-        date_fields = ['study_submitance_date', 'study_submitance_date_qc', 'study_start_date', 'status_verified_date', 'completion_date']
-        for date_field in date_fields:
-            date_value = trial_defaults.get(date_field)
-            if date_value:
-                try:
-                    # Use dateutil.parser to parse the date string
-                    trial_defaults[date_field] = date_parser.parse(date_value).date()
-                except (ValueError, TypeError):
-                    print(f"Invalid date format for {date_field} in trial ID {trial_defaults['unique_protocol_id']}: {date_value}")
+            # Convert date strings to date objects or None if invalid
+            date_fields = ['study_submitance_date', 'study_submitance_date_qc', 'study_start_date', 'status_verified_date', 'completion_date']
+            for date_field in date_fields:
+                date_value = trial_defaults.get(date_field)
+                if date_value:
+                    try:
+                        # Use dateutil.parser to parse the date string
+                        trial_defaults[date_field] = date_parser.parse(date_value).date()
+                    except (ValueError, TypeError):
+                        print(f"Invalid date format for {date_field} in trial ID {trial_defaults['unique_protocol_id']}: {date_value}")
+                        trial_defaults[date_field] = None
+                else:
+                    # If the date is empty or None, explicitly set it to None
                     trial_defaults[date_field] = None
-            else:
-                # If the date is empty or None, explicitly set it to None
-                trial_defaults[date_field] = None
-
-        # Handling numerical fields with more robust error checking
-        num_fields = ['enrollment_count']
-        for num_field in num_fields:
-            value = trial_defaults.get(num_field)
-            if value is not None and value != '':
-                try:
-                    trial_defaults[num_field] = int(value)
-                except ValueError:
-                    # Log the error and set the field to None or a default value
-                    print(f"Error converting {num_field} to int for trial ID {trial_defaults['unique_protocol_id']}: {value}")
-                    trial_defaults[num_field] = None  # Or set a default value if appropriate
-            else:
-                # If the value is empty or None, explicitly set it to None
-                trial_defaults[num_field] = None
 
-        # Ensure JSON fields are properly parsed
-        for json_field in ['genes', 'condition', 'intervention_name', 'keyword']:
-            if trial_defaults.get(json_field) and isinstance(trial_defaults[json_field], str):
-                try:
-                    trial_defaults[json_field] = json.loads(trial_defaults[json_field])
-                except json.JSONDecodeError:
-                    print(f"Error parsing JSON for {json_field} in trial ID {trial_defaults['unique_protocol_id']}")
-                    trial_defaults[json_field] = None
-
-        # Update or create the Trial record
-        trial_obj, created = Trial.objects.update_or_create(
-            unique_protocol_id=trial_defaults['unique_protocol_id'],
-            defaults=trial_defaults
-        )
+            # Handling numerical fields with more robust error checking
+            num_fields = ['enrollment_count']
+            for num_field in num_fields:
+                value = trial_defaults.get(num_field)
+                if value is not None and value != '':
+                    try:
+                        trial_defaults[num_field] = int(value)
+                    except ValueError:
+                        # Log the error and set the field to None or a default value
+                        print(f"Error converting {num_field} to int for trial ID {trial_defaults['unique_protocol_id']}: {value}")
+                        trial_defaults[num_field] = None  # Or set a default value if appropriate
+                else:
+                    # If the value is empty or None, explicitly set it to None
+                    trial_defaults[num_field] = None
+
+            # Ensure JSON fields are properly parsed
+            for json_field in ['genes', 'condition', 'intervention_name', 'keyword']:
+                if trial_defaults.get(json_field) and isinstance(trial_defaults[json_field], str):
+                    try:
+                        trial_defaults[json_field] = json.loads(trial_defaults[json_field])
+                    except json.JSONDecodeError:
+                        print(f"Error parsing JSON for {json_field} in trial ID {trial_defaults['unique_protocol_id']}")
+                        trial_defaults[json_field] = None
+
+            # Update or create the Trial record
+            trial_obj, created = Trial.objects.update_or_create(
+                unique_protocol_id=trial_defaults['unique_protocol_id'],
+                defaults=trial_defaults
+            )
 
-        # Sync Status M2M field
-        raw_status = trial_defaults.get('overall_status', '')
-        if raw_status:
-            # Helper map for known variations
-            status_map_keys = {
-                'not_yet_recruiting': 'Not Yet Recruiting',
-                'recruiting': 'Recruiting',
-                'enrolling_by_invitation': 'Enrolling By Invitation',
-                'active_not_recruiting': 'Active, Not Recruiting',
-                'active, not recruiting': 'Active, Not Recruiting',
-                'suspended': 'Suspended',
-                'terminated': 'Terminated',
-                'completed': 'Completed',
-                'withdrawn': 'Withdrawn',
-                'unknown': 'Unknown'
-            }
+            # Sync Status M2M field
+            raw_status = trial_defaults.get('overall_status', '')
+            if raw_status:
+                # Helper map for known variations
+                status_map_keys = {
+                    'not_yet_recruiting': 'Not Yet Recruiting',
+                    'recruiting': 'Recruiting',
+                    'enrolling_by_invitation': 'Enrolling By Invitation',
+                    'active_not_recruiting': 'Active, Not Recruiting',
+                    'active, not recruiting': 'Active, Not Recruiting',
+                    'suspended': 'Suspended',
+                    'terminated': 'Terminated',
+                    'completed': 'Completed',
+                    'withdrawn': 'Withdrawn',
+                    'unknown': 'Unknown'
+                }
             
-            clean_status = str(raw_status).lower().strip().replace('  ', ' ')
-            key_variant = clean_status.replace(' ', '_')
+                clean_status = str(raw_status).lower().strip().replace('  ', ' ')
+                key_variant = clean_status.replace(' ', '_')
             
-            target_name = status_map_keys.get(key_variant)
-            if not target_name:
-                 target_name = status_map_keys.get(clean_status)
+                target_name = status_map_keys.get(key_variant)
+                if not target_name:
+                     target_name = status_map_keys.get(clean_status)
             
-            # If mapped
-            if target_name:
-                try:
-                    status_obj = TrialStatus.objects.get(name=target_name)
-                    trial_obj.status.add(status_obj)
-                except TrialStatus.DoesNotExist:
-                    print(f"Warning: Mapped status '{target_name}' not found in DB.")
-            else:
-                # Fallback: Try case-insensitive match on the raw text
-                try:
-                    status_obj = TrialStatus.objects.get(name__iexact=raw_status)
-                    trial_obj.status.add(status_obj)
-                except TrialStatus.DoesNotExist:
-                    # Try Title Case as last resort for simple statuses
+                # If mapped
+                if target_name:
+                    try:
+                        status_obj = TrialStatus.objects.get(name=target_name)
+                        trial_obj.status.add(status_obj)
+                    except TrialStatus.DoesNotExist:
+                        print(f"Warning: Mapped status '{target_name}' not found in DB.")
+                else:
+                    # Fallback: Try case-insensitive match on the raw text
                     try:
-                        status_obj = TrialStatus.objects.get(name=raw_status.title())
+                        status_obj = TrialStatus.objects.get(name__iexact=raw_status)
                         trial_obj.status.add(status_obj)
                     except TrialStatus.DoesNotExist:
-                        # Log if it's a completely new status (e.g. "Available" from expanded access)
+                        # Try Title Case as last resort for simple statuses
+                        try:
+                            status_obj = TrialStatus.objects.get(name=raw_status.title())
+                            trial_obj.status.add(status_obj)
+                        except TrialStatus.DoesNotExist:
+                            # Log if it's a completely new status (e.g. "Available" from expanded access)
+                            pass
+
+            updated_trials += (1 if created else 0)
+
+            # Sync related_genes M2M field
+            if trial_defaults.get('genes'):
+                gene_symbols = trial_defaults['genes']
+                if isinstance(gene_symbols, list):
+                    # match_genes returns a list of symbols (strings)
+                    genes_to_link = Gene.objects.filter(gene_symbol__in=gene_symbols)
+                    trial_obj.related_genes.set(genes_to_link)
+                elif isinstance(gene_symbols, str):
+                    try:
+                        gene_list = json.loads(gene_symbols)
+                        if isinstance(gene_list, list):
+                             genes_to_link = Gene.objects.filter(gene_symbol__in=gene_list)
+                             trial_obj.related_genes.set(genes_to_link)
+                    except:
                         pass
 
-        updated_trials += (1 if created else 0)
 
-        # Sync related_genes M2M field
-        if trial_defaults.get('genes'):
-            gene_symbols = trial_defaults['genes']
-            if isinstance(gene_symbols, list):
-                # match_genes returns a list of symbols (strings)
-                genes_to_link = Gene.objects.filter(gene_symbol__in=gene_symbols)
-                trial_obj.related_genes.set(genes_to_link)
-            elif isinstance(gene_symbols, str):
-                try:
-                    gene_list = json.loads(gene_symbols)
-                    if isinstance(gene_list, list):
-                         genes_to_link = Gene.objects.filter(gene_symbol__in=gene_list)
-                         trial_obj.related_genes.set(genes_to_link)
-                except:
-                    pass
-
-
-        # Process intervention_name fields
-        if 'intervention_name' in trial_defaults and trial_defaults['intervention_name']:
-            # Clear existing interventions to prevent massive duplication
-            Intervention.objects.filter(trial=trial_obj).delete()
-            for intervention_data in trial_defaults['intervention_name']:
-                Intervention.objects.create(
-                    trial=trial_obj,
-                    intervention_name=intervention_data.get('name', 'Not specified'),
-                    intervention_type=intervention_data.get('type', 'Not specified'),
-                    intervention_description=intervention_data.get('description', 'No description provided')
-                )
+            # Process intervention_name fields
+            if 'intervention_name' in trial_defaults and trial_defaults['intervention_name']:
+                # Clear existing interventions to prevent massive duplication
+                Intervention.objects.filter(trial=trial_obj).delete()
+                for intervention_data in trial_defaults['intervention_name']:
+                    Intervention.objects.create(
+                        trial=trial_obj,
+                        intervention_name=intervention_data.get('name', 'Not specified'),
+                        intervention_type=intervention_data.get('type', 'Not specified'),
+                        intervention_description=intervention_data.get('description', 'No description provided')
+                    )
+
+            # Flatten study locations into TrialSite rows
+            sync_trial_sites(trial_obj)
                 
-        # Update trial IDs set
-        updated_trial_ids.add(trial_defaults['unique_protocol_id'])
+            # Update trial IDs set
+            updated_trial_ids.add(trial_defaults['unique_protocol_id'])
+        stage.rows = len(updated_trial_ids)
 
     # Identify and delete obsolete trials
-    existing_trial_ids = set(Trial.objects.values_list('unique_protocol_id', flat=True))
-    obsolete_trial_ids = existing_trial_ids - updated_trial_ids
-    if obsolete_trial_ids:
-        Trial.objects.filter(unique_protocol_id__in=obsolete_trial_ids).delete()
-        print(f"Deleted {len(obsolete_trial_ids)} obsolete trial records.")
+    with sync_stage('trials', 'prune') as stage:
+        existing_trial_ids = set(Trial.objects.values_list('unique_protocol_id', flat=True))
+        obsolete_trial_ids = existing_trial_ids - updated_trial_ids
+        if obsolete_trial_ids:
+            Trial.objects.filter(unique_protocol_id__in=obsolete_trial_ids).delete()
+            print(f"Deleted {len(obsolete_trial_ids)} obsolete trial records.")
+        stage.rows = len(obsolete_trial_ids)
 
     print(f"Total trials updated or created: {updated_trials}")
     
@@ -471,7 +519,7 @@ def scrape_alsod_gene_list():
 
     # Calculate the difference or set a default to proceed with scraping
     if Gene.objects.count() == 0 or last_update_date is None or (timezone.now().date() - last_update_date.date() >= timedelta(days=30)):
-        url = "https://alsod.ac.uk/"
+        url = settings.ALSOD_URL
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8"
@@ -483,7 +531,7 @@ def scrape_alsod_gene_list():
 
         try:
             print(f"Scraping genes from {url}...")
-            response = requests.get(url, headers=headers, timeout=10)
+            response = get_client().get(url, headers=headers)
             response.raise_for_status()
             soup = BeautifulSoup(response.text, "html.parser")
             rows = soup.findAll("tr", class_="clickable-row")
@@ -561,11 +609,14 @@ def scrape_alsod_gene_list():
     return df
 
 
+# Pages of 1000 studies can take ClinicalTrials.gov well over the default HTTP timeout
+CTGOV_TIMEOUT = 120  # seconds
+
 # This function fetches trial data from ClinicalTrials.gov's API.
 # It processes the response, and returns a structured format of trial details.
 def fetch_trial_data():
     # ClinicalTrials.gov's API V2 URL.
-    base_url = "https://clinicaltrials.gov/api/v2/studies"
+    base_url = settings.CTGOV_STUDIES_URL
     # Conditions to include in search.
     include_conditions = [
         "ALS", "amyotrophic lateral sclerosis", 
@@ -604,7 +655,7 @@ def fetch_trial_data():
     try:
         print("About to make API call to ClinicalTrials.gov...")
         while True:
-            response = requests.get(base_url, params=query_params)
+            response = get_client().get(base_url, params=query_params, timeout=CTGOV_TIMEOUT)
             if response.status_code == 200:
                 data = response.json()
 
@@ -818,8 +869,8 @@ def fetch_trial_data():
     # Replace 'nan' strings with actual NaN values
     df_studies.replace('nan', np.nan, inplace=True)
 
-    # Fill missing values with an empty string
-    df_studies.fillna('', inplace=True)
+    # Fill missing values with an empty string (numeric columns with gaps, e.g. enrollment counts, become object columns first)
+    df_studies = df_studies.astype(object).fillna('')
 
     # Renaming API column output to match the database model's field names
     column_mappings = {
@@ -1104,7 +1155,8 @@ def send_criteria_to_ai_server(unique_protocol_id, eligibility_criteria):
     # Use generic OpenAI-compatible endpoint
     client = OpenAI(
         base_url=base_url,
-        api_key=api_key
+        api_key=api_key,
+        http_client=get_client()
     )
     criteria_responses = {"inclusion": [], "exclusion": []}
 
@@ -1196,52 +1248,63 @@ def send_criteria_to_ai_server(unique_protocol_id, eligibility_criteria):
 
 
 # Healey Platform Trial Scrape Function
-def scrape_healey_platform_trial():
-    url = "https://www.massgeneral.org/neurology/als/research/platform-trial-sites"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-    }
-
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    table = soup.find('table')
-    rows = table.find_all('tr')[1:]  # Skip the header row
-
-    with transaction.atomic():  # Use a transaction to ensure data integrity
-        for row in rows:
-            columns = row.find_all('td')
-            if len(columns) < 4:
-                continue  # Skip rows that do not have enough columns
-
-            trial_data = {
-                'facility': columns[0].text.strip(),
-                'state': columns[1].text.strip(),
-                'enrollment_status': columns[2].text.strip(),
-                'trial_contact_info': []
-            }
+HEALEY_PLATFORM_SITES_URL = "https://www.massgeneral.org/neurology/als/research/platform-trial-sites"
+HEALEY_SCRAPE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
 
-            contacts = columns[3].find_all('a', class_='none')
-            for contact in contacts:
-                href = contact.get('href', '')
-                text = contact.text.strip()
-                contact_entry = {}
-                if 'mailto:' in href:
-                    email = href.split('mailto:')[1]
-                    contact_entry = {'trial_contact_name': text, 'trial_contact_email': email}
-                elif href.startswith('/'):
-                    phone_number = text
-                    if trial_data['trial_contact_info']:
-                        trial_data['trial_contact_info'][-1]['trial_contact_phone_number'] = phone_number
-                    continue
-                if contact_entry:  # Ensure we don't add empty entries
-                    trial_data['trial_contact_info'].append(contact_entry)
-
-            # Save directly to the database
-            HealeyTrial.objects.update_or_create(
-            facility=trial_data['facility'],
-            state=trial_data['state'],  # Adding another field to enforce uniqueness
-            defaults=trial_data
-        )
+def scrape_healey_platform_trial():
+    with sync_stage('healey', 'fetch') as stage:
+        response = get_client().get(HEALEY_PLATFORM_SITES_URL, headers=HEALEY_SCRAPE_HEADERS)
+        stage.rows = 1
+    save_healey_platform_sites(response.content)
+
+def save_healey_platform_sites(content):
+    """Parses the HEALEY platform trial sites page and upserts one HealeyTrial per site."""
+    with sync_stage('healey', 'save') as stage:
+        soup = BeautifulSoup(content, 'html.parser')
+        table = soup.find('table')
+        rows = table.find_all('tr')[1:]  # Skip the header row
+
+        saved = 0
+        with transaction.atomic():  # Use a transaction to ensure data integrity
+            for row in rows:
+                columns = row.find_all('td')
+                if len(columns) < 4:
+                    continue  # Skip rows that do not have enough columns
+
+                trial_data = {
+                    'facility': columns[0].text.strip(),
+                    'state': columns[1].text.strip(),
+                    'enrollment_status': columns[2].text.strip(),
+                    'trial_contact_info': []
+                }
+
+                contacts = columns[3].find_all('a', class_='none')
+                for contact in contacts:
+                    href = contact.get('href', '')
+                    text = contact.text.strip()
+                    contact_entry = {}
+                    if 'mailto:' in href:
+                        email = href.split('mailto:')[1]
+                        contact_entry = {'trial_contact_name': text, 'trial_contact_email': email}
+                    elif href.startswith('/'):
+                        phone_number = text
+                        if trial_data['trial_contact_info']:
+                            trial_data['trial_contact_info'][-1]['trial_contact_phone_number'] = phone_number
+                        continue
+                    if contact_entry:  # Ensure we don't add empty entries
+                        trial_data['trial_contact_info'].append(contact_entry)
+
+                # Save directly to the database
+                HealeyTrial.objects.update_or_create(
+                facility=trial_data['facility'],
+                state=trial_data['state'],  # Adding another field to enforce uniqueness
+                defaults=trial_data
+            )
+                saved += 1
+        stage.rows = saved
+    return saved
 
 def enrich_facility_data(facility, state):
     llm_logger.info(f"Preparing to enrich data for facility: {facility} in {state}")
@@ -1269,7 +1332,8 @@ def enrich_facility_data(facility, state):
     # Use generic OpenAI-compatible endpoint
     client = OpenAI(
         base_url=base_url,
-        api_key=api_key
+        api_key=api_key,
+        http_client=get_client()
     )
 
     prompt = (
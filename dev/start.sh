@@ -41,7 +41,8 @@ if [ ! -z "$PID_8000" ]; then
 fi
 
 # Redirect output to console log
-python3 manage.py runserver 0.0.0.0:8000 2>&1 | tee logs/console.log &
+# ASGI, so the async views share one event loop and connection pool per worker
+uvicorn ALS_FTD_Research_Dashboard.asgi:application --host 0.0.0.0 --port 8000 --reload 2>&1 | tee logs/console.log &
 DJANGO_PID=$!
 
 # 3. Start React Frontend